@@ -3,6 +3,23 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_moment import Moment
+from sqlalchemy import event
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.ratelimit import RateLimiter
+from app.rum import RUMCollector
+from app.metrics import RequestMetrics
+from app.profiler import SQLProfiler
+from app.pubsub import EventBroker
+from app.jobs import JobQueue
+from app.notifications import Notifier
+from app.caching import ScopedCache
+from app.templating import TemplateCache
+from app.trending import TrendingTracker
+from app.suggest import SuggestIndex
+from app.engagement import EngagementLog
+from app.uniques import UniqueViewers
+from app.search import SearchAnalytics
+from app.json_provider import JSONProvider
 import os
 
 # Initialize extensions
@@ -10,24 +27,99 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 moment = Moment()
+limiter = RateLimiter()
+rum_collector = RUMCollector()
+metrics = RequestMetrics()
+sql_profiler = SQLProfiler()
+broker = EventBroker()
+job_queue = JobQueue()
+notifier = Notifier()
+cache = ScopedCache()
+template_cache = TemplateCache()
+trending = TrendingTracker()
+suggestions = SuggestIndex()
+engagement = EngagementLog()
+unique_viewers = UniqueViewers()
+search_stats = SearchAnalytics()
 
-def create_app():
-    """Application factory"""
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+def create_app(config=None):
+    """Application factory (config overrides the environment-derived defaults)"""
     app = Flask(__name__, 
                 template_folder='../templates',
                 static_folder='../static')
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto to trust (0: clients connect directly)
+    app.config['PROXY_FIX_HOPS'] = int(os.environ.get('PROXY_FIX_HOPS', 0))
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['WTF_CSRF_TIME_LIMIT'] = None  # No time limit for CSRF tokens
+    app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'
+    app.config['RATELIMIT_STORAGE_URL'] = os.environ.get('RATELIMIT_STORAGE_URL') or 'memory://'
+    app.config['METRICS_MULTIPROC_DIR'] = os.environ.get('METRICS_MULTIPROC_DIR')
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['SQL_PROFILER_ENABLED'] = os.environ.get('SQL_PROFILER_ENABLED', 'False').lower() == 'true'
+    app.config['SQL_PROFILER_THRESHOLD'] = int(os.environ.get('SQL_PROFILER_THRESHOLD', 5))
+    app.config['SQL_PROFILER_BUDGET'] = int(os.environ.get('SQL_PROFILER_BUDGET', 20))
+    app.config['PUBSUB_URL'] = os.environ.get('PUBSUB_URL') or 'memory://'
+    app.config['SSE_ENABLED'] = os.environ.get('SSE_ENABLED', 'True').lower() == 'true'
+    app.config['SSE_MAX_STREAMS'] = int(os.environ.get('SSE_MAX_STREAMS', 4))
+    app.config['JOBS_WORKERS'] = int(os.environ.get('JOBS_WORKERS', 2))
+    app.config['MAIL_URL'] = os.environ.get('MAIL_URL') or 'console://'
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@localhost'
+    app.config['SITE_URL'] = os.environ.get('SITE_URL') or 'http://localhost:5000'
+    app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    app.config['FEED_SIZE'] = int(os.environ.get('FEED_SIZE', 20))
+    app.config['SITEMAP_SHARD_SIZE'] = int(os.environ.get('SITEMAP_SHARD_SIZE', 50000))
+    app.config['REFDATA_TTL'] = int(os.environ.get('REFDATA_TTL', 60))
+    app.config['FEATURED_POSTS'] = 3
+    app.config['TRENDING_HALF_LIFE'] = int(os.environ.get('TRENDING_HALF_LIFE', 6 * 3600))
+    app.config['TRENDING_CHECKPOINT_INTERVAL'] = float(os.environ.get('TRENDING_CHECKPOINT_INTERVAL', 30))
+    app.config['ENGAGEMENT_RETENTION_DAYS'] = int(os.environ.get('ENGAGEMENT_RETENTION_DAYS', 14))
+    app.config['UNIQUES_CHECKPOINT_INTERVAL'] = float(os.environ.get('UNIQUES_CHECKPOINT_INTERVAL', 30))
+    app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR',
+                                                      os.path.join(app.instance_path, 'jinja_cache'))
+    app.config['JSON_ENCODER'] = os.environ.get('JSON_ENCODER') or 'auto'
+    if config:
+        app.config.update(config)
+    
+    app.json = JSONProvider(app)
+    
+    # Behind a router request.remote_addr is the router's: take the client address it forwards, so
+    # rate limits and unique-visitor counts are per client rather than one bucket for everyone
+    if app.config['PROXY_FIX_HOPS']:
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
     
     # Initialize extensions with app
     db.init_app(app)
+    with app.app_context():
+        # SQLite ignores ON DELETE CASCADE unless each connection turns foreign keys on
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _enable_sqlite_foreign_keys)
     login_manager.init_app(app)
     csrf.init_app(app)
     moment.init_app(app)
+    limiter.init_app(app)
+    rum_collector.init_app(app)
+    metrics.init_app(app)
+    sql_profiler.init_app(app)
+    broker.init_app(app)
+    job_queue.init_app(app)
+    notifier.init_app(app)
+    cache.init_app(app)
+    template_cache.init_app(app)
+    trending.init_app(app)
+    suggestions.init_app(app)
+    engagement.init_app(app)
+    unique_viewers.init_app(app)
+    search_stats.init_app(app)
     
     # Configure login manager
     login_manager.login_view = 'auth.login'
@@ -47,6 +139,17 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
+    # Register background job handlers
+    from app import tasks  # noqa: F401
+    
+    # Tag maintenance commands (flask tags backfill|recount)
+    from app.tags import tags_cli
+    app.cli.add_command(tags_cli)
+    
+    # Schema drift that create_all can't fix (flask schema check|upgrade)
+    from app.schema import schema_cli
+    app.cli.add_command(schema_cli)
+    
     # Create database tables
     with app.app_context():
         db.create_all()
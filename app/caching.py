@@ -0,0 +1,119 @@
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+
+class ScopedCache:
+    """Small in-process LRU cache invalidated by named scopes
+
+    Every entry remembers the version of each scope it was built from (e.g.
+    "feed:site", "feed:category:3"); invalidate() bumps those versions so
+    dependent entries miss on their next lookup. Invalidations are also
+    broadcast on the broker's "cache" channel, so with PUBSUB_URL pointing
+    at Redis every worker drops its copy. CACHE_DEFAULT_TTL bounds staleness
+    for workers the broadcast cannot reach (memory:// across processes).
+    """
+
+    channel = 'cache'
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._listener = None
+        self.hits = self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1000)
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        self.app = app
+        self.clear()
+
+    @property
+    def _origin(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def _ensure_listening(self):
+        # Checked per process: a gunicorn fork needs its own broker listener thread
+        if self._pid != os.getpid():
+            from app import broker
+
+            self._pid = os.getpid()
+            if self._listener is None:
+                self._listener = broker.listen(self.channel, self._on_message)
+            elif hasattr(broker.transport, 'ensure_listening'):
+                broker.transport.ensure_listening()
+
+    def _on_message(self, event, data):
+        if event == 'invalidate' and data.get('origin') != self._origin:
+            self._bump(data['scopes'])
+
+    def _bump(self, scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def get(self, key):
+        """Cached value for key, or None if missing, expired or invalidated"""
+        self._ensure_listening()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires, versions = entry
+                if expires > time.monotonic() and all(self._versions.get(s, 0) == v for s, v in versions):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, scopes=(), ttl=None, versions=None):
+        """Store value under key as depending on scopes
+
+        Pass versions=cache.versions(scopes) captured before building the
+        value, so an invalidation that lands mid-build isn't lost.
+        """
+        ttl = self.app.config['CACHE_DEFAULT_TTL'] if ttl is None else ttl
+        with self._lock:
+            if versions is None:
+                versions = tuple((s, self._versions.get(s, 0)) for s in scopes)
+            self._entries[key] = (value, time.monotonic() + ttl, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.app.config['CACHE_MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+
+    def versions(self, scopes):
+        with self._lock:
+            return tuple((s, self._versions.get(s, 0)) for s in scopes)
+
+    def get_or_set(self, key, build, scopes=(), ttl=None):
+        """Return the cached value, calling build() to fill it on a miss"""
+        value = self.get(key)
+        if value is None:
+            versions = self.versions(scopes)
+            value = build()
+            self.set(key, value, ttl=ttl, versions=versions)
+        return value
+
+    def invalidate(self, *scopes):
+        """Drop entries built from any of scopes, here and in every worker the broker reaches"""
+        from app import broker
+
+        if not scopes:
+            return
+        self._bump(scopes)
+        broker.publish(self.channel, 'invalidate', {'scopes': list(scopes), 'origin': self._origin})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,225 @@
+"""
+Per-day engagement analytics for authors
+
+Views, likes and comments are appended to the engagement_event log. The
+request only adds a row to an in-memory buffer; a background thread
+bulk-inserts the buffer every ENGAGEMENT_FLUSH_INTERVAL seconds. Each event
+carries its UTC day, which is how the log is partitioned. Rollups and
+pruning work one day at a time.
+
+The engagement.rollup job recomputes yesterday's and today's rows in
+post_engagement_daily and author_engagement_daily with INSERT ... SELECT.
+It then deletes raw events older than ENGAGEMENT_RETENTION_DAYS. Flushing
+schedules the job, and job coalescing runs it at most once every
+ENGAGEMENT_ROLLUP_INTERVAL seconds. Dashboard charts read only the daily
+tables, so today's numbers lag by up to that interval.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, insert, select
+
+from app.rum import BeaconBuffer
+
+KINDS = {'view': 1, 'like': 2, 'comment': 3}
+MAX_DAYS = 365
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+class EngagementLog:
+    """Buffers engagement events and maintains the daily aggregate tables"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app.models import EngagementEvent
+
+        app.config.setdefault('ENGAGEMENT_BUFFER_SIZE', 50000)
+        app.config.setdefault('ENGAGEMENT_BATCH_SIZE', 1000)
+        app.config.setdefault('ENGAGEMENT_FLUSH_INTERVAL', 5.0)  # 0 disables the flusher thread
+        app.config.setdefault('ENGAGEMENT_ROLLUP_INTERVAL', 300)
+        app.config.setdefault('ENGAGEMENT_RETENTION_DAYS', 14)
+        self.app = app
+        self.events = BeaconBuffer(EngagementEvent, app.config['ENGAGEMENT_BUFFER_SIZE'])
+        app.cli.add_command(engagement_cli)
+
+    # ----- recording -----
+
+    def record(self, post, kind):
+        """Queue one view, like or comment on post"""
+        now = datetime.utcnow()
+        self.events.append({'day': now.date(), 'post_id': post.id, 'kind': KINDS[kind], 'created_at': now})
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Per process: a gunicorn fork needs its own flusher
+        if self._pid == os.getpid() or not self.app.config['ENGAGEMENT_FLUSH_INTERVAL']:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='engagement-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.app.config['ENGAGEMENT_FLUSH_INTERVAL'])
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                self.app.logger.exception('Failed to flush engagement events')
+
+    def flush(self):
+        """Insert buffered events and schedule a rollup (needs an app context)"""
+        from app import db, job_queue
+
+        written = 0
+        while True:
+            batch = self.events.drain(self.app.config['ENGAGEMENT_BATCH_SIZE'])
+            if not batch:
+                break
+            db.session.execute(insert(self.events.model), batch)
+            db.session.commit()
+            written += len(batch)
+        if written:
+            job_queue.enqueue('engagement.rollup', key='engagement',
+                              delay=self.app.config['ENGAGEMENT_ROLLUP_INTERVAL'])
+            db.session.commit()
+        return written
+
+    # ----- compaction -----
+
+    def retention_cutoff(self):
+        """First day whose raw events are still kept"""
+        return _today() - timedelta(days=self.app.config['ENGAGEMENT_RETENTION_DAYS'])
+
+    def rollup(self, day):
+        """Recompute the per-post and per-author aggregates for one day from the event log
+
+        Days whose events have been pruned are left alone, since recomputing
+        them would erase their aggregates. Returns the number of post rows
+        written, or None if the day was skipped.
+        """
+        from app import db
+        from app.models import AuthorEngagementDaily, EngagementEvent, Post, PostEngagementDaily
+
+        if day < self.retention_cutoff():
+            return None
+        event = EngagementEvent
+        totals = [func.sum(case((event.kind == code, 1), else_=0)) for code in KINDS.values()]
+        db.session.execute(delete(PostEngagementDaily).where(PostEngagementDaily.day == day))
+        written = db.session.execute(insert(PostEngagementDaily).from_select(
+            ['day', 'post_id', 'author_id', 'views', 'likes', 'comments'],
+            # The join drops events for posts deleted since they were logged
+            select(event.day, event.post_id, Post.user_id, *totals).join(Post, Post.id == event.post_id).where(
+                event.day == day).group_by(event.day, event.post_id, Post.user_id))).rowcount
+
+        daily = PostEngagementDaily
+        db.session.execute(delete(AuthorEngagementDaily).where(AuthorEngagementDaily.day == day))
+        db.session.execute(insert(AuthorEngagementDaily).from_select(
+            ['day', 'author_id', 'views', 'likes', 'comments'],
+            select(daily.day, daily.author_id, func.sum(daily.views), func.sum(daily.likes),
+                   func.sum(daily.comments)).where(daily.day == day).group_by(daily.day, daily.author_id)))
+        db.session.commit()
+        return written
+
+    def prune(self):
+        """Delete raw events older than the retention window; returns the number removed"""
+        from app import db
+        from app.models import EngagementEvent
+
+        removed = db.session.execute(delete(EngagementEvent).where(
+            EngagementEvent.day < self.retention_cutoff())).rowcount
+        db.session.commit()
+        return removed
+
+    def rollup_recent(self):
+        """The periodic job: refresh yesterday (late flushes) and today, then prune"""
+        today = _today()
+        for day in (today - timedelta(days=1), today):
+            self.rollup(day)
+        self.prune()
+
+    # ----- reading -----
+
+    def series(self, author_id, days=30, post_id=None):
+        """Daily views/likes/comments for an author (or one of their posts), oldest day first"""
+        from app import db
+        from app.models import AuthorEngagementDaily, PostEngagementDaily
+
+        today = _today()
+        first = today - timedelta(days=days - 1)
+        if post_id is None:
+            table, owner = AuthorEngagementDaily, AuthorEngagementDaily.author_id == author_id
+        else:
+            table, owner = PostEngagementDaily, PostEngagementDaily.post_id == post_id
+        rows = {row.day: row for row in db.session.execute(select(
+            table.day, table.views, table.likes, table.comments).where(owner, table.day >= first))}
+        result = {'days': [], 'views': [], 'likes': [], 'comments': []}
+        for offset in range(days):
+            day = first + timedelta(days=offset)
+            row = rows.get(day)
+            result['days'].append(day.isoformat())
+            for key in ('views', 'likes', 'comments'):
+                result[key].append(getattr(row, key) if row else 0)
+        return result
+
+    def top_posts(self, author_id, days=30, limit=10):
+        """An author's posts with the most views over the last days, with their totals"""
+        from app import db
+        from app.models import Post, PostEngagementDaily
+
+        daily = PostEngagementDaily
+        first = _today() - timedelta(days=days - 1)
+        views = func.sum(daily.views).label('views')
+        rows = db.session.execute(select(
+            daily.post_id, Post.title, Post.slug, views, func.sum(daily.likes).label('likes'),
+            func.sum(daily.comments).label('comments'),
+        ).join(Post, Post.id == daily.post_id).where(daily.author_id == author_id, daily.day >= first).group_by(
+            daily.post_id, Post.title, Post.slug).order_by(views.desc()).limit(limit))
+        return [{'id': r.post_id, 'title': r.title, 'slug': r.slug, 'views': r.views, 'likes': r.likes,
+                 'comments': r.comments} for r in rows]
+
+    def stats(self):
+        return {'buffered_events': len(self.events.rows), 'dropped_events': self.events.dropped,
+                'flusher_running': self._thread is not None}
+
+
+engagement_cli = AppGroup('engagement', help='Maintain the daily engagement rollups.')
+
+
+@engagement_cli.command('rollup')
+@click.option('--days', default=2, show_default=True, help='Number of days up to and including today')
+def rollup_command(days):
+    """Flush buffered events and recompute recent daily aggregates"""
+    from app import engagement
+
+    engagement.flush()
+    today = _today()
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        written = engagement.rollup(day)
+        click.echo(f'{day}: ' + ('skipped, events already pruned' if written is None else f'{written} post row(s)'))
+
+
+@engagement_cli.command('prune')
+def prune_command():
+    """Delete raw events past the retention window"""
+    from app import engagement
+
+    click.echo(f'Removed {engagement.prune()} event(s)')
@@ -0,0 +1,53 @@
+"""
+Streaming NDJSON exports of posts and comments
+
+Each export is one column-only SELECT read with yield_per, so rows arrive
+from the database a batch at a time and never become ORM instances. Each
+row is written as one JSON object per line by the app's JSON provider, and
+lines are sent in CHUNK_SIZE pieces. A worker's memory stays flat however
+large the tables grow. Rows come in id order, and ?after=<last id> resumes
+an interrupted export.
+"""
+
+from sqlalchemy import select
+
+from app import db
+
+CHUNK_SIZE = 65536
+YIELD_PER = 1000
+
+
+def _posts(after):
+    from app.models import Category, Post, User
+
+    return select(Post.id, Post.title, Post.slug, Post.content, Post.excerpt, Post.is_published, Post.is_featured,
+                  Post.allow_comments, Post.view_count, Post.like_count, Post.created_at, Post.updated_at,
+                  Post.published_at, Post.user_id, User.username.label('author'), Post.category_id,
+                  Category.slug.label('category')).join(User, User.id == Post.user_id).outerjoin(
+        Category, Category.id == Post.category_id).where(Post.id > after).order_by(Post.id)
+
+
+def _comments(after):
+    from app.models import Comment
+
+    return select(Comment.id, Comment.post_id, Comment.user_id, Comment.parent_id, Comment.content,
+                  Comment.is_approved, Comment.created_at, Comment.updated_at).where(
+        Comment.id > after).order_by(Comment.id)
+
+
+EXPORTS = {'posts': _posts, 'comments': _comments}
+
+
+def stream(kind, dumps, after=0):
+    """Yield the export as UTF-8 NDJSON chunks (needs an app context for the whole iteration)"""
+    rows = db.session.execute(EXPORTS[kind](after).execution_options(yield_per=YIELD_PER)).mappings()
+    buffer, length = [], 0
+    for row in rows:
+        line = dumps(dict(row))
+        buffer.append(line)
+        length += len(line) + 1
+        if length >= CHUNK_SIZE:
+            yield ('\n'.join(buffer) + '\n').encode('utf-8')
+            buffer, length = [], 0
+    if buffer:
+        yield ('\n'.join(buffer) + '\n').encode('utf-8')
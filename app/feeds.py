@@ -0,0 +1,80 @@
+import hashlib
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, render_template, url_for
+from sqlalchemy.orm import joinedload
+
+# Serialized feed plus what's needed for conditional responses and invalidation
+Feed = namedtuple('Feed', 'body etag updated mimetype versions')
+
+MIMETYPES = {
+    'xml': 'application/rss+xml',
+    'atom': 'application/atom+xml',
+    'json': 'application/feed+json',
+}
+
+
+def feed_scopes(user_id, *category_ids):
+    """Cache scopes a post by user_id in category_ids appears in"""
+    return ('feed:site', f'feed:author:{user_id}') + tuple(
+        f'feed:category:{category_id}' for category_id in set(category_ids) if category_id)
+
+
+def _json_feed(title, home_url, feed_url, posts):
+    return json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': title,
+        'home_page_url': home_url,
+        'feed_url': feed_url,
+        'items': [{
+            'id': url_for('main.view_post', slug=post.slug, _external=True),
+            'url': url_for('main.view_post', slug=post.slug, _external=True),
+            'title': post.title,
+            'summary': post.excerpt or post.generate_excerpt(),
+            'content_html': post.content.replace('\n', '<br>'),
+            'date_published': (post.published_at or post.created_at).isoformat() + 'Z',
+            'date_modified': post.updated_at.isoformat() + 'Z' if post.updated_at else None,
+            'authors': [{'name': post.author.get_display_name()}],
+            'tags': [post.category.name] if post.category else [],
+        } for post in posts],
+    }, separators=(',', ':'))
+
+
+def build_feed(fmt, slug=None, username=None):
+    """Render the newest published posts for the site, a category or an author (must run in a request)"""
+    from app import cache
+    from app.models import Post, Category, User
+
+    query = Post.query.options(joinedload(Post.author), joinedload(Post.category)).filter(Post.is_published == True)
+    if slug:
+        category = Category.query.filter_by(slug=slug).first_or_404()
+        query = query.filter(Post.category_id == category.id)
+        title, home_url = f'{category.name} - ProApp', url_for('main.index', category=category.id, _external=True)
+        scopes = (f'feed:category:{category.id}',)
+    elif username:
+        user = User.query.filter_by(username=username).first_or_404()
+        query = query.filter(Post.user_id == user.id)
+        title, home_url = f'{user.get_display_name()} - ProApp', url_for(
+            'main.user_profile', username=user.username, _external=True)
+        scopes = (f'feed:author:{user.id}',)
+    else:
+        title, home_url = 'ProApp', url_for('main.index', _external=True)
+        scopes = ('feed:site',)
+
+    # Versions are taken before the query so a publish that lands mid-build still invalidates this copy
+    versions = cache.versions(scopes)
+    # Served by the (user_id|category_id, is_published, created_at) indexes on Post
+    posts = query.order_by(Post.created_at.desc()).limit(current_app.config['FEED_SIZE']).all()
+    updated = max((p.updated_at or p.created_at for p in posts), default=datetime(1970, 1, 1))
+    feed_url = url_for('main.feed', fmt=fmt, slug=slug, username=username, _external=True)
+
+    if fmt == 'json':
+        body = _json_feed(title, home_url, feed_url, posts)
+    else:
+        template = 'feeds/rss.xml' if fmt == 'xml' else 'feeds/atom.xml'
+        body = render_template(template, title=title, home_url=home_url, feed_url=feed_url,
+                               posts=posts, updated=updated)
+    body = body.encode('utf-8')
+    return Feed(body, hashlib.sha1(body).hexdigest(), updated, MIMETYPES[fmt], versions)
@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, TextAreaField, BooleanField, SubmitField, SelectField, URLField, IntegerField
+from wtforms import StringField, PasswordField, TextAreaField, BooleanField, SubmitField, SelectField, URLField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, Optional, URL
-from app.models import User, Category
+from app.models import User
+from app import refdata
 
 class LoginForm(FlaskForm):
     """Login form"""
@@ -102,9 +103,7 @@ class PostForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(PostForm, self).__init__(*args, **kwargs)
-        self.category_id.choices = [(0, 'Select Category')] + [
-            (c.id, c.name) for c in Category.query.order_by(Category.name).all()
-        ]
+        self.category_id.choices = [(0, 'Select Category')] + refdata.category_choices()
 
 class UserProfileForm(FlaskForm):
     """User profile editing form"""
@@ -158,6 +157,7 @@ class CommentForm(FlaskForm):
         DataRequired(message='Comment is required'),
         Length(min=5, max=1000, message='Comment must be between 5 and 1000 characters')
     ], render_kw={'placeholder': 'Share your thoughts...', 'class': 'form-control', 'rows': 4})
+    parent_id = HiddenField('Reply To', validators=[Optional()])
     
     submit = SubmitField('Post Comment', render_kw={'class': 'btn btn-primary'})
 
@@ -192,9 +192,7 @@ class SearchForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(SearchForm, self).__init__(*args, **kwargs)
-        self.category_id.choices = [(0, 'All Categories')] + [
-            (c.id, c.name) for c in Category.query.order_by(Category.name).all()
-        ]
+        self.category_id.choices = [(0, 'All Categories')] + refdata.category_choices()
 
 class ChangePasswordForm(FlaskForm):
     """Change password form"""
@@ -0,0 +1,334 @@
+import json
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.exc import IntegrityError
+
+
+class JobQueue:
+    """Durable background jobs stored in the job table
+
+    enqueue() adds a row to the caller's session, so a job commits (or rolls
+    back) together with the write that caused it. Workers claim due jobs with
+    a conditional UPDATE, which lets any number of threads and processes share
+    one table; failed jobs are retried with exponential backoff. Workers
+    also delete done jobs older than JOBS_RETENTION_DAYS; failed ones stay
+    until someone retries or purges them.
+    """
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_reap = datetime.min
+        self._last_purge = datetime.min
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('JOBS_WORKERS', 2)  # In-process worker threads; 0 to run them with `flask jobs work`
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_RETRY_BACKOFF', 5.0)
+        app.config.setdefault('JOBS_LOCK_TIMEOUT', 300)
+        app.config.setdefault('JOBS_RETENTION_DAYS', 7)  # 0 keeps done jobs forever
+        app.config.setdefault('JOBS_PURGE_INTERVAL', 3600)
+        self.app = app
+        app.extensions['jobs'] = self
+        app.cli.add_command(jobs_cli)
+        if app.config['JOBS_WORKERS']:
+            app.before_request(self._ensure_started)
+        if not self._listening:
+            event.listen(db.session, 'after_commit', self._after_commit)
+            self._listening = True
+
+    def task(self, name):
+        """Register a function as the handler for jobs called name"""
+        def decorator(fn):
+            self.tasks[name] = fn
+            return fn
+        return decorator
+
+    def enqueue(self, name, payload=None, key=None, delay=0):
+        """Add a job to the current session; the caller's commit makes it durable
+
+        With a key, a job still queued under the same name and key is updated
+        in place instead, so saving one post three times runs its work once.
+        A coalesced job keeps its earliest run_at, so a steady stream of
+        enqueues can't postpone it forever. A unique index allows one queued
+        job per (name, key): a keyed job is inserted in a savepoint right
+        away, and if another request queued it first, that job is used.
+        """
+        from app import db
+        from app.models import Job
+
+        if name not in self.tasks:
+            raise KeyError(f'No task registered as {name!r}')
+        payload = json.dumps(payload or {}, sort_keys=True)
+        run_at = datetime.utcnow() + timedelta(seconds=delay)
+        job = self._queued(name, key) if key is not None else None
+        if job is None:
+            job = Job(name=name, key=key, payload=payload, run_at=run_at, attempts=0,
+                      max_attempts=self.app.config['JOBS_MAX_ATTEMPTS'])
+            if key is None:
+                db.session.add(job)
+            else:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(job)
+                except IntegrityError:
+                    # Queued concurrently since the lookup (if a worker already took that one, ours goes in)
+                    job = self._queued(name, key) or job
+                    if job not in db.session:
+                        db.session.add(job)
+        job.payload = payload
+        job.run_at = min(job.run_at, run_at)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    def _queued(self, name, key):
+        from app.models import Job
+
+        return Job.query.filter_by(name=name, key=key, status='queued').first()
+
+    def _after_commit(self, session):
+        if session.info.pop('jobs_enqueued', False):
+            self._wakeup.set()
+
+    def backoff(self, attempts):
+        """Seconds to wait before retry number attempts (doubling, capped at an hour)"""
+        return min(self.app.config['JOBS_RETRY_BACKOFF'] * 2 ** (attempts - 1), 3600)
+
+    def claim(self, worker_id):
+        """Lock the next due job for worker_id and return it, or None"""
+        from app import db
+        from app.models import Job
+
+        now = datetime.utcnow()
+        candidates = db.session.query(Job.id).filter(Job.status == 'queued', Job.run_at <= now).order_by(
+            Job.run_at, Job.id).limit(5).all()
+        for (job_id,) in candidates:
+            # Another worker may have taken it since the SELECT; the status check makes that a no-op
+            claimed = db.session.execute(update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+                status='running', locked_at=now, locked_by=worker_id, attempts=Job.attempts + 1
+            ).execution_options(synchronize_session=False)).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        db.session.rollback()
+        return None
+
+    def run(self, job):
+        """Run a claimed job and record the outcome; returns True on success"""
+        from app import db
+        from app.models import Job
+
+        job_id, name = job.id, job.name
+        try:
+            task = self.tasks.get(name)
+            if task is None:
+                raise LookupError(f'No task registered as {name!r}')
+            task(**json.loads(job.payload or '{}'))
+        except Exception:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.last_error = traceback.format_exc()[-4000:]
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                self.app.logger.error('Job %s (%s) failed permanently after %d attempts', job_id, name, job.attempts)
+            else:
+                job.status = 'queued'
+                job.run_at = datetime.utcnow() + timedelta(seconds=self.backoff(job.attempts))
+                self.app.logger.warning('Job %s (%s) failed, retrying at %s', job_id, name, job.run_at)
+            succeeded = False
+        else:
+            # The task's own uncommitted changes commit together with the status
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            job.last_error = None
+            succeeded = True
+        job.locked_at = job.locked_by = None
+        db.session.commit()
+        return succeeded
+
+    def requeue_stale(self):
+        """Put back jobs whose worker died mid-run (locked longer than JOBS_LOCK_TIMEOUT)"""
+        from app import db
+        from app.models import Job
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['JOBS_LOCK_TIMEOUT'])
+        count = db.session.execute(update(Job).where(Job.status == 'running', Job.locked_at < cutoff).values(
+            status='queued', locked_at=None, locked_by=None
+        ).execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        return count
+
+    def purge_done(self, days, batch_size=1000):
+        """Delete done jobs that finished more than days ago, batch_size rows per transaction"""
+        from app import db
+        from app.models import Job
+
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        total = 0
+        while True:
+            # Short batches so the deletes never hold locks the claiming workers are waiting on
+            batch = select(Job.id).where(Job.status == 'done', Job.finished_at < cutoff).limit(batch_size)
+            count = db.session.execute(delete(Job).where(Job.id.in_(batch.scalar_subquery())).execution_options(
+                synchronize_session=False)).rowcount
+            db.session.commit()
+            total += count
+            if count < batch_size:
+                return total
+
+    def run_pending(self, worker_id=None, limit=None):
+        """Run due jobs until none are left or limit is reached; returns how many ran"""
+        worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        now = datetime.utcnow()
+        if now - self._last_reap > timedelta(seconds=self.app.config['JOBS_LOCK_TIMEOUT'] / 2):
+            self._last_reap = now
+            self.requeue_stale()
+        retention = self.app.config['JOBS_RETENTION_DAYS']
+        if retention and now - self._last_purge > timedelta(seconds=self.app.config['JOBS_PURGE_INTERVAL']):
+            self._last_purge = now
+            self.purge_done(retention)
+        ran = 0
+        while limit is None or ran < limit:
+            job = self.claim(worker_id)
+            if job is None:
+                break
+            self.run(job)
+            ran += 1
+        return ran
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            self.start(self.app.config['JOBS_WORKERS'])
+
+    def start(self, count):
+        """Start count worker threads in this process"""
+        with self._lock:
+            # Started lazily (and again after a fork) so gunicorn workers never share threads
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for index in range(count):
+                worker_id = f'{socket.gethostname()}:{self._pid}:{index}'
+                thread = threading.Thread(target=self._work, args=(worker_id,), name=f'job-worker-{index}',
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self, worker_id):
+        while True:
+            try:
+                with self.app.app_context():
+                    ran = self.run_pending(worker_id, limit=100)
+            except Exception:
+                self.app.logger.exception('Job worker %s crashed while polling', worker_id)
+                ran = 0
+            if not ran:
+                self._wakeup.wait(self.app.config['JOBS_POLL_INTERVAL'])
+                self._wakeup.clear()
+
+    def stats(self):
+        """Job counts by status plus the age of the oldest due job (needs an app context)"""
+        from app import db
+        from app.models import Job
+
+        counts = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+        oldest = db.session.query(db.func.min(Job.run_at)).filter(
+            Job.status == 'queued', Job.run_at <= datetime.utcnow()).scalar()
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_due_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0,
+            'workers': len(self._threads) if self._pid == os.getpid() else 0,
+        }
+
+
+jobs_cli = AppGroup('jobs', help='Inspect and run background jobs.')
+
+
+@jobs_cli.command('stats')
+def stats_command():
+    """Show job counts by status"""
+    for name, value in current_app.extensions['jobs'].stats().items():
+        click.echo(f'{name:<20} {value}')
+
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice(['queued', 'running', 'done', 'failed']))
+@click.option('--limit', default=20, show_default=True)
+def list_command(status, limit):
+    """List the most recent jobs"""
+    from app.models import Job
+
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter_by(status=status)
+    for job in query.limit(limit):
+        error = job.last_error.strip().splitlines()[-1] if job.last_error else ''
+        click.echo(f'{job.id:>6} {job.status:<8} {job.name:<24} {job.key or "-":<16} '
+                   f'attempts={job.attempts}/{job.max_attempts} run_at={job.run_at:%Y-%m-%d %H:%M:%S} {error}')
+
+
+@jobs_cli.command('drain')
+def drain_command():
+    """Run every due job in this process, then exit"""
+    ran = current_app.extensions['jobs'].run_pending()
+    click.echo(f'Ran {ran} job(s)')
+
+
+@jobs_cli.command('work')
+@click.option('--workers', default=2, show_default=True, help='worker threads')
+def work_command(workers):
+    """Run a worker pool in the foreground (beside gunicorn started with JOBS_WORKERS=0)"""
+    queue = current_app.extensions['jobs']
+    queue.start(workers)
+    click.echo(f'Processing jobs with {workers} worker thread(s); Ctrl-C to stop')
+    try:
+        for thread in queue._threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', nargs=-1, type=int)
+@click.option('--failed', 'all_failed', is_flag=True, help='requeue every failed job')
+def retry_command(job_ids, all_failed):
+    """Requeue failed jobs now"""
+    from app import db
+    from app.models import Job
+
+    query = Job.query.filter_by(status='failed')
+    if not all_failed:
+        query = query.filter(Job.id.in_(job_ids))
+    count = query.update({'status': 'queued', 'attempts': 0, 'run_at': datetime.utcnow(), 'finished_at': None},
+                         synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Requeued {count} job(s)')
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=7, show_default=True, help='delete finished jobs older than this')
+def purge_command(days):
+    """Delete done jobs older than --days"""
+    count = current_app.extensions['jobs'].purge_done(days)
+    click.echo(f'Deleted {count} job(s)')
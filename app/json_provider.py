@@ -0,0 +1,70 @@
+"""
+JSON encoding for every response, with an optional fast backend
+
+JSON_ENCODER selects what jsonify, request.get_json() and the tojson
+filter use: 'orjson', 'stdlib' (the json module) or 'auto', which means
+orjson when it is installed. orjson is several times faster on large
+payloads. Both backends write datetimes and dates as ISO 8601 (naive UTC
+values without a suffix), so to_dict() methods hand over datetime
+objects and leave the formatting here. Flask's own default would write
+them as HTTP dates.
+
+Output is the same JSON either way. The one difference is that orjson
+writes non-ASCII characters as UTF-8 rather than \\u escapes.
+"""
+
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+
+ENCODERS = ('auto', 'orjson', 'stdlib')
+
+
+def encode_default(value):
+    """default= hook for values the encoders don't handle natively"""
+    if isinstance(value, date):  # datetime included
+        return value.isoformat()
+    if isinstance(value, tuple):  # orjson rejects namedtuples; json writes them as arrays
+        return list(value)
+    return DefaultJSONProvider.default(value)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with ISO 8601 datetimes and orjson when available"""
+
+    default = staticmethod(encode_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        choice = app.config['JSON_ENCODER']
+        if choice not in ENCODERS:
+            raise ValueError(f'JSON_ENCODER must be one of {", ".join(ENCODERS)}, not {choice!r}')
+        self.orjson = None
+        if choice != 'stdlib':
+            try:
+                import orjson
+            except ImportError:
+                if choice == 'orjson':
+                    raise RuntimeError('JSON_ENCODER is orjson but the orjson package is not installed')
+            else:
+                self.orjson = orjson
+
+    @property
+    def encoder(self):
+        return 'orjson' if self.orjson else 'stdlib'
+
+    def dumps(self, obj, **kwargs):
+        # orjson has no equivalent for other json.dumps arguments (cls=, custom separators); leave those to json
+        if self.orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = self.orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= self.orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= self.orjson.OPT_INDENT_2
+        return self.orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return self.orjson.loads(s)
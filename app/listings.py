@@ -0,0 +1,124 @@
+"""
+Read-only post listings without ORM instances
+
+Listing pages and the post APIs read a dozen columns of each post, its
+author and its category. Loading them as Post, User and Category objects
+registers every row in the identity map and sets up attribute
+instrumentation and lazy-load hooks, none of which a read-only page uses.
+These queries select exactly the listed columns, run them as plain Core
+statements on the session's connection and wrap each row in namedtuples
+(like app/refdata.py). The rows quack like the models where
+templates and serializers touch them: post.author.get_full_name(),
+post.generate_excerpt(), post.to_dict() and Post.to_dict_many(rows) all
+work unchanged.
+
+Rows are snapshots: they have no relationships beyond author and category,
+and writes still go through the models. Being Core queries they don't
+autoflush, so flush or commit pending changes before listing them.
+python benchmarks/listings_bench.py compares the two paths.
+"""
+
+from collections import namedtuple
+
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Category, Post, User, display_name, full_name, initials, make_excerpt
+
+
+class AuthorRow(namedtuple('AuthorRow', 'id username first_name last_name')):
+    __slots__ = ()
+
+    def get_full_name(self):
+        return full_name(self.first_name, self.last_name)
+
+    def get_display_name(self):
+        return display_name(self.username, self.first_name, self.last_name)
+
+    def get_initials(self):
+        return initials(self.username, self.first_name, self.last_name)
+
+
+class CategoryRow(namedtuple('CategoryRow', 'id name description slug color created_at')):
+    __slots__ = ()
+
+    def to_dict(self, post_count=None):
+        """Same shape as Category.to_dict()"""
+        if post_count is None:
+            post_count = Category.post_counts([self.id]).get(self.id, 0)
+        return {'id': self.id, 'name': self.name, 'description': self.description, 'slug': self.slug,
+                'color': self.color, 'post_count': post_count, 'created_at': self.created_at}
+
+
+class PostRow(namedtuple('PostRow', 'id title slug content excerpt reading_time word_count is_published is_featured '
+                                    'view_count like_count created_at updated_at published_at user_id category_id '
+                                    'author category')):
+    __slots__ = ()
+
+    def generate_excerpt(self, length=150):
+        return make_excerpt(self.content, length)
+
+    def to_dict(self, comment_count=None, category_post_count=None):
+        """Same shape as Post.to_dict(); pass the counts (Post.to_dict_many() batches them) to save queries"""
+        if comment_count is None:
+            comment_count = Post.comment_counts([self.id]).get(self.id, 0)
+        return {
+            'id': self.id, 'title': self.title, 'slug': self.slug, 'content': self.content,
+            'excerpt': self.excerpt or self.generate_excerpt(),
+            'reading_time': self.reading_time, 'word_count': self.word_count,
+            'is_published': self.is_published, 'is_featured': self.is_featured,
+            'view_count': self.view_count, 'like_count': self.like_count, 'comment_count': comment_count,
+            'created_at': self.created_at, 'updated_at': self.updated_at,
+            'published_at': self.published_at,
+            'category': self.category.to_dict(category_post_count) if self.category else None,
+            'author': {'id': self.author.id, 'username': self.author.username,
+                       'display_name': self.author.get_display_name(), 'initials': self.author.get_initials()},
+        }
+
+
+_POST_COLUMNS = (Post.id, Post.title, Post.slug, Post.content, Post.excerpt, Post.reading_time, Post.word_count,
+                 Post.is_published, Post.is_featured, Post.view_count, Post.like_count, Post.created_at,
+                 Post.updated_at, Post.published_at, Post.user_id, Post.category_id)
+_AUTHOR_COLUMNS = (User.id, User.username, User.first_name, User.last_name)
+_CATEGORY_COLUMNS = (Category.id, Category.name, Category.description, Category.slug, Category.color,
+                     Category.created_at)
+_AUTHOR_AT = len(_POST_COLUMNS)
+_CATEGORY_AT = _AUTHOR_AT + len(_AUTHOR_COLUMNS)
+
+
+def posts():
+    """SELECT of the listing columns of every post with its author and category; add filters and order"""
+    return select(*_POST_COLUMNS, *_AUTHOR_COLUMNS, *_CATEGORY_COLUMNS).join(
+        User, User.id == Post.user_id).outerjoin(Category, Category.id == Post.category_id)
+
+
+def published_posts():
+    return posts().where(Post.is_published == True)
+
+
+def _row(row):
+    category = CategoryRow(*row[_CATEGORY_AT:]) if row[_CATEGORY_AT] is not None else None
+    return PostRow(*row[:_AUTHOR_AT], AuthorRow(*row[_AUTHOR_AT:_CATEGORY_AT]), category)
+
+
+def fetch(statement):
+    """[PostRow] for a statement built on posts()"""
+    return [_row(row) for row in db.session.connection().execute(statement)]
+
+
+class RowPagination(Pagination):
+    """Flask-SQLAlchemy pagination over a posts() statement, with PostRow items"""
+
+    def _query_items(self):
+        statement = self._query_args['statement']
+        return fetch(statement.limit(self.per_page).offset(self._query_offset))
+
+    def _query_count(self):
+        statement = self._query_args['statement'].order_by(None).subquery()
+        return db.session.execute(select(func.count()).select_from(statement)).scalar()
+
+
+def paginate(statement, page, per_page, count=True):
+    return RowPagination(statement=statement, page=page, per_page=per_page, max_per_page=None, error_out=False,
+                         count=count)
@@ -0,0 +1,303 @@
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+
+# Histogram bucket upper bounds; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# name -> (type, help)
+METRICS = {
+    'flask_http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'flask_http_requests_total': ('counter', 'Requests by endpoint and status code'),
+    'flask_http_requests_in_progress': ('gauge', 'Requests currently being handled'),
+    'flask_db_duration_seconds': ('histogram', 'Time spent in SQL per request'),
+    'flask_db_statements_per_request': ('histogram', 'SQL statements executed per request'),
+    'flask_db_statements_total': ('counter', 'SQL statements executed by endpoint'),
+    'flask_template_render_seconds': ('histogram', 'Template render time by template'),
+}
+
+
+class _Shard:
+    """Metric values written by exactly one thread, so updates need no lock"""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, key, amount):
+        self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def observe(self, key, value, buckets):
+        values = self.histograms.get(key)
+        if values is None:
+            # One slot per bucket plus +Inf, then sum
+            values = self.histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                values[i] += 1
+                break
+        else:
+            values[len(buckets)] += 1
+        values[-1] += value
+
+
+class _RequestRecord:
+    __slots__ = ('endpoint', 'method', 'start', 'status', 'db_time', 'statements')
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.start = time.perf_counter()
+        self.status = 500
+        self.db_time = 0.0
+        self.statements = 0
+
+
+def _snapshot(shards):
+    """Sum every shard into plain dicts keyed by 'name|label=value,...'"""
+    counters, gauges, histograms = {}, {}, {}
+    for shard in shards:
+        for key, value in shard.counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for key, value in shard.gauges.copy().items():
+            gauges[key] = gauges.get(key, 0) + value
+        for key, values in shard.histograms.copy().items():
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, v in enumerate(list(values)):
+                merged[i] += v
+    return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+
+def _merge(total, snapshot, include_gauges=True):
+    for kind in ('counters', 'gauges'):
+        if kind == 'gauges' and not include_gauges:
+            continue
+        for key, value in snapshot[kind].items():
+            total[kind][key] = total[kind].get(key, 0) + value
+    for key, values in snapshot['histograms'].items():
+        merged = total['histograms'].setdefault(key, [0] * len(values))
+        for i, v in enumerate(values):
+            merged[i] += v
+
+
+def _key(name, **labels):
+    return name + '|' + ','.join(f'{k}={v}' for k, v in labels.items())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RequestMetrics:
+    """Per-endpoint request instrumentation exported in Prometheus text format
+
+    Each thread aggregates into its own shard and shards are only summed when
+    /admin/metrics is scraped. With METRICS_MULTIPROC_DIR set, every worker
+    process periodically writes its totals to a JSON file in that directory
+    and the scrape merges all of them; gauges from dead workers are skipped.
+    Clear the directory before starting gunicorn.
+    """
+
+    def __init__(self, app=None):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_MULTIPROC_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 5.0)
+        app.config.setdefault('METRICS_TOKEN', None)
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.app = app
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render_template, app)
+        template_rendered.connect(self._template_rendered, app)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @property
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    @property
+    def current(self):
+        """The in-flight request record for this thread, if any"""
+        return getattr(self._local, 'record', None)
+
+    def _before_request(self):
+        if self.app.config['METRICS_MULTIPROC_DIR'] and self._writer_pid != os.getpid():
+            self._start_writer()
+        record = self._local.record = _RequestRecord(request.endpoint or 'unmatched', request.method)
+        self.shard.gauge(_key('flask_http_requests_in_progress', endpoint=record.endpoint), 1)
+
+    def _after_request(self, response):
+        record = self.current
+        if record is not None:
+            record.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        record = self.current
+        if record is None:
+            return
+        self._local.record = None
+        elapsed = time.perf_counter() - record.start
+        shard = self.shard
+        endpoint = record.endpoint
+        shard.gauge(_key('flask_http_requests_in_progress', endpoint=endpoint), -1)
+        shard.observe(_key('flask_http_request_duration_seconds', endpoint=endpoint, method=record.method),
+                      elapsed, LATENCY_BUCKETS)
+        shard.inc(_key('flask_http_requests_total', endpoint=endpoint, method=record.method, status=record.status))
+        shard.observe(_key('flask_db_duration_seconds', endpoint=endpoint), record.db_time, LATENCY_BUCKETS)
+        shard.observe(_key('flask_db_statements_per_request', endpoint=endpoint), record.statements, STATEMENT_BUCKETS)
+        if record.statements:
+            shard.inc(_key('flask_db_statements_total', endpoint=endpoint), record.statements)
+
+    def _before_render_template(self, sender, template, context, **extra):
+        # A stack, since a template can render another from a context function or macro
+        renders = getattr(self._local, 'renders', None)
+        if renders is None:
+            renders = self._local.renders = []
+        renders.append(time.perf_counter())
+
+    def _template_rendered(self, sender, template, context, **extra):
+        renders = getattr(self._local, 'renders', None)
+        if not renders:
+            return
+        elapsed = time.perf_counter() - renders.pop()
+        self.shard.observe(_key('flask_template_render_seconds', template=template.name), elapsed, LATENCY_BUCKETS)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_query_start'].pop()
+        record = self.current
+        if record is not None:
+            record.db_time += time.perf_counter() - started
+            record.statements += 1
+
+    # ----- multiprocess mode -----
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            # A forked worker must not report its parent's totals as its own
+            if self._writer_pid is not None:
+                self._shards = []
+                self._local = threading.local()
+            self._writer_pid = os.getpid()
+            self._writer = threading.Thread(target=self._write_loop, name='metrics-writer', daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.app.config['METRICS_FLUSH_INTERVAL'])
+            try:
+                self.write_process_file()
+            except OSError:
+                self.app.logger.exception('Failed to write metrics file')
+
+    def write_process_file(self):
+        """Atomically write this process's totals to METRICS_MULTIPROC_DIR"""
+        directory = self.app.config['METRICS_MULTIPROC_DIR']
+        path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(_snapshot(list(self._shards)), f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Return merged totals for this process, or for all workers in multiprocess mode"""
+        local = _snapshot(list(self._shards))
+        directory = self.app.config['METRICS_MULTIPROC_DIR']
+        if not directory:
+            return local
+
+        total = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        _merge(total, local)
+        for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+            pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _merge(total, snapshot, include_gauges=_pid_alive(pid))
+        return total
+
+    def render(self):
+        """Render collected metrics in the Prometheus text exposition format"""
+        data = self.collect()
+        grouped = {}
+        for kind in ('counters', 'gauges', 'histograms'):
+            for key, value in data[kind].items():
+                name, _, labels = key.partition('|')
+                grouped.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            samples = grouped.get(name)
+            if not samples:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            buckets = STATEMENT_BUCKETS if name == 'flask_db_statements_per_request' else LATENCY_BUCKETS
+            for labels, value in sorted(samples):
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in
+                                      (pair.split('=', 1) for pair in labels.split(',') if pair))
+                if kind != 'histogram':
+                    lines.append(f'{name}{{{label_text}}} {_format(value)}')
+                    continue
+                prefix = label_text + ',' if label_text else ''
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_text}}} {_format(value[-1])}')
+                lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -4,6 +4,24 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from app import db
 
+# Name and excerpt helpers as plain functions, shared by the models and the read-only rows in app/listings.py
+def full_name(first_name, last_name):
+    return f"{first_name} {last_name}"
+
+def display_name(username, first_name, last_name):
+    """Full name when both parts are set, else the username"""
+    return full_name(first_name, last_name) if first_name and last_name else username
+
+def initials(username, first_name, last_name):
+    """Avatar initials: first letters of the full name, else of the username"""
+    return f"{first_name[0].upper()}{last_name[0].upper()}" if first_name and last_name else username[0].upper()
+
+def make_excerpt(content, length=150):
+    """The first length characters of content, cut at a word boundary"""
+    if len(content) <= length:
+        return content
+    return content[:length].rsplit(' ', 1)[0] + '...'
+
 class User(UserMixin, db.Model):
     """Enhanced User model for authentication and profiles"""
     id = db.Column(db.Integer, primary_key=True)
@@ -33,8 +51,11 @@ class User(UserMixin, db.Model):
     last_active = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan')
-    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan')
+    # The database deletes dependent rows (ON DELETE CASCADE; flask schema upgrade adds it to older tables);
+    # passive_deletes stops the ORM loading them first
+    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan',
+                               passive_deletes=True)
     
     def set_password(self, password):
         """Hash and set password"""
@@ -46,15 +67,15 @@ class User(UserMixin, db.Model):
     
     def get_full_name(self):
         """Return full name"""
-        return f"{self.first_name} {self.last_name}"
+        return full_name(self.first_name, self.last_name)
     
     def get_display_name(self):
         """Return display name (username or full name)"""
-        return self.get_full_name() if self.first_name and self.last_name else self.username
+        return display_name(self.username, self.first_name, self.last_name)
     
     def get_initials(self):
         """Return user initials for avatar"""
-        return f"{self.first_name[0].upper()}{self.last_name[0].upper()}" if self.first_name and self.last_name else self.username[0].upper()
+        return initials(self.username, self.first_name, self.last_name)
     
     def get_post_count(self):
         """Get published post count"""
@@ -86,8 +107,8 @@ class User(UserMixin, db.Model):
             'is_active': self.is_active,
             'is_verified': self.is_verified,
             'is_admin': self.is_admin,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'last_active': self.last_active.isoformat() if self.last_active else None,
+            'created_at': self.created_at,
+            'last_active': self.last_active,
             'post_count': self.get_post_count(),
             'comment_count': self.get_comment_count()
         }
@@ -111,7 +132,15 @@ class Category(db.Model):
         """Get published post count in this category"""
         return Post.query.filter_by(category_id=self.id, is_published=True).count()
     
-    def to_dict(self):
+    @staticmethod
+    def post_counts(category_ids=None):
+        """Published post counts keyed by category id, in one grouped query"""
+        query = db.session.query(Post.category_id, db.func.count(Post.id)).filter(Post.is_published == True)
+        if category_ids is not None:
+            query = query.filter(Post.category_id.in_(category_ids))
+        return dict(query.group_by(Post.category_id).all())
+    
+    def to_dict(self, post_count=None):
         """Convert category to dictionary for JSON responses"""
         return {
             'id': self.id,
@@ -119,8 +148,8 @@ class Category(db.Model):
             'description': self.description,
             'slug': self.slug,
             'color': self.color,
-            'post_count': self.get_post_count(),
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'post_count': self.get_post_count() if post_count is None else post_count,
+            'created_at': self.created_at
         }
     
     def __repr__(self):
@@ -157,11 +186,21 @@ class Post(db.Model):
     published_at = db.Column(db.DateTime)
     
     # Foreign keys
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     
     # Relationships
-    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
+    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan',
+                               passive_deletes=True)
+    # Written through app.tags.sync_post_tags, which also keeps Tag.post_count current
+    tags = db.relationship('Tag', secondary='post_tag', lazy=True, viewonly=True, order_by='Tag.name')
+    
+    # Newest-published-first listings (home page, feeds) per site, category and author
+    __table_args__ = (
+        db.Index('ix_post_published_created', 'is_published', 'created_at'),
+        db.Index('ix_post_category_published_created', 'category_id', 'is_published', 'created_at'),
+        db.Index('ix_post_user_published_created', 'user_id', 'is_published', 'created_at'),
+    )
     
     def generate_slug(self):
         """Generate URL-friendly slug from title"""
@@ -178,9 +217,7 @@ class Post(db.Model):
     
     def generate_excerpt(self, length=150):
         """Generate excerpt from content"""
-        if len(self.content) <= length:
-            return self.content
-        return self.content[:length].rsplit(' ', 1)[0] + '...'
+        return make_excerpt(self.content, length)
     
     def increment_views(self):
         """Increment view count"""
@@ -191,7 +228,29 @@ class Post(db.Model):
         """Get comment count"""
         return Comment.query.filter_by(post_id=self.id).count()
     
-    def to_dict(self):
+    @staticmethod
+    def comment_counts(post_ids):
+        """Comment counts keyed by post id, in one grouped query"""
+        if not post_ids:
+            return {}
+        return dict(db.session.query(Comment.post_id, db.func.count(Comment.id)).filter(
+            Comment.post_id.in_(post_ids)).group_by(Comment.post_id).all())
+    
+    @staticmethod
+    def to_dict_many(posts):
+        """to_dict() for a list of posts with the per-post counts batched
+
+        Load the posts with joinedload(Post.author) and joinedload(Post.category),
+        or pass PostRows from app/listings.py, so serializing a page costs two
+        extra queries instead of several per post.
+        """
+        comment_counts = Post.comment_counts([p.id for p in posts])
+        category_counts = Category.post_counts({p.category_id for p in posts if p.category_id})
+        return [post.to_dict(comment_count=comment_counts.get(post.id, 0),
+                             category_post_count=category_counts.get(post.category_id, 0))
+                for post in posts]
+    
+    def to_dict(self, comment_count=None, category_post_count=None):
         """Convert post to dictionary for JSON responses"""
         return {
             'id': self.id,
@@ -205,11 +264,11 @@ class Post(db.Model):
             'is_featured': self.is_featured,
             'view_count': self.view_count,
             'like_count': self.like_count,
-            'comment_count': self.get_comment_count(),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'published_at': self.published_at.isoformat() if self.published_at else None,
-            'category': self.category.to_dict() if self.category else None,
+            'comment_count': self.get_comment_count() if comment_count is None else comment_count,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'published_at': self.published_at,
+            'category': self.category.to_dict(post_count=category_post_count) if self.category else None,
             'author': {
                 'id': self.author.id,
                 'username': self.author.username,
@@ -232,28 +291,265 @@ class Comment(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Foreign keys
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
-    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'))  # For threaded comments
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False, index=True)
+    # For threaded comments; replies outlive a deleted parent
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='SET NULL'), index=True)
     
     # Relationships
-    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy=True)
+    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy=True,
+                              passive_deletes=True)
     
-    def to_dict(self):
+    # Moderation queue: newest first within an approval state
+    __table_args__ = (db.Index('ix_comment_approved_id', 'is_approved', 'id'),)
+    
+    @staticmethod
+    def reply_counts(comment_ids):
+        """Reply counts keyed by comment id, in one grouped query"""
+        if not comment_ids:
+            return {}
+        return dict(db.session.query(Comment.parent_id, db.func.count(Comment.id)).filter(
+            Comment.parent_id.in_(comment_ids)).group_by(Comment.parent_id).all())
+    
+    def to_dict(self, reply_count=None):
         """Convert comment to dictionary for JSON responses"""
         return {
             'id': self.id,
             'content': self.content,
             'is_approved': self.is_approved,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'author': {
                 'id': self.author.id,
                 'display_name': self.author.get_display_name(),
                 'initials': self.author.get_initials()
             } if self.author else None,
-            'reply_count': len(self.replies)
+            'reply_count': len(self.replies) if reply_count is None else reply_count
         }
     
     def __repr__(self):
-        return f'<Comment {self.id} by {self.author.username}>' 
\ No newline at end of file
+        return f'<Comment {self.id} by {self.author.username}>' 
+
+class PerformanceMetric(db.Model):
+    """Append-only Navigation Timing beacon from the browser (see app/rum.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    page = db.Column(db.String(255), nullable=False)
+    ttfb = db.Column(db.Float)  # Time to first byte (ms)
+    load_time = db.Column(db.Float)  # fetchStart -> loadEventEnd (ms)
+    dom_content_loaded = db.Column(db.Float)
+    lcp = db.Column(db.Float)
+    fid = db.Column(db.Float)
+    cls = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class ClientError(db.Model):
+    """Append-only JavaScript error report from the browser"""
+    id = db.Column(db.Integer, primary_key=True)
+    page = db.Column(db.String(255))
+    type = db.Column(db.String(20))
+    message = db.Column(db.String(500))
+    filename = db.Column(db.String(255))
+    lineno = db.Column(db.Integer)
+    colno = db.Column(db.Integer)
+    stack = db.Column(db.Text)
+    user_agent = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class PerformanceRollup(db.Model):
+    """Daily per-page percentile summary of PerformanceMetric rows"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    page = db.Column(db.String(255), nullable=False)
+    samples = db.Column(db.Integer, default=0)
+    ttfb_p50 = db.Column(db.Float)
+    ttfb_p95 = db.Column(db.Float)
+    ttfb_p99 = db.Column(db.Float)
+    load_p50 = db.Column(db.Float)
+    load_p95 = db.Column(db.Float)
+    load_p99 = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('day', 'page', name='uq_performance_rollup_day_page'),)
+
+
+class Job(db.Model):
+    """Durable background job row, claimed and run by app/jobs.py workers"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(100))  # Dedupe key: one queued job per (name, key), enforced by ux_job_queued_name_key
+    payload = db.Column(db.Text, default='{}')  # JSON keyword arguments
+    status = db.Column(db.String(10), default='queued', nullable=False)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=5)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+        # Partial: only queued jobs are deduplicated; NULL keys never collide
+        db.Index('ux_job_queued_name_key', 'name', 'key', unique=True,
+                 sqlite_where=db.text("status = 'queued'"), postgresql_where=db.text("status = 'queued'")),
+        db.Index('ix_job_status_finished_at', 'status', 'finished_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'key': self.key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at,
+            'last_error': self.last_error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
+
+
+class Notification(db.Model):
+    """A comment or reply event waiting to go out in the recipient's next digest (see app/notifications.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # comment or reply
+    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False, index=True)
+    comment_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)  # None until delivered (or dropped because the recipient opted out)
+
+    recipient = db.relationship('User', foreign_keys=[recipient_id])
+    actor = db.relationship('User', foreign_keys=[actor_id])
+    post = db.relationship('Post')
+
+    __table_args__ = (db.Index('ix_notification_pending', 'sent_at', 'recipient_id'),)
+
+    def __repr__(self):
+        return f'<Notification {self.kind} for user {self.recipient_id}>'
+
+
+class TrendingScore(db.Model):
+    """Checkpointed time-decayed popularity of a post (see app/trending.py)"""
+    __tablename__ = 'post_trending'
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0.0)  # Relative to landmark
+    landmark = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<TrendingScore post={self.post_id} {self.score:.1f}@{self.landmark}>'
+
+
+# Many-to-many between posts and tags. The primary key serves "tags of a post";
+# the (tag_id, post_id) index serves tag listings newest post first.
+post_tag = db.Table(
+    'post_tag',
+    db.Column('post_id', db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_post_tag_tag_post', 'tag_id', 'post_id'),
+)
+
+
+class Tag(db.Model):
+    """Normalized post tag, parsed from Post.meta_keywords (see app/tags.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    slug = db.Column(db.String(60), unique=True, nullable=False, index=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)  # Published posts, maintained on write
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert tag to dictionary for JSON responses"""
+        return {'id': self.id, 'name': self.name, 'slug': self.slug, 'post_count': self.post_count}
+
+    def __repr__(self):
+        return f'<Tag {self.slug}>'
+
+
+class PostRevision(db.Model):
+    """One saved version of a post: a full snapshot or a compressed delta (see app/revisions.py)"""
+    __tablename__ = 'post_revision'
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    number = db.Column(db.Integer, nullable=False)  # 1, 2, ... per post
+    base = db.Column(db.Integer, nullable=False)  # Snapshot the delta chain starts from; == number for snapshots
+    title = db.Column(db.String(200), nullable=False)
+    length = db.Column(db.Integer, nullable=False)  # Characters in the full content
+    payload = db.Column(db.LargeBinary, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('post_id', 'number', name='uq_post_revision_number'),)
+
+    @property
+    def is_snapshot(self):
+        return self.number == self.base
+
+    def __repr__(self):
+        return f'<PostRevision post={self.post_id} #{self.number}>'
+
+
+class EngagementEvent(db.Model):
+    """Append-only view/like/comment event, partitioned by UTC day (see app/engagement.py)"""
+    __tablename__ = 'engagement_event'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    post_id = db.Column(db.Integer, nullable=False)  # No foreign key: the log outlives deleted posts until pruned
+    kind = db.Column(db.SmallInteger, nullable=False)  # engagement.KINDS
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_engagement_event_day_post', 'day', 'post_id'),)
+
+
+class PostEngagementDaily(db.Model):
+    """One post's views, likes and comments on one day"""
+    __tablename__ = 'post_engagement_daily'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'day', name='uq_post_engagement_daily_post_day'),
+        db.Index('ix_post_engagement_daily_author_day', 'author_id', 'day'),
+        db.Index('ix_post_engagement_daily_day', 'day'),
+    )
+
+
+class AuthorEngagementDaily(db.Model):
+    """Totals of an author's PostEngagementDaily rows for one day"""
+    __tablename__ = 'author_engagement_daily'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('author_id', 'day', name='uq_author_engagement_daily_author_day'),
+        db.Index('ix_author_engagement_daily_day', 'day'),
+    )
+
+
+class PostViewSketch(db.Model):
+    """HyperLogLog sketch of one post's distinct viewers on one day (see app/uniques.py)"""
+    __tablename__ = 'post_view_sketch'
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    registers = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed register array
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped on every merge (optimistic locking)
+
+    def __repr__(self):
+        return f'<PostViewSketch post={self.post_id} {self.day}>'
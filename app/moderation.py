@@ -0,0 +1,131 @@
+"""
+Bulk comment moderation and spam-account removal
+
+Every operation is a few set-based UPDATE/DELETE statements over id lists.
+Deleting a user or comment relies on the database's ON DELETE CASCADE to
+remove dependent posts, comments and notifications, so nothing is loaded
+into the session no matter how large the spam wave.
+"""
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import joinedload
+
+from app import cache, db, suggestions, tags
+from app.search import SEARCH_SCOPE
+
+ACTIONS = ('approve', 'reject', 'delete', 'spam')
+STATUSES = ('pending', 'approved', 'all')
+
+# Keeps each IN list well under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def _chunks(ids):
+    ids = sorted(set(ids))
+    for i in range(0, len(ids), CHUNK_SIZE):
+        yield ids[i:i + CHUNK_SIZE]
+
+
+def moderation_queue(status='pending', user_id=None, before=None, limit=50):
+    """One page of comments, newest first, plus the id to pass as before for the next page
+
+    Keyset paging on (is_approved, id) stays an index range scan however
+    deep the queue is.
+    """
+    from app.models import Comment
+
+    query = Comment.query.options(joinedload(Comment.author), joinedload(Comment.post))
+    if status != 'all':
+        query = query.filter(Comment.is_approved == (status == 'approved'))
+    if user_id:
+        query = query.filter(Comment.user_id == user_id)
+    if before:
+        query = query.filter(Comment.id < before)
+    comments = query.order_by(Comment.id.desc()).limit(limit + 1).all()
+    next_before = comments[limit - 1].id if len(comments) > limit else None
+    return comments[:limit], next_before
+
+
+def moderate_comments(comment_ids, action):
+    """Approve, reject (hide) or delete comments, or remove their authors as spam
+
+    Returns the number of comments affected, or of users removed for 'spam'.
+    """
+    from app.models import Comment
+
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown moderation action {action!r}')
+    if action == 'spam':
+        authors = set()
+        for chunk in _chunks(comment_ids):
+            authors.update(db.session.scalars(db.select(Comment.user_id).where(Comment.id.in_(chunk))))
+        return purge_users(authors)
+
+    count = 0
+    for chunk in _chunks(comment_ids):
+        if action == 'delete':
+            statement = delete(Comment).where(Comment.id.in_(chunk))
+        else:
+            statement = update(Comment).where(Comment.id.in_(chunk)).values(is_approved=action == 'approve')
+        count += db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+    db.session.commit()
+    return count
+
+
+def purge_scopes(user_ids):
+    """Cache scopes touched by deleting these users and everything they published"""
+    from app import refdata, sitemap
+    from app.feeds import feed_scopes
+    from app.models import Post
+
+    size = sitemap.shard_size()
+    category_ids, shards, featured = set(), set(), False
+    for chunk in _chunks(user_ids):
+        rows = db.session.query(Post.category_id, Post.id // size, Post.is_featured).filter(
+            Post.user_id.in_(chunk), Post.is_published == True).distinct()
+        for category_id, shard, is_featured in rows:
+            category_ids.add(category_id)
+            shards.add(shard)
+            featured = featured or is_featured
+
+    scopes = set()
+    for user_id in user_ids:
+        scopes.update(feed_scopes(user_id, *category_ids))
+        scopes.update(sitemap.profile_scopes(user_id))
+    for shard in shards:
+        scopes.update(sitemap.post_scopes(shard * size))
+    if shards:
+        scopes.update((refdata.CATEGORIES, SEARCH_SCOPE))
+    if featured:
+        scopes.add(refdata.FEATURED)
+    return scopes
+
+
+def purge_users(user_ids):
+    """Delete accounts with all their posts, comments and notifications; admins are never removed
+
+    Returns the number of users deleted.
+    """
+    from app.models import Post, User, post_tag
+
+    targets = set()
+    for chunk in _chunks(user_ids):
+        targets.update(db.session.scalars(db.select(User.id).where(User.id.in_(chunk), User.is_admin == False)))
+    if not targets:
+        return 0
+
+    scopes = purge_scopes(targets)
+    tag_ids = set()
+    for chunk in _chunks(targets):
+        tag_ids.update(db.session.scalars(db.select(post_tag.c.tag_id).join(Post, Post.id == post_tag.c.post_id).where(
+            Post.user_id.in_(chunk)).distinct()))
+    count = 0
+    for chunk in _chunks(targets):
+        count += db.session.execute(delete(User).where(User.id.in_(chunk)),
+                                    execution_options={'synchronize_session': False}).rowcount
+    for chunk in _chunks(tag_ids):
+        tags.recount(chunk)
+    db.session.commit()
+    cache.invalidate(*sorted(scopes))
+    suggestions.authors_deleted(targets)
+    return count
@@ -0,0 +1,259 @@
+import smtplib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from urllib.parse import unquote, urlsplit
+
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+
+
+_PLURALS = {'comment': 'comments', 'reply': 'replies'}
+
+
+def _count(n, kind):
+    return f'{n} new {kind if n == 1 else _PLURALS[kind]}'
+
+
+class ConsoleTransport:
+    """Logs messages instead of sending them (the development default)"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def open(self):
+        return self
+
+    def send(self, message):
+        self.logger.info('Email to %s: %s\n%s', message['To'], message['Subject'], message.get_content())
+
+    def close(self):
+        pass
+
+
+class MemoryTransport:
+    """Keeps sent messages in a list"""
+
+    def __init__(self):
+        self.outbox = []
+
+    def open(self):
+        return self
+
+    def send(self, message):
+        self.outbox.append(message)
+
+    def close(self):
+        pass
+
+
+class SMTPConnection:
+    def __init__(self, transport):
+        t = transport
+        if t.ssl:
+            self.smtp = smtplib.SMTP_SSL(t.host, t.port, timeout=t.timeout)
+        else:
+            self.smtp = smtplib.SMTP(t.host, t.port, timeout=t.timeout)
+            if t.starttls:
+                self.smtp.starttls()
+        if t.username:
+            self.smtp.login(t.username, t.password)
+
+    def send(self, message):
+        self.smtp.send_message(message)
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except smtplib.SMTPException:
+            self.smtp.close()
+
+
+class SMTPTransport:
+    """SMTP delivery; each open() is one connection reused for many messages"""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.ssl = parts.scheme == 'smtps'
+        self.starttls = parts.scheme == 'smtp+starttls'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or (465 if self.ssl else 587 if self.starttls else 25)
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else None
+        self.timeout = timeout
+
+    def open(self):
+        return SMTPConnection(self)
+
+
+def create_transport(url, logger):
+    if not url or url.startswith('console://'):
+        return ConsoleTransport(logger)
+    if url.startswith('memory://'):
+        return MemoryTransport()
+    if url.startswith(('smtp://', 'smtps://', 'smtp+starttls://')):
+        return SMTPTransport(url)
+    raise ValueError(f'Unsupported mail transport: {url!r}')
+
+
+class Notifier:
+    """Comment and reply notifications, coalesced into per-recipient digests
+
+    comment_added() only records Notification rows for opted-in users and
+    schedules one site-wide digest job; repeat comments within
+    NOTIFICATIONS_DIGEST_DELAY fold into that same job. The job then sends
+    one email per recipient over at most MAIL_CONCURRENCY reused
+    connections, so a post that draws a thousand comments costs its author a
+    few digests instead of a thousand sends on the request path.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('NOTIFICATIONS_ENABLED', True)
+        app.config.setdefault('NOTIFICATIONS_DIGEST_DELAY', 300)
+        app.config.setdefault('NOTIFICATIONS_BATCH_SIZE', 200)  # Recipients per digest run
+        app.config.setdefault('MAIL_URL', 'console://')
+        app.config.setdefault('MAIL_DEFAULT_SENDER', 'noreply@localhost')
+        app.config.setdefault('MAIL_CONCURRENCY', 2)
+        app.config.setdefault('SITE_URL', 'http://localhost:5000')
+        self.app = app
+        self.transport = create_transport(app.config['MAIL_URL'], app.logger)
+
+    def comment_added(self, comment, post):
+        """Record notifications for a new comment; the caller's commit makes them durable"""
+        from app import db, job_queue
+        from app.models import User, Comment, Notification
+
+        if not self.app.config['NOTIFICATIONS_ENABLED']:
+            return 0
+        recipients = {post.user_id: 'comment'}
+        if comment.parent_id:
+            parent = db.session.get(Comment, comment.parent_id)
+            if parent is not None:
+                recipients[parent.user_id] = 'reply'
+        recipients.pop(comment.user_id, None)
+        if not recipients:
+            return 0
+
+        opted_in = [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.id.in_(recipients), User.email_notifications == True)]
+        if not opted_in:
+            return 0
+        db.session.execute(insert(Notification), [{
+            'kind': recipients[user_id], 'recipient_id': user_id, 'actor_id': comment.user_id,
+            'post_id': post.id, 'comment_id': comment.id, 'created_at': datetime.utcnow(),
+        } for user_id in opted_in])
+        job_queue.enqueue('notifications.send_digests', key='digests',
+                          delay=self.app.config['NOTIFICATIONS_DIGEST_DELAY'])
+        return len(opted_in)
+
+    def build_digest(self, recipient, notifications):
+        """One email summarising a recipient's pending notifications, grouped by post"""
+        site = self.app.config['SITE_URL'].rstrip('/')
+        groups = OrderedDict()
+        for n in notifications:
+            groups.setdefault((n.post_id, n.kind), []).append(n)
+
+        lines = [f'Hi {recipient.get_display_name()},', '']
+        for (_, kind), items in groups.items():
+            post = items[0].post
+            actors = list(OrderedDict.fromkeys(n.actor.get_display_name() for n in items))
+            others = len(actors) - 3
+            who = ', '.join(actors[:3]) + (f' and {others} other{"s" if others > 1 else ""}' if others > 0 else '')
+            what = _count(len(items), kind) + (' to your comment' if kind == 'reply' else '')
+            lines.append(f'- {what} on "{post.title}" from {who}')
+            lines.append(f'  {site}/post/{post.slug}#comments')
+        lines += ['', f'Turn these emails off in your settings: {site}/settings']
+
+        total = len(notifications)
+        if len(groups) == 1:
+            (_, kind), = groups
+            subject = f'{_count(total, kind)} on "{notifications[0].post.title}"'
+        else:
+            subject = f'{total} new comments and replies on your posts'
+
+        message = EmailMessage()
+        message['From'] = self.app.config['MAIL_DEFAULT_SENDER']
+        message['To'] = recipient.email
+        message['Subject'] = subject
+        message.set_content('\n'.join(lines))
+        return message
+
+    def deliver(self, messages):
+        """Send (key, message) pairs over at most MAIL_CONCURRENCY connections; returns the keys sent"""
+        if not messages:
+            return []
+        workers = min(self.app.config['MAIL_CONCURRENCY'], len(messages))
+        logger = self.app.logger
+
+        def send_share(share):
+            sent = []
+            try:
+                connection = self.transport.open()
+            except (OSError, smtplib.SMTPException):
+                logger.exception('Could not connect to the mail server')
+                return sent
+            try:
+                for key, message in share:
+                    connection.send(message)
+                    sent.append(key)
+            except (OSError, smtplib.SMTPException):
+                # Whatever is left stays pending and goes out on the job's retry
+                logger.exception('Sending notification email failed')
+            finally:
+                try:
+                    connection.close()
+                except (OSError, smtplib.SMTPException):
+                    pass
+            return sent
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            shares = pool.map(send_share, [messages[i::workers] for i in range(workers)])
+            return [key for share in shares for key in share]
+
+    def send_digests(self):
+        """Deliver pending notifications, one digest per recipient (needs an app context)
+
+        Returns the number of digests sent. Raises if any could not be sent,
+        after recording the ones that were, so the job retries the rest.
+        """
+        from app import db, job_queue
+        from app.models import Notification
+
+        batch_size = self.app.config['NOTIFICATIONS_BATCH_SIZE']
+        recipient_ids = [user_id for (user_id,) in db.session.query(Notification.recipient_id).filter(
+            Notification.sent_at.is_(None)).group_by(Notification.recipient_id).order_by(
+            db.func.min(Notification.id)).limit(batch_size + 1)]
+        if len(recipient_ids) > batch_size:
+            recipient_ids = recipient_ids[:batch_size]
+            job_queue.enqueue('notifications.send_digests', key='digests')
+
+        pending = OrderedDict()
+        for n in Notification.query.options(
+                joinedload(Notification.recipient), joinedload(Notification.actor), joinedload(Notification.post)
+        ).filter(Notification.recipient_id.in_(recipient_ids), Notification.sent_at.is_(None)).order_by(Notification.id):
+            pending.setdefault(n.recipient_id, []).append(n)
+
+        now = datetime.utcnow()
+        messages = []
+        for recipient_id, notifications in pending.items():
+            recipient = notifications[0].recipient
+            if not recipient.email_notifications or not recipient.is_active:
+                # Opted out after the events were recorded: drop them
+                for n in notifications:
+                    n.sent_at = now
+                continue
+            messages.append((recipient_id, self.build_digest(recipient, notifications)))
+
+        sent = set(self.deliver(messages))
+        for recipient_id in sent:
+            for n in pending[recipient_id]:
+                n.sent_at = now
+        db.session.commit()
+        if len(sent) < len(messages):
+            raise RuntimeError(f'{len(messages) - len(sent)} of {len(messages)} notification digests were not sent')
+        return len(sent)
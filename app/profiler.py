@@ -0,0 +1,163 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(PROJECT_ROOT, 'app') + os.sep
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    """Reduce a statement to its shape so repeated lookups group together"""
+    shape = _STRING_RE.sub('?', statement)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('(?)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+def find_origin(depth=2):
+    """Describe where a statement came from: nearest template line and app frames"""
+    template_origin = None
+    app_frames = []
+    frame = sys._getframe(2)
+    while frame is not None and not (template_origin and len(app_frames) >= depth):
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            if template_origin is None:
+                lineno = template.get_corresponding_lineno(frame.f_lineno)
+                template_origin = f'{os.path.relpath(template.filename or template.name, PROJECT_ROOT)}:{lineno}'
+        elif len(app_frames) < depth:
+            filename = frame.f_code.co_filename
+            if filename.startswith(APP_DIR) and filename != __file__:
+                app_frames.append(f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    # Innermost first: "models.py:192 in get_comment_count <- templates/index.html:60"
+    origins = app_frames + ([template_origin] if template_origin else [])
+    return ' <- '.join(origins) if origins else 'unknown'
+
+
+class _Shape:
+    __slots__ = ('count', 'duration', 'origins')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.origins = []
+
+
+class SQLProfiler:
+    """Development profiler that groups each request's SQL and flags N+1 patterns
+
+    When SQL_PROFILER_ENABLED is set, every statement is grouped by its
+    normalized shape. Shapes executed at least SQL_PROFILER_THRESHOLD times in
+    one request are logged as likely N+1 queries together with the template
+    line and Python frame that issued them. Totals are added to every response
+    as X-SQL-Queries / X-SQL-Time headers. Not meant for production traffic.
+
+    The per-request total is logged once the body has been sent, at WARNING
+    when it exceeds SQL_PROFILER_BUDGET statements and at INFO otherwise
+    (shown only with the app.profiler logger at INFO, e.g.
+    logging.getLogger('app.profiler').setLevel(logging.INFO)). Headers go
+    out before a streamed body (stream_template pages, exports, sitemaps) is
+    generated, so on those responses they only count the statements run
+    before the first chunk; the log line covers the whole request.
+    """
+
+    def __init__(self, app=None):
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('SQL_PROFILER_ENABLED', False)
+        app.config.setdefault('SQL_PROFILER_THRESHOLD', 5)
+        app.config.setdefault('SQL_PROFILER_BUDGET', 20)
+        if not app.config['SQL_PROFILER_ENABLED']:
+            return
+        self.threshold = app.config['SQL_PROFILER_THRESHOLD']
+        self.budget = app.config['SQL_PROFILER_BUDGET']
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @property
+    def shapes(self):
+        """Statement shapes recorded so far in this thread's request, or None"""
+        return getattr(self._local, 'shapes', None)
+
+    def _before_request(self):
+        self._local.shapes = {}
+
+    def _teardown_request(self, exc):
+        self._local.shapes = None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profiler_query_start'].pop()
+        shapes = self.shapes
+        if shapes is None:
+            return
+        key = normalize_sql(statement)
+        shape = shapes.get(key)
+        if shape is None:
+            shape = shapes[key] = _Shape()
+        shape.count += 1
+        shape.duration += time.perf_counter() - started
+        if len(shape.origins) < 3:
+            origin = find_origin()
+            if origin not in shape.origins:
+                shape.origins.append(origin)
+
+    def report(self, shapes=None):
+        """Return (total statements, total seconds, [(sql, shape) over threshold])"""
+        shapes = (self.shapes if shapes is None else shapes) or {}
+        total = sum(s.count for s in shapes.values())
+        duration = sum(s.duration for s in shapes.values())
+        repeated = sorted(((sql, s) for sql, s in shapes.items() if s.count >= self.threshold),
+                          key=lambda item: item[1].count, reverse=True)
+        return total, duration, repeated
+
+    def _after_request(self, response):
+        shapes = self.shapes
+        if shapes is None:
+            return response
+        total, duration, repeated = self.report(shapes)
+        response.headers['X-SQL-Queries'] = str(total)
+        response.headers['X-SQL-Time'] = f'{duration * 1000:.1f}ms'
+        if repeated:
+            response.headers['X-SQL-Repeated'] = str(len(repeated))
+
+        # A streamed body keeps adding to shapes, so log when the response is closed
+        method, path, status = request.method, request.path, response.status_code
+        response.call_on_close(lambda: self._log(method, path, status, shapes))
+        return response
+
+    def _log(self, method, path, status, shapes):
+        total, duration, repeated = self.report(shapes)
+        level = logging.WARNING if total > self.budget else logging.INFO
+        logger.log(level, '%s %s -> %s: %d SQL statements in %.1fms (%d distinct, budget %d)', method, path,
+                   status, total, duration * 1000, len(shapes), self.budget)
+        for sql, shape in repeated:
+            logger.warning('Possible N+1 on %s: %dx (%.1fms) %s\n    from %s', path, shape.count,
+                           shape.duration * 1000, sql[:300], '\n    from '.join(shape.origins))
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from app.json_provider import encode_default
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A bounded mailbox for one listener; slow listeners lose old messages, never block publishers"""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.messages = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        while True:
+            try:
+                self.messages.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.messages.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Next (event, data) pair, or None if nothing arrived within timeout"""
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Listener:
+    """Calls a function for every message on a channel, on the dispatching thread"""
+
+    def __init__(self, channel, callback):
+        self.channel = channel
+        self.callback = callback
+
+    def put(self, message):
+        self.callback(*message)
+
+
+class LocalTransport:
+    """Delivers messages to subscribers in this process only"""
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+
+class RedisTransport:
+    """Fans messages out to every worker through Redis pub/sub (or any Redis-protocol server)"""
+
+    prefix = 'pubsub:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('PUBSUB_URL points at Redis but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self._thread = None
+        self._pid = None
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def _listen(self):
+        # Resubscribe after connection errors (Redis restarts, failovers); messages published meanwhile are lost,
+        # which is why reconnecting pages refetch their comments
+        backoff = 1
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                backoff = 1
+                for item in pubsub.listen():
+                    channel = item['channel'].decode()[len(self.prefix):]
+                    self.dispatch(channel, tuple(json.loads(item['data'])))
+            except Exception:
+                logger.exception('Pub/sub listener lost its connection; retrying in %ds', backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def ensure_listening(self):
+        # Started on first use, and again after a fork, since threads don't survive fork()
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+            self._thread.start()
+
+    def publish(self, channel, message):
+        self._client.publish(self.prefix + channel, json.dumps(message, default=encode_default))
+
+
+def create_transport(url):
+    if not url or url.startswith('memory://'):
+        return LocalTransport()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisTransport(url)
+    raise ValueError(f'Unsupported pub/sub transport: {url!r}')
+
+
+class EventBroker:
+    """In-process pub/sub for live page updates
+
+    Subscribers register per channel (e.g. "post:42") and receive
+    (event, data) tuples. With PUBSUB_URL set to a Redis URL, publishes go
+    through Redis and every worker's listener thread hands them to its local
+    subscribers, so a comment posted on one worker reaches readers on all.
+    streams caps how many SSE responses this process serves at once.
+    """
+
+    def __init__(self, app=None):
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._last_published = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PUBSUB_URL', 'memory://')
+        app.config.setdefault('SSE_ENABLED', True)
+        app.config.setdefault('SSE_HEARTBEAT', 15)
+        app.config.setdefault('SSE_MAX_DURATION', 60)
+        app.config.setdefault('SSE_MAX_STREAMS', 4)
+        app.config.setdefault('SSE_BUSY_RETRY', 30)
+        app.config.setdefault('SSE_SNAPSHOT_TTL', 5)
+        self.streams = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+        self.transport = create_transport(app.config['PUBSUB_URL'])
+        self.transport.start(self._dispatch)
+
+    def subscribe(self, channel, maxsize=100):
+        subscription = Subscription(self, channel, maxsize)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        if hasattr(self.transport, 'ensure_listening'):
+            self.transport.ensure_listening()
+        return subscription
+
+    def listen(self, channel, callback):
+        """Call callback(event, data) for every message on channel; keep it fast, it runs inline"""
+        listener = Listener(channel, callback)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(listener)
+        if hasattr(self.transport, 'ensure_listening'):
+            self.transport.ensure_listening()
+        return listener
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            listeners = self._channels.get(subscription.channel)
+            if listeners:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel):
+        return len(self._channels.get(channel, ()))
+
+    def publish(self, channel, event, data, min_interval=None):
+        """Publish an event; with min_interval, drop it if this channel/event fired more recently"""
+        if min_interval:
+            now = time.monotonic()
+            key = (channel, event)
+            if now - self._last_published.get(key, 0) < min_interval:
+                return False
+            if len(self._last_published) > 10000:
+                self._last_published.clear()
+            self._last_published[key] = now
+        self.transport.publish(channel, (event, data))
+        return True
+
+    def _dispatch(self, channel, message):
+        with self._lock:
+            listeners = list(self._channels.get(channel, ()))
+        for subscription in listeners:
+            subscription.put(message)
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"), default=encode_default)}\n\n'
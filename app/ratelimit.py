@@ -0,0 +1,167 @@
+import math
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+# Seconds per unit accepted in limit strings such as "10 per minute" or "5/second"
+_UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*(?:/|per)\s*(second|minute|hour|day)s?\s*$')
+
+
+def parse_limit(value):
+    """Parse a limit string into (amount, period_seconds)"""
+    match = _LIMIT_RE.match(value.lower())
+    if not match:
+        raise ValueError(f'Invalid rate limit: {value!r}')
+    return int(match.group(1)), _UNITS[match.group(2)]
+
+
+class MemoryStorage:
+    """In-process counter storage for single-node deployments"""
+
+    def __init__(self, sweep_interval=60):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def hit(self, incr_key, get_key, expiry):
+        """Increment incr_key and return (incremented value, value of get_key)"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            entry = self._counters.get(incr_key)
+            if entry is None or entry[1] <= now:
+                entry = self._counters[incr_key] = [0, now + expiry]
+            entry[0] += 1
+            previous = self._counters.get(get_key)
+            return entry[0], previous[0] if previous and previous[1] > now else 0
+
+    def refund(self, key):
+        """Take back a hit that was rejected"""
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is not None and entry[0] > 0:
+                entry[0] -= 1
+
+    def _sweep(self, now):
+        """Drop expired counters so idle clients don't accumulate forever"""
+        self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+        self._next_sweep = now + self._sweep_interval
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class RedisStorage:
+    """Shared counter storage for multi-worker deployments (any Redis-protocol server)"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+
+    def hit(self, incr_key, get_key, expiry):
+        """Increment incr_key and read get_key in a single round trip"""
+        pipe = self._client.pipeline(transaction=False)
+        pipe.incr(incr_key)
+        pipe.expire(incr_key, expiry)
+        pipe.get(get_key)
+        current, _, previous = pipe.execute()
+        return int(current), int(previous or 0)
+
+    def refund(self, key):
+        """Take back a hit that was rejected"""
+        self._client.decr(key)
+
+    def reset(self):
+        for key in self._client.scan_iter('rl:*'):
+            self._client.delete(key)
+
+
+def create_storage(url):
+    """Build a storage backend from a URL (memory:// or redis://...)"""
+    if not url or url.startswith('memory://'):
+        return MemoryStorage()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStorage(url)
+    raise ValueError(f'Unsupported rate limit storage: {url!r}')
+
+
+def default_key():
+    """Identify the client by user id when logged in, otherwise by IP address"""
+    if current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+class RateLimiter:
+    """Sliding-window rate limiter with per-route policies
+
+    Each route keeps a counter for the current and previous fixed window;
+    the previous window is weighted by how much of it still overlaps the
+    sliding window, which approximates a true sliding log in O(1) memory.
+    Only allowed requests count: a rejected hit is refunded, so a client
+    that keeps retrying is blocked for one window, not for as long as it retries.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE_URL', 'memory://')
+        app.extensions['limiter'] = create_storage(app.config['RATELIMIT_STORAGE_URL'])
+
+    @property
+    def storage(self):
+        return current_app.extensions['limiter']
+
+    def check(self, scope, identity, amount, period):
+        """Record a hit and return seconds to wait, or 0 if the hit is allowed (rejected hits aren't kept)"""
+        now = time.time()
+        window = int(now // period)
+        elapsed = now - window * period
+        prefix = f'rl:{scope}:{identity}:{period}'
+        key = f'{prefix}:{window}'
+        current, previous = self.storage.hit(key, f'{prefix}:{window - 1}', period * 2)
+
+        remaining_weight = (period - elapsed) / period
+        if previous * remaining_weight + current <= amount:
+            return 0
+        self.storage.refund(key)
+        if current > amount or not previous:
+            return max(1, math.ceil(period - elapsed))
+        # Wait until the previous window has decayed enough to admit one more hit
+        wait = (period - elapsed) - (amount - current) * period / previous
+        return max(1, math.ceil(wait))
+
+    def limit(self, value, methods=None, key_func=default_key):
+        """Decorator applying a rate limit to a view
+
+        value: limit string, e.g. "10 per minute" or "5/second"
+        methods: only count these HTTP methods (all methods by default)
+        key_func: callable returning the client identity
+        """
+        amount, period = parse_limit(value)
+
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if current_app.config['RATELIMIT_ENABLED'] and (methods is None or request.method in methods):
+                    retry_after = self.check(request.endpoint, key_func(), amount, period)
+                    if retry_after:
+                        raise TooManyRequests(retry_after=retry_after)
+                return f(*args, **kwargs)
+            return decorated
+        return decorator
@@ -0,0 +1,89 @@
+"""
+Reference data cached per process
+
+Categories (with published post counts) and the featured-post set change
+rarely but are read on nearly every page and form. They are cached as
+plain tuples, never ORM instances, so any request thread can use them
+without a session. Every entry is version-stamped in ScopedCache and
+dropped when its scope is invalidated; REFDATA_TTL caps staleness for
+workers the broker can't reach.
+"""
+
+from collections import namedtuple
+
+from flask import current_app
+
+from app import cache
+
+CATEGORIES = 'refdata:categories'
+FEATURED = 'refdata:featured'
+
+
+class CategoryRef(namedtuple('CategoryRef', 'id name slug description color created_at post_count')):
+    __slots__ = ()
+
+    def to_dict(self):
+        """Same shape as Category.to_dict()"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'slug': self.slug,
+            'color': self.color,
+            'post_count': self.post_count,
+            'created_at': self.created_at,
+        }
+
+
+FeaturedPost = namedtuple('FeaturedPost', 'id title slug excerpt created_at author_name')
+
+
+def _load_categories():
+    from app.models import Category
+
+    counts = Category.post_counts()
+    return tuple(CategoryRef(c.id, c.name, c.slug, c.description, c.color, c.created_at, counts.get(c.id, 0))
+                 for c in Category.query.order_by(Category.name))
+
+
+def _load_featured():
+    from sqlalchemy.orm import joinedload
+    from app.models import Post
+
+    posts = Post.query.options(joinedload(Post.author)).filter_by(is_published=True, is_featured=True).order_by(
+        Post.created_at.desc()).limit(current_app.config['FEATURED_POSTS'])
+    return tuple(FeaturedPost(p.id, p.title, p.slug, p.excerpt or p.generate_excerpt(), p.created_at,
+                              p.author.get_full_name()) for p in posts)
+
+
+def categories():
+    """All categories ordered by name, with published post counts"""
+    return cache.get_or_set(CATEGORIES, _load_categories, scopes=(CATEGORIES,),
+                            ttl=current_app.config['REFDATA_TTL'])
+
+
+def category_choices():
+    return [(c.id, c.name) for c in categories()]
+
+
+def featured_posts():
+    """Newest published featured posts for the home page hero"""
+    return cache.get_or_set(FEATURED, _load_featured, scopes=(FEATURED,), ttl=current_app.config['REFDATA_TTL'])
+
+
+def post_scopes(post, before=None):
+    """Reference-data scopes touched by creating or deleting post, or editing it from before
+
+    before holds the pre-edit is_published, is_featured and category_id.
+    Counts move when a post is published, unpublished or recategorised; the
+    featured set whenever a featured post that is (or was) public changes.
+    """
+    keys = ('is_published', 'is_featured', 'category_id')
+    before = before or dict.fromkeys(keys)
+    scopes = []
+    if (post.is_published or before['is_published']) and (
+            before['is_published'] != post.is_published or before['category_id'] != post.category_id):
+        scopes.append(CATEGORIES)
+    if (post.is_published and post.is_featured) or (before['is_published'] and before['is_featured']):
+        scopes.append(FEATURED)
+    return tuple(scopes)
@@ -1,11 +1,25 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, abort
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, abort, current_app,
+                   Response, stream_with_context, stream_template, get_flashed_messages)
 from flask_login import login_user, logout_user, login_required, current_user
-from datetime import datetime
-from app import db
-from app.models import User, Post, Category, Comment
+from flask_wtf.csrf import generate_csrf
+from datetime import datetime, date
+from types import SimpleNamespace
+import time
+from app import (db, login_manager, limiter, csrf, rum_collector, metrics, broker, notifier, cache,
+                 trending, suggestions, engagement, unique_viewers, search_stats)
+from app.models import User, Post, Category, Comment, PerformanceRollup, Tag, post_tag
+from app.pubsub import format_sse
+from app.feeds import build_feed, feed_scopes
+from app import sitemap, refdata, moderation, tags, revisions, listings, exports
+from app.suggest import KINDS as SUGGEST_KINDS, MAX_LIMIT as SUGGEST_MAX_LIMIT
+from app.engagement import MAX_DAYS as ENGAGEMENT_MAX_DAYS
+from app.search import SEARCH_SCOPE, clean_query, like_pattern, normalize_query
 from app.forms import (LoginForm, RegistrationForm, PostForm, SearchForm, 
                       UserProfileForm, CommentForm, CategoryForm, ChangePasswordForm)
 from urllib.parse import urlparse
+from sqlalchemy.orm import joinedload
+import difflib
+import hmac
 
 # Create blueprints
 main_bp = Blueprint('main', __name__)
@@ -13,6 +27,12 @@ auth_bp = Blueprint('auth', __name__)
 api_bp = Blueprint('api', __name__)
 admin_bp = Blueprint('admin', __name__)
 
+def post_cache_scopes(post, before=None):
+    """Every cache scope a post write touches: its feeds, sitemap shard, reference data and search results"""
+    category_ids = (post.category_id, before['category_id']) if before else (post.category_id,)
+    return (feed_scopes(post.user_id, *category_ids) + sitemap.post_scopes(post.id) +
+            refdata.post_scopes(post, before) + (SEARCH_SCOPE,))
+
 # ===== MAIN ROUTES =====
 @main_bp.route('/')
 @main_bp.route('/index')
@@ -21,34 +41,38 @@ def index():
     page = request.args.get('page', 1, type=int)
     category_id = request.args.get('category', 0, type=int)
     
-    # Build query
-    query = Post.query.filter_by(is_published=True)
+    # Build query (read-only rows, see app/listings.py)
+    query = listings.published_posts()
     if category_id:
-        query = query.filter_by(category_id=category_id)
+        query = query.where(Post.category_id == category_id)
     
-    # Featured posts for hero section
-    featured_posts = Post.query.filter_by(is_published=True, is_featured=True).limit(3).all()
+    # Featured posts for hero section (cached reference data)
+    featured_posts = refdata.featured_posts()
     
     # Regular posts with pagination
-    posts = query.order_by(Post.created_at.desc()).paginate(
-        page=page, per_page=5, error_out=False)
+    posts = listings.paginate(query.order_by(Post.created_at.desc()), page, 5)
+    
+    # Categories for sidebar (cached reference data)
+    categories = refdata.categories()
     
-    # Categories for sidebar
-    categories = Category.query.order_by(Category.name).all()
+    # Trending sidebar, ranked in memory
+    trending_posts = trending.top(5, category_id)
     
     search_form = SearchForm()
     return render_template('index.html', title='Home', posts=posts, 
                          featured_posts=featured_posts, categories=categories, 
-                         search_form=search_form, current_category=category_id)
+                         search_form=search_form, current_category=category_id,
+                         trending_posts=trending_posts)
 
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
     """Enhanced user dashboard with analytics"""
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter_by(user_id=current_user.id).order_by(
+    posts = Post.query.options(joinedload(Post.category)).filter_by(user_id=current_user.id).order_by(
         Post.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False)
+    comment_counts = Post.comment_counts([post.id for post in posts.items])
     
     # Analytics data
     total_posts = Post.query.filter_by(user_id=current_user.id).count()
@@ -65,7 +89,8 @@ def dashboard():
         'total_comments': total_comments
     }
     
-    return render_template('user/dashboard.html', title='Dashboard', posts=posts, analytics=analytics)
+    return render_template('user/dashboard.html', title='Dashboard', posts=posts, analytics=analytics,
+                         comment_counts=comment_counts)
 
 @main_bp.route('/create_post', methods=['GET', 'POST'])
 @login_required
@@ -86,7 +111,7 @@ def create_post():
             category_id=form.category_id.data if form.category_id.data else None
         )
         
-        # Generate slug and calculate reading time
+        # Generate slug and reading time (a word count, cheap enough to do inline)
         post.slug = post.generate_slug()
         post.calculate_reading_time()
         
@@ -95,7 +120,13 @@ def create_post():
             post.published_at = datetime.utcnow()
         
         db.session.add(post)
+        db.session.flush()
+        tags.sync_post_tags(post)
+        revisions.record_created(post)
         db.session.commit()
+        if post.is_published:
+            cache.invalidate(*post_cache_scopes(post))
+            suggestions.post_saved(post)
         flash('Your post has been created!', 'success')
         return redirect(url_for('main.dashboard'))
     
@@ -105,10 +136,17 @@ def create_post():
 @login_required
 def edit_post(id):
     """Enhanced post editing"""
-    post = Post.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    query = Post.query.filter_by(id=id, user_id=current_user.id)
+    if request.method == 'POST':
+        # Locked until the commit so concurrent saves of one post take turns: each diffs against the
+        # latest content and gets a free revision number (SQLite already allows one writer at a time)
+        query = query.with_for_update()
+    post = query.first_or_404()
     form = PostForm()
     
     if form.validate_on_submit():
+        before = {'is_published': post.is_published, 'is_featured': post.is_featured, 'category_id': post.category_id}
+        previous_title, previous_content = post.title, post.content
         post.title = form.title.data
         post.content = form.content.data
         post.excerpt = form.excerpt.data
@@ -128,7 +166,12 @@ def edit_post(id):
         if post.is_published and not post.published_at:
             post.published_at = datetime.utcnow()
         
+        tags.sync_post_tags(post, was_published=before['is_published'])
+        revisions.record_edit(post, previous_title, previous_content, current_user.id)
         db.session.commit()
+        cache.invalidate(*post_cache_scopes(post, before))
+        trending.post_changed(post)
+        suggestions.post_saved(post)
         flash('Your post has been updated!', 'success')
         return redirect(url_for('main.dashboard'))
     elif request.method == 'GET':
@@ -152,8 +195,13 @@ def delete_post(id):
     # Only the author or an admin can delete
     if post.user_id != current_user.id and not current_user.is_admin:
         abort(403)
+    scopes = post_cache_scopes(post)
+    tags.post_deleted(post)
     db.session.delete(post)
     db.session.commit()
+    cache.invalidate(*scopes)
+    trending.discard(id)
+    suggestions.post_deleted(id)
     flash('Your post has been deleted!', 'success')
     # Redirect back to the page the user came from, or dashboard as fallback
     next_url = request.referrer or url_for('main.dashboard')
@@ -162,33 +210,145 @@ def delete_post(id):
 @main_bp.route('/post/<slug>')
 @main_bp.route('/post/<int:id>')
 def view_post(slug=None, id=None):
-    """Enhanced post view with comments and engagement"""
+    """Enhanced post view with comments and engagement, streamed so the article paints first"""
+    query = Post.query.options(joinedload(Post.author))
     if slug:
-        post = Post.query.filter_by(slug=slug, is_published=True).first_or_404()
+        post = query.filter_by(slug=slug, is_published=True).first_or_404()
     else:
-        post = Post.query.filter_by(id=id, is_published=True).first_or_404()
+        post = query.filter_by(id=id, is_published=True).first_or_404()
     
     # Increment view count (basic analytics)
     post.increment_views()
+    broker.publish(f'post:{post.id}', 'views', {'views': post.view_count}, min_interval=2)
+    trending.record(post, 'view')
+    engagement.record(post, 'view')
+    unique_viewers.record(post.id)
     
-    # Get comments
-    comments = Comment.query.filter_by(post_id=post.id, is_approved=True).order_by(Comment.created_at.desc()).all()
+    # Comments are only counted up front; the list is loaded while the article is already on its way
+    comments = approved_comments(post.id)
+    comment_count = comments.count()
     
     # Comment form
     comment_form = CommentForm()
     
-    # Related posts
-    related_posts = Post.query.filter(
-        Post.id != post.id,
-        Post.is_published == True,
-        Post.category_id == post.category_id if post.category_id else True
-    ).order_by(Post.view_count.desc()).limit(3).all()
+    return stream_page('post_detail.html', title=post.title, post=post, comment_count=comment_count,
+                       comments=comments.options(joinedload(Comment.author)).order_by(Comment.created_at.desc()),
+                       comment_form=comment_form, related_posts=related_posts(post))
+
+FLUSH_MARKER = '<!-- flush -->'
+
+def stream_page(template_name, **context):
+    """Stream a template, sending everything up to each FLUSH_MARKER as one chunk
+    
+    stream_template alone yields a chunk per template node, which means
+    hundreds of tiny writes. Templates put the marker just before their slow
+    parts, so the browser gets the page up to there while the rest renders.
+    
+    The session cookie goes out with the headers, before the template runs,
+    so anything the page takes from or adds to the session happens here
+    first: the flashes are popped (the template's get_flashed_messages()
+    reads this request's copy) and the CSRF token is created.
+    """
+    get_flashed_messages()
+    generate_csrf()
+    pieces = stream_template(template_name, **context)  # Binds the request context, so call it here
+    
+    def chunks():
+        buffered = []
+        for piece in pieces:
+            buffered.append(piece)
+            if FLUSH_MARKER in piece:
+                yield ''.join(buffered)
+                buffered = []
+        yield ''.join(buffered)
+    
+    return Response(chunks(), mimetype='text/html')
+
+def approved_comments(post_id):
+    return Comment.query.filter_by(post_id=post_id, is_approved=True)
+
+def related_posts(post, k=3):
+    """What is trending in the same category, topped up with its most viewed posts
+
+    Trending scores live in memory, so they are empty after a restart and thin
+    in a quiet category; only then does this run a query.
+    """
+    related = list(trending.top(k, post.category_id, exclude=post.id))
+    if len(related) < k:
+        query = Post.query.with_entities(Post.id, Post.title, Post.slug).filter(
+            Post.id.notin_([post.id] + [p.id for p in related]),
+            Post.is_published == True,
+            Post.category_id == post.category_id if post.category_id else True
+        )
+        related += query.order_by(Post.view_count.desc()).limit(k - len(related)).all()
+    return related
+
+@main_bp.route('/post/<int:id>/fragments/comments')
+def post_comments_fragment(id):
+    """A post's approved comments as an HTML fragment, for loading or refreshing the list in place"""
+    post = Post.query.filter_by(id=id, is_published=True).first_or_404()
+    comments = approved_comments(post.id).options(joinedload(Comment.author)).order_by(Comment.created_at.desc())
+    return render_template('fragments/comments.html', comments=comments)
+
+@main_bp.route('/post/<int:id>/fragments/related')
+def post_related_fragment(id):
+    """A post's related posts as an HTML fragment"""
+    post = Post.query.filter_by(id=id, is_published=True).first_or_404()
+    return render_template('fragments/related.html', related_posts=related_posts(post))
+
+def tagged_posts(tag):
+    """Published posts carrying tag, newest first, read through the (tag_id, post_id) index
+
+    Post ids increase with creation time, so ordering by the indexed post_id
+    matches the created_at order of the category listings without a sort.
+    """
+    return listings.published_posts().join(post_tag, post_tag.c.post_id == Post.id).where(
+        post_tag.c.tag_id == tag.id).order_by(post_tag.c.post_id.desc())
+
+def paginate_tagged(tag, query, page, per_page):
+    """Paginate a tag listing, taking the total from the maintained Tag.post_count instead of a COUNT"""
+    posts = listings.paginate(query, page, per_page, count=False)
+    posts.total = tag.post_count
+    return posts
+
+@main_bp.route('/tag/<slug>')
+def tag_posts(slug):
+    """Published posts with a tag"""
+    tag = Tag.query.filter_by(slug=slug).first_or_404()
+    page = request.args.get('page', 1, type=int)
+    posts = paginate_tagged(tag, tagged_posts(tag), page, 5)
+    return render_template('index.html', title=f'Tagged {tag.name}', posts=posts,
+                         featured_posts=refdata.featured_posts(), categories=refdata.categories(),
+                         search_form=SearchForm(), current_category=0, current_tag=tag,
+                         trending_posts=trending.top(5))
+
+@main_bp.route('/post/<int:id>/revisions')
+@login_required
+def post_revisions(id):
+    """Edit history of a post (author or admin), with one version and its changes"""
+    post = Post.query.get_or_404(id)
+    if post.user_id != current_user.id and not current_user.is_admin:
+        abort(403)
+    history = revisions.history(post.id)
+    number = request.args.get('rev', history[0].number if history else 0, type=int)
+    version = revisions.get_version(post.id, number) if history else None
+    if history and version is None:
+        abort(404)
+    
+    changes = []
+    if version and number > 1:
+        previous = revisions.get_version(post.id, number - 1)
+        changes = list(difflib.unified_diff(
+            [previous[0] + '\n'] + previous[1].splitlines(keepends=True),
+            [version[0] + '\n'] + version[1].splitlines(keepends=True),
+            f'revision {number - 1}', f'revision {number}', n=2))
     
-    return render_template('post_detail.html', title=post.title, post=post, 
-                         comments=comments, comment_form=comment_form, related_posts=related_posts)
+    return render_template('user/post_revisions.html', title=f'History of {post.title}', post=post,
+                         history=history, number=number, version=version, changes=changes)
 
 @main_bp.route('/post/<int:id>/comment', methods=['POST'])
 @login_required
+@limiter.limit('10 per minute')
 def add_comment(id):
     """Add comment to post"""
     post = Post.query.filter_by(id=id, is_published=True).first_or_404()
@@ -199,29 +359,121 @@ def add_comment(id):
     
     form = CommentForm()
     if form.validate_on_submit():
-        comment = Comment(
-            content=form.content.data,
-            user_id=current_user.id,
-            post_id=post.id
-        )
-        db.session.add(comment)
-        db.session.commit()
+        save_comment(post, form)
         flash('Your comment has been added!', 'success')
     else:
         flash('Error adding comment. Please check your input.', 'error')
     
     return redirect(url_for('main.view_post', id=post.id))
 
+def save_comment(post, form, render=False):
+    """Insert a validated comment, notify and publish it; returns (comment.to_dict(), fragment or None)
+    
+    Both are built between the flush and the commit, while the new row and
+    its author are still loaded, so nothing is read back after the commit:
+    one INSERT plus whatever notifications the comment triggers. The
+    fragment is only rendered with render=True, for the API's response.
+    """
+    post_id = post.id  # Read now: the commit below expires post
+    comment = Comment(content=form.content.data, post_id=post_id, author=current_user._get_current_object())
+    # Replies must point at a comment on the same post
+    parent_id = str(form.parent_id.data or '')  # JSON bodies may send a number
+    if parent_id.isdigit():
+        parent = Comment.query.filter_by(id=int(parent_id), post_id=post_id).first()
+        comment.parent_id = parent.id if parent else None
+    db.session.add(comment)
+    db.session.flush()
+    data = comment.to_dict(reply_count=0)
+    html = render_template('fragments/comment.html', comment=comment) if render else None
+    notifier.comment_added(comment, post)
+    # The commit expires post, so keep what the in-memory counters need rather than reloading it
+    counted = SimpleNamespace(id=post_id, title=post.title, slug=post.slug, category_id=post.category_id)
+    db.session.commit()
+    # Counted only once the comment is saved
+    trending.record(counted, 'comment')
+    engagement.record(counted, 'comment')
+    if data['is_approved']:
+        broker.publish(f'post:{post_id}', 'comment', data)
+    return data, html
+
+def live_snapshot(post_id):
+    """A post's view, like and approved comment counts, cached for SSE_SNAPSHOT_TTL seconds
+
+    Live events follow the snapshot on the stream, so a few seconds of
+    staleness is fine and reconnecting readers skip the queries.
+    """
+    key = f'post:{post_id}:live'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        post = Post.query.filter_by(id=post_id, is_published=True).first_or_404()
+        snapshot = {'views': post.view_count, 'likes': post.like_count,
+                    'comments': approved_comments(post_id).count()}
+        cache.set(key, snapshot, ttl=current_app.config['SSE_SNAPSHOT_TTL'])
+    return snapshot
+
+@main_bp.route('/post/<int:id>/events')
+def post_events(id):
+    """Server-Sent Events stream of new comments, likes and view counts for a post
+    
+    Each open stream holds a worker thread (or greenlet), so at most
+    SSE_MAX_STREAMS run per process; keep it well below gunicorn's --threads
+    so page requests always find a free thread. The slot is taken before any
+    query: beyond the limit readers get the cached snapshot, if there is one,
+    and are told to reconnect after SSE_BUSY_RETRY seconds (a 200 with a
+    retry field, since EventSource gives up for good on an error status).
+    Streams end after SSE_MAX_DURATION seconds so the slots rotate between
+    readers; the browser's EventSource reconnects on its own.
+    """
+    if not current_app.config['SSE_ENABLED']:
+        return '', 204  # 204 tells EventSource to stop reconnecting
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    busy_retry = current_app.config['SSE_BUSY_RETRY'] * 1000
+    streams = broker.streams
+    if not streams.acquire(blocking=False):
+        snapshot = cache.get(f'post:{id}:live')
+        body = f'retry: {busy_retry}\n' + (format_sse('snapshot', snapshot) if snapshot else '\n')
+        return Response(body, mimetype='text/event-stream', headers=headers)
+    
+    try:
+        snapshot = live_snapshot(id)
+    except BaseException:
+        streams.release()
+        raise
+    finally:
+        # Return the pooled connection now instead of holding it for the life of the stream
+        db.session.remove()
+    
+    heartbeat = current_app.config['SSE_HEARTBEAT']
+    deadline = time.monotonic() + current_app.config['SSE_MAX_DURATION']
+    
+    def stream():
+        subscription = broker.subscribe(f'post:{id}')
+        try:
+            yield f'retry: 5000\n{format_sse("snapshot", snapshot)}'
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=heartbeat)
+                yield ': keep-alive\n\n' if message is None else format_sse(*message)
+        finally:
+            subscription.close()
+    
+    response = Response(stream(), mimetype='text/event-stream', headers=headers)
+    # Closing the response releases the slot even if the body is never iterated
+    response.call_on_close(streams.release)
+    return response
+
 @main_bp.route('/profile/<username>')
 def user_profile(username):
     """Public user profile page"""
     user = User.query.filter_by(username=username).first_or_404()
     page = request.args.get('page', 1, type=int)
     
-    posts = Post.query.filter_by(user_id=user.id, is_published=True).order_by(
-        Post.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    posts = listings.paginate(listings.published_posts().where(Post.user_id == user.id).order_by(
+        Post.created_at.desc()), page, 10)
+    comment_counts = Post.comment_counts([post.id for post in posts.items])
     
-    return render_template('user/profile.html', title=f'{user.get_display_name()}', user=user, posts=posts)
+    return render_template('user/profile.html', title=f'{user.get_display_name()}', user=user, posts=posts,
+                         comment_counts=comment_counts)
 
 @main_bp.route('/settings', methods=['GET', 'POST'])
 @login_required
@@ -241,6 +493,7 @@ def user_settings():
         current_user.email_notifications = form.email_notifications.data
         
         db.session.commit()
+        suggestions.author_saved(current_user)
         flash('Your profile has been updated!', 'success')
         return redirect(url_for('main.user_settings'))
     elif request.method == 'GET':
@@ -273,8 +526,61 @@ def change_password():
     
     return render_template('user/change_password.html', title='Change Password', form=form)
 
+# ===== FEEDS =====
+@main_bp.route('/feed.<any(xml, atom, json):fmt>')
+@main_bp.route('/category/<slug>/feed.<any(xml, atom, json):fmt>')
+@main_bp.route('/profile/<username>/feed.<any(xml, atom, json):fmt>')
+def feed(fmt, slug=None, username=None):
+    """RSS (feed.xml), Atom and JSON Feed of the newest posts, site-wide or per category/author
+    
+    The serialized feed stays cached until a post in its scope is created,
+    edited or deleted, so polling readers cost a cache lookup; If-None-Match
+    and If-Modified-Since get a 304.
+    """
+    key = f"feed:{fmt}:{'category/' + slug if slug else 'author/' + username if username else 'site'}"
+    feed = cache.get(key)
+    if feed is None:
+        feed = build_feed(fmt, slug=slug, username=username)
+        cache.set(key, feed, versions=feed.versions)
+    
+    response = Response(feed.body, mimetype=feed.mimetype)
+    response.set_etag(feed.etag)
+    response.last_modified = feed.updated
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
+
+# ===== SITEMAP =====
+@main_bp.route('/sitemap.xml')
+def sitemap_index():
+    """Sitemap index pointing at the per-shard sitemaps"""
+    return sitemap.gzip_response(sitemap.get_index().body)
+
+@main_bp.route('/sitemap-<any(posts, profiles, categories):kind>-<int:shard>.xml')
+def sitemap_shard(kind, shard):
+    """One sitemap shard: up to SITEMAP_SHARD_SIZE consecutive post or user ids
+    
+    The first request streams rows straight from the database; the finished
+    document is cached gzipped until a post in the shard changes.
+    """
+    if (kind, shard) not in sitemap.get_index().shards:
+        abort(404)
+    cached = cache.get(f'sitemap:{kind}:{shard}')
+    if cached is not None:
+        return sitemap.gzip_response(cached)
+    versions = cache.versions((f'sitemap:{kind}:{shard}',))
+    return Response(stream_with_context(sitemap.stream_shard(kind, shard, versions)), mimetype='application/xml')
+
+@main_bp.route('/robots.txt')
+def robots_txt():
+    """Point crawlers at the sitemap instead of the paginated listings"""
+    lines = ['User-agent: *', 'Disallow: /*?page=', 'Disallow: /*&page=', 'Disallow: /api/', 'Disallow: /admin/',
+             f"Sitemap: {url_for('main.sitemap_index', _external=True)}"]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain')
+
 # ===== AUTHENTICATION ROUTES =====
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@limiter.limit('10 per minute', methods=['POST'])
 def login():
     """User login"""
     if current_user.is_authenticated:
@@ -301,6 +607,7 @@ def login():
     return render_template('auth/login.html', title='Sign In', form=form)
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@limiter.limit('5 per hour', methods=['POST'])
 def register():
     """User registration"""
     if current_user.is_authenticated:
@@ -317,6 +624,8 @@ def register():
         user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
+        cache.invalidate(*sitemap.profile_scopes(user.id))
+        suggestions.author_saved(user)
         flash('Congratulations, you are now registered!', 'success')
         return redirect(url_for('auth.login'))
     
@@ -332,44 +641,67 @@ def logout():
 
 # ===== API ROUTES =====
 @api_bp.route('/search')
+@limiter.limit('30 per minute')
 def search():
     """Enhanced search API endpoint"""
-    query = request.args.get('q', '').strip()
+    text = clean_query(request.args.get('q', ''))
     category_id = request.args.get('category', 0, type=int)
     
-    if len(query) < 2:
+    if len(text) < 2:
         return jsonify({'posts': []})
     
-    posts_query = Post.query.filter(
-        Post.title.contains(query) | Post.content.contains(query),
-        Post.is_published == True
-    )
-    
-    if category_id:
-        posts_query = posts_query.filter_by(category_id=category_id)
-    
-    posts = posts_query.order_by(Post.created_at.desc()).limit(10).all()
+    def run_search():
+        pattern = like_pattern(text)
+        posts_query = listings.published_posts().where(
+            Post.title.ilike(pattern, escape='\\') | Post.content.ilike(pattern, escape='\\')
+        )
+        if category_id:
+            posts_query = posts_query.where(Post.category_id == category_id)
+        return Post.to_dict_many(listings.fetch(posts_query.order_by(Post.created_at.desc()).limit(10)))
     
+    # Hot queries are answered from the result cache; every query feeds the analytics
     return jsonify({
-        'posts': [post.to_dict() for post in posts]
+        'posts': search_stats.search(normalize_query(text), category_id, run_search)
     })
 
+@api_bp.route('/suggest')
+@limiter.limit('300 per minute')
+def suggest():
+    """Typeahead: post, category, author and tag prefix matches from memory (never queries the database)"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 5, type=int), SUGGEST_MAX_LIMIT))
+    kinds = [k for k in request.args.get('types', '').split(',') if k in SUGGEST_KINDS] or SUGGEST_KINDS
+    response = jsonify({'query': query, **suggestions.suggest(query, limit, kinds)})
+    response.cache_control.public = True
+    response.cache_control.max_age = 30
+    return response
+
 @api_bp.route('/posts')
 def get_posts():
     """Get posts API endpoint with enhanced filtering"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 5, type=int)
     category_id = request.args.get('category', 0, type=int)
+    tag_slug = request.args.get('tag', '')
     
-    query = Post.query.filter_by(is_published=True)
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    posts = query.order_by(Post.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False)
+    if tag_slug:
+        tag = Tag.query.filter_by(slug=tag_slug).first()
+        if tag is None:
+            return jsonify({'error': 'Unknown tag'}), 404
+        query = tagged_posts(tag)
+        if category_id:
+            query = query.where(Post.category_id == category_id)
+            posts = listings.paginate(query, page, per_page)
+        else:
+            posts = paginate_tagged(tag, query, page, per_page)
+    else:
+        query = listings.published_posts()
+        if category_id:
+            query = query.where(Post.category_id == category_id)
+        posts = listings.paginate(query.order_by(Post.created_at.desc()), page, per_page)
     
     return jsonify({
-        'posts': [post.to_dict() for post in posts.items],
+        'posts': Post.to_dict_many(posts.items),
         'total': posts.total,
         'pages': posts.pages,
         'current_page': page,
@@ -396,15 +728,44 @@ def user_stats():
         'user': current_user.to_dict()
     })
 
+@api_bp.route('/engagement')
+@login_required
+def get_engagement():
+    """Daily views, likes and comments for the current author, or one of their posts, from the rollups"""
+    days = max(1, min(request.args.get('days', 30, type=int), ENGAGEMENT_MAX_DAYS))
+    post_id = request.args.get('post', 0, type=int)
+    if post_id:
+        Post.query.filter_by(id=post_id, user_id=current_user.id).with_entities(Post.id).first_or_404()
+        return jsonify({'post_id': post_id, **engagement.series(current_user.id, days, post_id),
+                        **unique_viewers.summary(post_id, days)})
+    return jsonify({**engagement.series(current_user.id, days), 'posts': engagement.top_posts(current_user.id, days)})
+
 @api_bp.route('/categories')
 def get_categories():
     """Get all categories"""
-    categories = Category.query.order_by(Category.name).all()
     return jsonify({
-        'categories': [category.to_dict() for category in categories]
+        'categories': [category.to_dict() for category in refdata.categories()]
+    })
+
+@api_bp.route('/trending')
+def get_trending():
+    """Trending posts overall or in one category (?category=<id>), answered from memory"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), current_app.config['TRENDING_SIZE']))
+    category_id = request.args.get('category', type=int)
+    return jsonify({
+        'category': category_id,
+        'posts': [{
+            'id': p.id,
+            'title': p.title,
+            'slug': p.slug,
+            'url': url_for('main.view_post', slug=p.slug),
+            'category_id': p.category_id,
+            'score': p.score,
+        } for p in trending.top(limit, category_id)]
     })
 
 @api_bp.route('/validate_username')
+@limiter.limit('60 per minute')
 def validate_username():
     """Validate username availability via AJAX"""
     username = request.args.get('username', '').strip()
@@ -421,6 +782,7 @@ def validate_username():
     return jsonify({'available': True, 'message': 'Username is available'})
 
 @api_bp.route('/validate_email')
+@limiter.limit('60 per minute')
 def validate_email():
     """Validate email availability via AJAX"""
     email = request.args.get('email', '').strip()
@@ -433,16 +795,107 @@ def validate_email():
     
     return jsonify({'available': True, 'message': 'Email is available'})
 
+@api_bp.route('/posts/<int:id>/comments')
+def get_comments(id):
+    """A post's approved comments, newest first, a page at a time (?before=<last comment id seen>)"""
+    post = Post.query.filter_by(id=id, is_published=True).first_or_404()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    before = request.args.get('before', type=int)
+    
+    query = approved_comments(post.id).options(joinedload(Comment.author))
+    if before:
+        query = query.filter(Comment.id < before)
+    comments = query.order_by(Comment.id.desc()).limit(limit + 1).all()
+    has_more = len(comments) > limit
+    comments = comments[:limit]
+    reply_counts = Comment.reply_counts([comment.id for comment in comments])
+    return jsonify({
+        'comments': [comment.to_dict(reply_count=reply_counts.get(comment.id, 0)) for comment in comments],
+        'next_before': comments[-1].id if has_more else None
+    })
+
+@api_bp.route('/posts/<int:id>/comments', methods=['POST'])
+@login_required
+@limiter.limit('10 per minute')
+def create_comment(id):
+    """Add a comment without a page reload
+    
+    Takes the comment form fields as form data or JSON, with the CSRF token
+    in the X-CSRFToken header. Answers 201 with just the new comment: the
+    rendered fragment when the client asks for text/html, otherwise JSON
+    carrying both the comment and its fragment.
+    """
+    post = Post.query.filter_by(id=id, is_published=True).first_or_404()
+    if not post.allow_comments:
+        return jsonify({'error': 'Comments are disabled for this post.'}), 403
+    
+    form = CommentForm()
+    if not form.validate():
+        return jsonify({'error': 'Invalid comment', 'errors': form.errors}), 400
+    
+    data, html = save_comment(post, form, render=True)
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+        return html, 201, {'Content-Type': 'text/html; charset=utf-8'}
+    return jsonify({'comment': data, 'html': html}), 201
+
 @api_bp.route('/like_post/<int:id>', methods=['POST'])
 @login_required
+@limiter.limit('30 per minute')
 def like_post(id):
     """Like/unlike a post"""
     post = Post.query.get_or_404(id)
     # Simple like system (in production, you'd want a separate likes table)
     post.like_count += 1
     db.session.commit()
+    broker.publish(f'post:{post.id}', 'likes', {'likes': post.like_count})
+    if post.is_published:
+        trending.record(post, 'like')
+        engagement.record(post, 'like')
     return jsonify({'likes': post.like_count})
 
+# Beacons are tiny; anything bigger is not from advanced-features.js
+MAX_BEACON_BYTES = 16 * 1024
+
+@api_bp.route('/analytics/performance', methods=['POST'])
+@csrf.exempt
+@limiter.limit('30 per minute')
+def ingest_performance():
+    """Accept a Navigation Timing beacon (buffered, written in batches)"""
+    if (request.content_length or 0) > MAX_BEACON_BYTES:
+        return jsonify({'error': 'Payload too large'}), 413
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Invalid payload'}), 400
+    if not rum_collector.record_metric(payload, urlparse(request.referrer or '').path):
+        return jsonify({'error': 'Unknown page'}), 400
+    return '', 204
+
+@api_bp.route('/errors', methods=['POST'])
+@csrf.exempt
+@limiter.limit('30 per minute')
+def ingest_error():
+    """Accept a client-side error report (buffered, written in batches)"""
+    if (request.content_length or 0) > MAX_BEACON_BYTES:
+        return jsonify({'error': 'Payload too large'}), 413
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Invalid payload'}), 400
+    if not rum_collector.record_error(payload, urlparse(request.referrer or '').path, request.user_agent.string):
+        return jsonify({'error': 'Unknown page'}), 400
+    return '', 204
+
+@api_bp.route('/export/<any(posts, comments):kind>.ndjson')
+@login_required
+def export(kind):
+    """Admin export of every post or comment as newline-delimited JSON, streamed at constant memory"""
+    if not current_user.is_admin:
+        abort(403)
+    
+    after = request.args.get('after', 0, type=int)
+    body = stream_with_context(exports.stream(kind, current_app.json.dumps, after))
+    return Response(body, mimetype='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename={kind}.ndjson', 'X-Accel-Buffering': 'no'})
+
 # ===== ADMIN ROUTES =====
 @admin_bp.route('/categories')
 @login_required
@@ -451,7 +904,7 @@ def manage_categories():
     if not current_user.is_admin:
         abort(403)
     
-    categories = Category.query.order_by(Category.name).all()
+    categories = refdata.categories()
     return render_template('admin/categories.html', title='Manage Categories', categories=categories)
 
 @admin_bp.route('/category/new', methods=['GET', 'POST'])
@@ -475,11 +928,101 @@ def create_category():
         )
         db.session.add(category)
         db.session.commit()
+        cache.invalidate('sitemap:categories:0', refdata.CATEGORIES)
+        suggestions.category_saved(category)
         flash('Category created successfully!', 'success')
         return redirect(url_for('admin.manage_categories'))
     
     return render_template('admin/category_form.html', title='Create Category', form=form)
 
+@admin_bp.route('/comments')
+@login_required
+def moderation_queue():
+    """Comment moderation queue, newest first"""
+    if not current_user.is_admin:
+        abort(403)
+    
+    status = request.args.get('status', 'pending')
+    if status not in moderation.STATUSES:
+        status = 'pending'
+    user_id = request.args.get('user', type=int)
+    comments, next_before = moderation.moderation_queue(status, user_id=user_id,
+                                                        before=request.args.get('before', type=int))
+    return render_template('admin/comments.html', title='Moderation', comments=comments, status=status,
+                           user_id=user_id, next_before=next_before, actions=moderation.ACTIONS)
+
+@admin_bp.route('/comments/moderate', methods=['POST'])
+@login_required
+def moderate_comments():
+    """Approve, reject or delete the selected comments, or remove their authors as spam"""
+    if not current_user.is_admin:
+        abort(403)
+    
+    action = request.form.get('action')
+    if action not in moderation.ACTIONS:
+        abort(400)
+    comment_ids = request.form.getlist('comment_ids', type=int)
+    count = moderation.moderate_comments(comment_ids, action)
+    if action == 'spam':
+        flash(f'Removed {count} spam account(s) with their posts and comments.', 'success')
+    else:
+        done = {'approve': 'Approved', 'reject': 'Rejected', 'delete': 'Deleted'}[action]
+        flash(f'{done} {count} comment(s).', 'success')
+    return redirect(request.referrer or url_for('admin.moderation_queue'))
+
+@admin_bp.route('/users/purge', methods=['POST'])
+@login_required
+def purge_users():
+    """Delete spam accounts with everything they posted"""
+    if not current_user.is_admin:
+        abort(403)
+    
+    count = moderation.purge_users(request.form.getlist('user_ids', type=int))
+    flash(f'Removed {count} account(s) with their posts and comments.', 'success')
+    return redirect(request.referrer or url_for('admin.moderation_queue'))
+
+@admin_bp.route('/performance')
+@login_required
+def performance():
+    """Per-page real-user monitoring percentiles"""
+    if not current_user.is_admin:
+        abort(403)
+    
+    try:
+        day = date.fromisoformat(request.args.get('day', ''))
+    except ValueError:
+        day = datetime.utcnow().date()
+    
+    # Write out whatever is still buffered so today's numbers are current
+    rum_collector.flush()
+    rum_collector.rollup(day)
+    rollups = PerformanceRollup.query.filter_by(day=day).order_by(PerformanceRollup.samples.desc()).all()
+    return render_template('admin/performance.html', title='Performance', rollups=rollups,
+                           day=day, stats=rum_collector.stats())
+
+@admin_bp.route('/search')
+@login_required
+def search_analytics():
+    """Most frequent searches and searches that found nothing (this worker's share of traffic)"""
+    if not current_user.is_admin:
+        abort(403)
+    return render_template('admin/search.html', title='Search Analytics', report=search_stats.report())
+
+@admin_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint (admin session or METRICS_TOKEN bearer token)"""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    
+    token = current_app.config['METRICS_TOKEN']
+    if not (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        if not current_user.is_authenticated:
+            return login_manager.unauthorized()
+        if not current_user.is_admin:
+            abort(403)
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # ===== ERROR HANDLERS =====
 @main_bp.app_errorhandler(404)
 def not_found_error(error):
@@ -492,6 +1035,14 @@ def internal_error(error):
     db.session.rollback()
     return render_template('errors/500.html'), 500
 
+@main_bp.app_errorhandler(429)
+def too_many_requests_error(error):
+    """429 error handler (Retry-After is carried over from the exception)"""
+    headers = {'Retry-After': str(error.retry_after)} if getattr(error, 'retry_after', None) else {}
+    if request.blueprint == 'api':
+        return jsonify({'error': 'Too many requests', 'retry_after': error.retry_after}), 429, headers
+    return render_template('errors/429.html', retry_after=error.retry_after), 429, headers
+
 @main_bp.app_errorhandler(403)
 def forbidden_error(error):
     """403 error handler"""
@@ -0,0 +1,212 @@
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+
+def _number(value, upper=600000.0):
+    """Coerce a beacon value to a bounded float, or None if unusable"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value != value or value < 0:  # NaN or negative timings
+        return None
+    return float(min(value, upper))
+
+
+def _text(value, length):
+    return str(value)[:length] if value is not None else None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class BeaconBuffer:
+    """Bounded ring buffer of rows waiting to be bulk-inserted into one table
+
+    Appends are a single deque operation so the request path never touches
+    the database; when the buffer is full the oldest rows are dropped.
+    """
+
+    def __init__(self, model, capacity):
+        self.model = model
+        self.rows = deque(maxlen=capacity)
+        self.dropped = 0
+
+    def append(self, row):
+        if len(self.rows) == self.rows.maxlen:
+            self.dropped += 1
+        self.rows.append(row)
+
+    def drain(self, limit):
+        batch = []
+        try:
+            while len(batch) < limit:
+                batch.append(self.rows.popleft())
+        except IndexError:
+            pass
+        return batch
+
+
+class RUMCollector:
+    """Collects real-user monitoring beacons and writes them in batches"""
+
+    def __init__(self, app=None):
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app.models import PerformanceMetric, ClientError
+
+        app.config.setdefault('RUM_BUFFER_SIZE', 10000)
+        app.config.setdefault('RUM_BATCH_SIZE', 500)
+        app.config.setdefault('RUM_FLUSH_INTERVAL', 5.0)
+        capacity = app.config['RUM_BUFFER_SIZE']
+        self.app = app
+        self.metrics = BeaconBuffer(PerformanceMetric, capacity)
+        self.errors = BeaconBuffer(ClientError, capacity)
+
+    def page_rule(self, path):
+        """The URL rule a page path belongs to ('/post/<slug>'), or None if no GET route matches
+
+        Beacons are stored per rule, not per path: clients can't invent pages,
+        and the rollups stay one row per route per day.
+        """
+        if not isinstance(path, str) or not path.startswith('/'):
+            return None
+        try:
+            rule, _ = self.app.url_map.bind('localhost').match(path.split('?', 1)[0], method='GET',
+                                                               return_rule=True)
+        except (HTTPException, RequestRedirect):
+            return None
+        return rule.rule
+
+    def record_metric(self, payload, page):
+        """Queue a Navigation Timing beacon; returns False if it names no known page"""
+        page = self.page_rule(payload.get('page') or page)
+        if page is None:
+            return False
+        page_load = payload.get('pageLoad') if isinstance(payload.get('pageLoad'), dict) else {}
+        self.metrics.append({
+            'page': page,
+            'ttfb': _number(payload.get('ttfb')),
+            'load_time': _number(page_load.get('totalTime')),
+            'dom_content_loaded': _number(page_load.get('domContentLoaded')),
+            'lcp': _number(payload.get('lcp')),
+            'fid': _number(payload.get('fid')),
+            'cls': _number(payload.get('cls'), upper=100.0),
+            'created_at': datetime.utcnow(),
+        })
+        self._notify(self.metrics)
+        return True
+
+    def record_error(self, payload, page, user_agent):
+        """Queue a client-side error report; returns False if it names no known page"""
+        page = self.page_rule(payload.get('page') or page)
+        if page is None:
+            return False
+        lineno, colno = payload.get('lineno'), payload.get('colno')
+        self.errors.append({
+            'page': page,
+            'type': _text(payload.get('type'), 20),
+            'message': _text(payload.get('message'), 500),
+            'filename': _text(payload.get('filename'), 255),
+            'lineno': lineno if isinstance(lineno, int) else None,
+            'colno': colno if isinstance(colno, int) else None,
+            'stack': _text(payload.get('stack'), 10000),
+            'user_agent': _text(user_agent, 255),
+            'created_at': datetime.utcnow(),
+        })
+        self._notify(self.errors)
+        return True
+
+    def _notify(self, buffer):
+        """Start the flusher on first use and wake it early once a batch is ready"""
+        if self._thread is None:
+            self._start()
+        if len(buffer.rows) >= self.app.config['RUM_BATCH_SIZE']:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                # Started lazily so gunicorn forks never inherit a running thread
+                self._thread = threading.Thread(target=self._run, name='rum-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.app.config['RUM_FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                self.app.logger.exception('Failed to flush RUM beacons')
+
+    def flush(self):
+        """Write all buffered beacons, one multi-row INSERT per batch (needs an app context)"""
+        from app import db
+
+        written = 0
+        batch_size = self.app.config['RUM_BATCH_SIZE']
+        for buffer in (self.metrics, self.errors):
+            while True:
+                batch = buffer.drain(batch_size)
+                if not batch:
+                    break
+                db.session.execute(insert(buffer.model), batch)
+                db.session.commit()
+                written += len(batch)
+        return written
+
+    def rollup(self, day):
+        """Recompute per-page TTFB and load-time percentiles for one day"""
+        from app import db
+        from app.models import PerformanceMetric, PerformanceRollup
+
+        start = datetime(day.year, day.month, day.day)
+        rows = db.session.query(PerformanceMetric.page, PerformanceMetric.ttfb, PerformanceMetric.load_time).filter(
+            PerformanceMetric.created_at >= start,
+            PerformanceMetric.created_at < start + timedelta(days=1)
+        ).yield_per(5000)
+
+        samples = defaultdict(lambda: ([], [], [0]))
+        for page, ttfb, load_time in rows:
+            ttfbs, loads, count = samples[page]
+            count[0] += 1
+            if ttfb is not None:
+                ttfbs.append(ttfb)
+            if load_time is not None:
+                loads.append(load_time)
+
+        existing = {r.page: r for r in PerformanceRollup.query.filter_by(day=day)}
+        for page, (ttfbs, loads, count) in samples.items():
+            ttfbs.sort()
+            loads.sort()
+            rollup = existing.get(page) or PerformanceRollup(day=day, page=page)
+            rollup.samples = count[0]
+            rollup.ttfb_p50, rollup.ttfb_p95, rollup.ttfb_p99 = (percentile(ttfbs, p) for p in (50, 95, 99))
+            rollup.load_p50, rollup.load_p95, rollup.load_p99 = (percentile(loads, p) for p in (50, 95, 99))
+            db.session.add(rollup)
+        db.session.commit()
+        return len(samples)
+
+    def stats(self):
+        return {
+            'buffered_metrics': len(self.metrics.rows),
+            'buffered_errors': len(self.errors.rows),
+            'dropped_metrics': self.metrics.dropped,
+            'dropped_errors': self.errors.dropped,
+            'flusher_running': self._thread is not None,
+        }
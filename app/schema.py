@@ -0,0 +1,142 @@
+"""
+In-place schema upgrades for databases created by older versions
+
+db.create_all() only creates missing tables: it never adds an index to an
+existing table or changes a foreign key. Two kinds of drift therefore
+build up on a long-lived database:
+
+- indexes declared on the models but missing from the table
+- foreign keys whose ON DELETE differs from the model. The relationships
+  rely on the database to delete comments and notifications
+  (passive_deletes), so an old constraint turns deleting a post into an
+  IntegrityError
+
+`flask schema check` lists the drift and `flask schema upgrade` fixes it:
+CREATE INDEX for missing indexes, and for foreign keys ALTER TABLE on
+PostgreSQL or, on SQLite (which can't alter constraints), the documented
+rebuild: create the new table, copy the rows, drop the old one, rename.
+Upgrading is idempotent; the deploy commands run it before gunicorn starts.
+"""
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
+
+from app import db
+
+
+def _ondelete(value):
+    return (value or 'NO ACTION').upper()
+
+
+def stale_foreign_keys(connection):
+    """[(table, model ForeignKeyConstraint, reflected name)] whose ON DELETE differs from the model"""
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    stale = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        reflected = {(tuple(fk['constrained_columns']), fk['referred_table']): fk
+                     for fk in inspector.get_foreign_keys(table.name)}
+        for constraint in table.foreign_key_constraints:
+            fk = reflected.get((tuple(constraint.column_keys), constraint.referred_table.name))
+            if fk is not None and _ondelete(fk['options'].get('ondelete')) != _ondelete(constraint.ondelete):
+                stale.append((table, constraint, fk['name']))
+    return stale
+
+
+def missing_indexes(connection):
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name in existing:
+            names = {index['name'] for index in inspector.get_indexes(table.name)}
+            missing.extend(index for index in table.indexes if index.name not in names)
+    return missing
+
+
+def _rebuild_sqlite_table(connection, table):
+    """SQLite's table rebuild with foreign key checks off, inside the caller's transaction"""
+    quote = connection.dialect.identifier_preparer.quote
+    name, temporary = quote(table.name), quote(f'_rebuild_{table.name}')
+    # The model's DDL under a temporary name; REFERENCES clauses keep the real names
+    create = str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+    prefix = f'CREATE TABLE {name} '
+    assert create.startswith(prefix), create[:80]
+    connection.exec_driver_sql(f'CREATE TABLE {temporary} ' + create[len(prefix):])
+    columns = ', '.join(quote(column['name']) for column in inspect(connection).get_columns(table.name)
+                        if column['name'] in table.c)
+    connection.exec_driver_sql(f'INSERT INTO {temporary} ({columns}) SELECT {columns} FROM {name}')
+    connection.exec_driver_sql(f'DROP TABLE {name}')
+    connection.exec_driver_sql(f'ALTER TABLE {temporary} RENAME TO {name}')
+    for index in table.indexes:
+        connection.execute(CreateIndex(index))
+
+
+def upgrade(engine):
+    """Bring foreign keys and indexes in line with the models; returns (foreign keys fixed, indexes created)"""
+    if engine.dialect.name == 'sqlite':
+        # PRAGMA foreign_keys only takes effect outside a transaction, so BEGIN and COMMIT by hand
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            stale = stale_foreign_keys(connection)
+            if stale:
+                connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+                connection.exec_driver_sql('BEGIN')
+                try:
+                    for table in {table for table, _, _ in stale}:
+                        _rebuild_sqlite_table(connection, table)
+                    problems = connection.exec_driver_sql('PRAGMA foreign_key_check').fetchall()
+                    if problems:
+                        raise click.ClickException(f'Rows violate foreign keys after the rebuild: {problems[:5]}')
+                    connection.exec_driver_sql('COMMIT')
+                except BaseException:
+                    connection.exec_driver_sql('ROLLBACK')
+                    raise
+                finally:
+                    connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+    else:
+        with engine.begin() as connection:
+            stale = stale_foreign_keys(connection)
+            quote = connection.dialect.identifier_preparer.quote
+            for table, constraint, name in stale:
+                connection.exec_driver_sql(f'ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(name)}')
+                connection.execute(AddConstraint(constraint))
+    with engine.begin() as connection:
+        indexes = missing_indexes(connection)
+        for index in indexes:
+            try:
+                connection.execute(CreateIndex(index))
+            except IntegrityError as e:
+                # A new unique index over rows that already repeat, e.g. duplicate queued jobs
+                raise click.ClickException(f'Cannot create unique index {index.name} on {index.table.name}; '
+                                           f'remove the duplicate rows first: {e.orig}')
+    return len(stale), len(indexes)
+
+
+schema_cli = AppGroup('schema', help='Check and upgrade the database schema.')
+
+
+@schema_cli.command('check')
+def check_command():
+    """List foreign keys and indexes that differ from the models"""
+    with db.engine.connect() as connection:
+        stale, indexes = stale_foreign_keys(connection), missing_indexes(connection)
+    for table, constraint, _ in stale:
+        click.echo(f'foreign key {table.name}({", ".join(constraint.column_keys)}) '
+                   f'needs ON DELETE {_ondelete(constraint.ondelete)}')
+    for index in indexes:
+        click.echo(f'missing index {index.name} on {index.table.name}')
+    if stale or indexes:
+        raise click.ClickException('Schema is out of date; run flask schema upgrade')
+    click.echo('Schema is up to date')
+
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Fix foreign keys and create missing indexes"""
+    fixed, created = upgrade(db.engine)
+    click.echo(f'Fixed {fixed} foreign key(s), created {created} index(es)')
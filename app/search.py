@@ -0,0 +1,135 @@
+"""
+Search query analytics and the hot-query result cache
+
+Queries are normalized (lower-cased, whitespace collapsed) before they are
+counted or cached, so "Flask  Tips" and "flask tips" are one query. The
+database searches for the text as typed, whitespace collapsed, with ILIKE,
+so both spellings find the same posts; lower() rather than casefold()
+keeps "straße" and "strasse", which match different posts, apart.
+Two space-saving summaries track the SEARCH_TOP_K most frequent queries
+and the most frequent queries that found nothing, in fixed memory however
+long the tail of distinct queries grows. Admins see both at /admin/search.
+Counts are per process, so with several workers each one reports its
+share of the traffic.
+
+Results are cached in the shared ScopedCache, keyed on the normalized query
+and category. Every post write bumps the SEARCH_SCOPE version, which acts as
+a global post-content version counter and makes all cached results miss.
+Only queries seen at least SEARCH_CACHE_MIN_COUNT times are cached, so the
+one-off tail doesn't evict feeds and reference data. View, like and
+comment counts in cached results can lag by up to SEARCH_CACHE_TTL.
+"""
+
+import threading
+
+SEARCH_SCOPE = 'search:posts'
+MAX_QUERY_LENGTH = 100
+
+
+def clean_query(query):
+    """The query as typed with whitespace collapsed: what the database searches for"""
+    return ' '.join((query or '').split())[:MAX_QUERY_LENGTH]
+
+
+def normalize_query(query):
+    """Cache and analytics key of a query"""
+    return clean_query(query).lower()
+
+
+def like_pattern(text):
+    """'%text%' for ILIKE ... ESCAPE '\\', matching the user's % and _ literally"""
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class SpaceSaving:
+    """Space-saving heavy hitters: the top items of a stream in at most capacity counters
+
+    An item that isn't tracked takes over the counter of the current minimum,
+    inheriting its count as the item's possible overcount (error). Any item
+    seen more than total/capacity times is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}  # item -> [count, error]
+        self.total = 0
+
+    def add(self, item):
+        self.total += 1
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += 1
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [1, 0]
+        else:
+            evicted = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(evicted)[0]
+            self.counters[item] = [floor + 1, floor]
+
+    def guaranteed(self, item):
+        """Lower bound on how often item was seen (0 if it isn't tracked)"""
+        count, error = self.counters.get(item, (0, 0))
+        return count - error
+
+    def top(self, n):
+        """[(item, count, error)] for the n highest counts"""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:n]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+
+class SearchAnalytics:
+    """Popular and zero-result query tracking plus admission to the result cache"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_TOP_K', 200)
+        app.config.setdefault('SEARCH_CACHE_TTL', 60)
+        app.config.setdefault('SEARCH_CACHE_MIN_COUNT', 2)
+        self.app = app
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queries = SpaceSaving(self.app.config['SEARCH_TOP_K'])
+            self.zero_results = SpaceSaving(self.app.config['SEARCH_TOP_K'])
+            self.cache_hits = self.cache_misses = 0
+
+    def search(self, query, category_id, run):
+        """Count query and return its results, from the cache when possible
+
+        query must already be normalized; run() computes the results on a miss.
+        """
+        from app import cache
+
+        key = f'search:{category_id}:{query}'
+        with self._lock:
+            self.queries.add(query)
+            admitted = self.queries.guaranteed(query) >= self.app.config['SEARCH_CACHE_MIN_COUNT']
+        results = cache.get(key) if admitted else None
+        with self._lock:
+            if results is not None:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        if results is None:
+            versions = cache.versions((SEARCH_SCOPE,))
+            results = run()
+            if admitted:
+                cache.set(key, results, ttl=self.app.config['SEARCH_CACHE_TTL'], versions=versions)
+        if not results:
+            with self._lock:
+                self.zero_results.add(query)
+        return results
+
+    def report(self, n=50):
+        with self._lock:
+            return {
+                'total': self.queries.total, 'distinct_tracked': len(self.queries.counters),
+                'top': self.queries.top(n), 'zero_results': self.zero_results.top(n),
+                'zero_result_total': self.zero_results.total,
+                'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses,
+            }
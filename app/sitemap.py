@@ -0,0 +1,130 @@
+import gzip
+import zlib
+from collections import namedtuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from flask import Response, current_app, request, url_for
+
+from app import cache, db
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+# Gzipped sitemap index plus the (kind, shard) pairs it lists
+SitemapIndex = namedtuple('SitemapIndex', 'body shards')
+
+
+def shard_size():
+    return current_app.config['SITEMAP_SHARD_SIZE']
+
+
+def post_scopes(post_id):
+    """Cache scopes to invalidate when a post is created, edited or deleted"""
+    return ('sitemap:index', f'sitemap:posts:{post_id // shard_size()}')
+
+
+def profile_scopes(user_id):
+    return ('sitemap:index', f'sitemap:profiles:{user_id // shard_size()}')
+
+
+def _url(loc, lastmod=None):
+    lastmod = f'<lastmod>{lastmod:%Y-%m-%d}</lastmod>' if lastmod else ''
+    return f'<url><loc>{escape(loc)}</loc>{lastmod}</url>\n'
+
+
+def build_index():
+    """Sitemap index listing every non-empty shard, with its newest change as lastmod"""
+    from app.models import Post, User
+
+    size = shard_size()
+    shard = (Post.id // size).label('shard')
+    post_shards = db.session.query(shard, db.func.max(Post.updated_at)).filter(
+        Post.is_published == True).group_by(shard).order_by(shard).all()
+    user_shard = (User.id // size).label('shard')
+    profile_shards = db.session.query(user_shard).filter(User.is_active == True).group_by(
+        user_shard).order_by(user_shard).all()
+
+    entries = [(url_for('main.sitemap_shard', kind='categories', shard=0, _external=True), None)]
+    entries += [(url_for('main.sitemap_shard', kind='posts', shard=n, _external=True), lastmod)
+                for n, lastmod in post_shards]
+    entries += [(url_for('main.sitemap_shard', kind='profiles', shard=n, _external=True), None)
+                for (n,) in profile_shards]
+    body = [XML_HEADER, '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for loc, lastmod in entries:
+        lastmod = f'<lastmod>{lastmod:%Y-%m-%d}</lastmod>' if lastmod else ''
+        body.append(f'<sitemap><loc>{escape(loc)}</loc>{lastmod}</sitemap>\n')
+    body.append('</sitemapindex>\n')
+    shards = {('categories', 0)} | {('posts', n) for n, _ in post_shards} | {('profiles', n) for (n,) in profile_shards}
+    return SitemapIndex(gzip.compress(''.join(body).encode('utf-8')), shards)
+
+
+def get_index():
+    return cache.get_or_set('sitemap:index', build_index, scopes=('sitemap:index',))
+
+
+def gzip_response(body):
+    """Serve a cached gzipped document, inflating it only for clients that can't take gzip"""
+    if 'gzip' in request.accept_encodings:
+        response = Response(body, mimetype='application/xml')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(body), mimetype='application/xml')
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
+
+def _shard_rows(kind, shard):
+    """Yield <url> entries for one shard, streaming rows with a server-side cursor"""
+    from app.models import Post, User, Category
+
+    size = shard_size()
+    if kind == 'categories':
+        yield _url(url_for('main.index', _external=True))
+        for (category_id,) in db.session.query(Category.id).order_by(Category.id):
+            yield _url(url_for('main.index', category=category_id, _external=True))
+        return
+
+    # An id range per shard: no OFFSET scans, and editing one post only touches its own shard
+    model = Post if kind == 'posts' else User
+    low, high = shard * size, (shard + 1) * size
+    if kind == 'posts':
+        query = db.session.query(Post.slug, Post.updated_at).filter(Post.is_published == True)
+    else:
+        query = db.session.query(User.username, db.null()).filter(User.is_active == True)
+    query = query.filter(model.id >= low, model.id < high).order_by(model.id).execution_options(
+        stream_results=True, yield_per=1000)
+
+    # Build the URL prefix once rather than calling url_for for every row
+    if kind == 'posts':
+        prefix = url_for('main.view_post', slug='__slug__', _external=True).replace('__slug__', '')
+    else:
+        prefix = url_for('main.user_profile', username='__user__', _external=True).replace('__user__', '')
+    for name, lastmod in query:
+        yield _url(prefix + quote(name), lastmod)
+
+
+def stream_shard(kind, shard, versions):
+    """Yield the shard's XML while compressing a copy that is cached once the stream completes"""
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    compressed = []
+    for chunk in _buffered([XML_HEADER, URLSET_OPEN], _shard_rows(kind, shard), ['</urlset>\n']):
+        compressed.append(compressor.compress(chunk))
+        yield chunk
+    compressed.append(compressor.flush())
+    cache.set(f'sitemap:{kind}:{shard}', b''.join(compressed), versions=versions, ttl=86400)
+
+
+def _buffered(head, rows, tail, size=65536):
+    """Join many small strings into ~64 KiB byte chunks for the response"""
+    buffer, length = list(head), 0
+    for row in rows:
+        buffer.append(row)
+        length += len(row)
+        if length >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, length = [], 0
+    buffer.extend(tail)
+    yield ''.join(buffer).encode('utf-8')
@@ -0,0 +1,400 @@
+"""
+Typeahead suggestions from in-memory prefix indexes
+
+Each kind of suggestion (posts, categories, authors, tags) has a
+PrefixIndex. A title is indexed once per word (the rest of the title from
+that word on, cut to KEY_LENGTH characters), so "cach" finds "Flask
+caching guide". The keys are not stored: two parallel arrays of entry ids
+and character offsets, sorted by the key each pair spells out of the
+entry's normalized text, are binary searched. That is 12 bytes per
+key. The index is loaded in bulk with one sort. Top-k results for busy
+prefixes are cached and updated in place as entries change.
+
+The index is built from the database on first use in each process and
+then kept current from post, category and user writes. Those changes are
+broadcast on the broker's "suggest" channel so every worker applies them,
+and suggestion requests never touch the database.
+"""
+
+import heapq
+import os
+import re
+import socket
+import threading
+from array import array
+from collections import Counter
+
+from flask import url_for
+
+KINDS = ('post', 'category', 'author', 'tag')
+PLURALS = {'post': 'posts', 'category': 'categories', 'author': 'authors', 'tag': 'tags'}
+KEY_LENGTH = 32
+WORDS_PER_TITLE = 12
+MAX_LIMIT = 10
+TOP_SIZE = 2 * MAX_LIMIT  # Cached top-k lists keep slack so popularity drops rarely force a rescan
+SEPARATOR = '\x00'  # Between an entry's texts; normalize() never produces it
+_WORD_RE = re.compile(r'\w+')
+_WORD_START_RE = re.compile(r'\b\w')
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').casefold()))
+
+
+def index_text(texts):
+    """An entry's searchable text: the first WORDS_PER_TITLE words of each text"""
+    return SEPARATOR.join(' '.join(normalize(text).split()[:WORDS_PER_TITLE]) for text in texts)
+
+
+def key_at(text, offset):
+    """The search key starting at offset: the rest of that text, cut to KEY_LENGTH"""
+    return text[offset:offset + KEY_LENGTH].partition(SEPARATOR)[0]
+
+
+def key_offsets(text):
+    """{search key: offset} with one key per word of an index_text()"""
+    keys = {}
+    for match in _WORD_START_RE.finditer(text):
+        keys.setdefault(key_at(text, match.start()), match.start())
+    return keys
+
+
+def prefixes_of(keys):
+    return {key[:i] for key in keys for i in range(1, len(key) + 1)}
+
+
+class PrefixIndex:
+    """Sorted (entry id, key offset) arrays plus per-entry label and popularity"""
+
+    def __init__(self):
+        self.ids = array('l')
+        self.offsets = array('I')
+        self.entries = {}  # entry id -> [label, popularity, data, index text]
+        self._top = {}     # prefix -> [best entry ids, popularity no uncached match exceeds]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _key(self, position):
+        return key_at(self.entries[self.ids[position]][3], self.offsets[position])
+
+    def _bisect(self, key, low=0, right=False):
+        """First position whose key is >= key (> key with right=True), like bisect over the spelled-out keys"""
+        high = len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            current = self._key(middle)
+            if current < key or (right and current == key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def load(self, rows):
+        """Replace the contents with rows of (entry id, label, popularity, data, texts or None)"""
+        entries, keys, ids, offsets = {}, [], array('l'), array('I')
+        for entry_id, label, popularity, data, texts in rows:
+            text = index_text(texts or (label,))
+            entries[entry_id] = [label, popularity, data, text]
+            for key, offset in key_offsets(text).items():
+                keys.append(key)
+                ids.append(entry_id)
+                offsets.append(offset)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.entries = entries
+        self.ids = array('l', map(ids.__getitem__, order))
+        self.offsets = array('I', map(offsets.__getitem__, order))
+        self._top = {}
+
+    def add(self, entry_id, label, popularity, data, texts=None):
+        """Insert or replace an entry, indexed under texts (default: its label)"""
+        if entry_id in self.entries:
+            self.remove(entry_id)
+        text = index_text(texts or (label,))
+        keys = key_offsets(text)
+        self.entries[entry_id] = [label, popularity, data, text]
+        for key, offset in keys.items():
+            position = self._bisect(key, right=True)
+            self.ids.insert(position, entry_id)
+            self.offsets.insert(position, offset)
+        self._rerank(entry_id, prefixes_of(keys))
+
+    def remove(self, entry_id):
+        entry = self.entries.get(entry_id)
+        if entry is None:
+            return
+        keys = key_offsets(entry[3])
+        for key in keys:
+            position = self._bisect(key)
+            while self.ids[position] != entry_id:
+                position += 1
+            del self.ids[position]
+            del self.offsets[position]
+        del self.entries[entry_id]
+        for prefix in prefixes_of(keys):
+            cached = self._top.get(prefix)
+            if cached is not None and entry_id in cached[0]:
+                cached[0].remove(entry_id)
+                if len(cached[0]) < MAX_LIMIT:
+                    del self._top[prefix]
+
+    def adjust(self, entry_id, delta):
+        """Change an entry's popularity by delta"""
+        entry = self.entries.get(entry_id)
+        if entry is not None:
+            entry[1] += delta
+            self._rerank(entry_id, prefixes_of(key_offsets(entry[3])))
+
+    def _rerank(self, entry_id, prefixes):
+        """Update the cached top lists of prefixes after entry_id was added or its popularity changed"""
+        entries = self.entries
+        popularity = entries[entry_id][1]
+        for prefix in prefixes:
+            cached = self._top.get(prefix)
+            if cached is None:
+                continue
+            best, bound = cached
+            if entry_id in best:
+                if popularity < bound:  # Some uncached match may now rank above it
+                    best.remove(entry_id)
+            elif popularity > bound:
+                best.append(entry_id)
+            else:
+                continue
+            best.sort(key=lambda e: entries[e][1], reverse=True)
+            if len(best) > TOP_SIZE:
+                cached[1] = max(bound, entries[best.pop()][1])
+            if len(best) < MAX_LIMIT:
+                del self._top[prefix]
+
+    def search(self, prefix, limit):
+        """Up to limit entry ids whose keys start with prefix, most popular first"""
+        cached = self._top.get(prefix)
+        if cached is not None:
+            return cached[0][:limit]
+        low = self._bisect(prefix)
+        high = self._bisect(prefix + '\U0010ffff', low)
+        entries = self.entries
+        matches = set(self.ids[low:high])
+        best = heapq.nlargest(TOP_SIZE, matches, key=lambda e: entries[e][1])
+        if high - low > 64:
+            self._top[prefix] = [best, entries[best[-1]][1] if len(matches) > TOP_SIZE else float('-inf')]
+        return best[:limit]
+
+
+class SuggestIndex:
+    """Post, category, author and tag prefix indexes for /api/suggest"""
+
+    channel = 'suggest'
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pid = None
+        self._listener = None
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.indexes = {kind: PrefixIndex() for kind in KINDS}
+        self._posts = {}  # post id -> (user_id, category_id, tag ids) it counts towards
+        self._built = False
+        self._backlog = None
+
+    @property
+    def _origin(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def _ensure_listening(self):
+        if self._pid != os.getpid():
+            from app import broker
+
+            self._pid = os.getpid()
+            if self._listener is None:
+                self._listener = broker.listen(self.channel, self._on_message)
+            elif hasattr(broker.transport, 'ensure_listening'):
+                broker.transport.ensure_listening()
+
+    # ----- building -----
+
+    def build(self):
+        """Load every published post, category and active author (needs an app context)"""
+        from app import db
+        from app.models import Category, Post, Tag, User, post_tag
+
+        with self._lock:
+            self._reset()
+            self._backlog = []
+        post_rows = db.session.query(Post.id, Post.title, Post.slug, Post.view_count,
+                                     Post.user_id, Post.category_id).filter(Post.is_published == True).all()
+        post_tags = {}
+        for post_id, *tag in db.session.query(post_tag.c.post_id, Tag.id, Tag.name, Tag.slug).join(
+                Tag, Tag.id == post_tag.c.tag_id).join(Post, Post.id == post_tag.c.post_id).filter(
+                Post.is_published == True):
+            post_tags.setdefault(post_id, []).append(tag)
+        categories = db.session.query(Category.id, Category.name, Category.slug).all()
+        users = db.session.query(User.id, User.username, User.first_name, User.last_name).filter(
+            User.is_active == True).all()
+
+        # Counted and sorted outside the lock; suggestions wait only for the swap and the backlog
+        posts, tag_names = {}, {}
+        author_posts, category_posts, tag_posts = Counter(), Counter(), Counter()
+        for post_id, _, _, _, user_id, category_id in post_rows:
+            tags = post_tags.get(post_id, ())
+            posts[post_id] = (user_id, category_id, [tag[0] for tag in tags])
+            author_posts[user_id] += 1
+            category_posts[category_id] += 1
+            for tag_id, name, tag_slug in tags:
+                tag_posts[tag_id] += 1
+                tag_names[tag_id] = (name, tag_slug)
+        indexes = {kind: PrefixIndex() for kind in KINDS}
+        indexes['author'].load((user_id, username, author_posts[user_id], f'{first_name} {last_name}',
+                                (username, f'{first_name} {last_name}'))
+                               for user_id, username, first_name, last_name in users)
+        indexes['category'].load((category_id, name, category_posts[category_id], slug, None)
+                                 for category_id, name, slug in categories)
+        indexes['post'].load((post_id, title, view_count or 0, slug, None)
+                             for post_id, title, slug, view_count, _, _ in post_rows)
+        indexes['tag'].load((tag_id, name, tag_posts[tag_id], tag_slug, None)
+                            for tag_id, (name, tag_slug) in tag_names.items())
+
+        with self._lock:
+            self.indexes, self._posts = indexes, posts
+            for event, data in self._backlog:
+                self._apply(event, data)
+            self._backlog = None
+            self._built = True
+
+    def _ensure_built(self):
+        self._ensure_listening()
+        if not self._built:
+            with self._build_lock:
+                if not self._built:
+                    self.build()
+
+    # ----- applying changes (caller holds the lock) -----
+
+    def _add_author(self, user_id, username, full_name):
+        index = self.indexes['author']
+        popularity = index.entries[user_id][1] if user_id in index.entries else 0
+        index.add(user_id, username, popularity, full_name, texts=(username, full_name))
+
+    def _add_post(self, post_id, title, slug, view_count, user_id, category_id, tags):
+        self._remove_post(post_id)
+        self.indexes['post'].add(post_id, title, view_count or 0, slug)
+        tag_index = self.indexes['tag']
+        for tag_id, name, tag_slug in tags:
+            if tag_id in tag_index.entries:
+                tag_index.adjust(tag_id, 1)
+            else:
+                tag_index.add(tag_id, name, 1, tag_slug)
+        self.indexes['author'].adjust(user_id, 1)
+        self.indexes['category'].adjust(category_id, 1)
+        self._posts[post_id] = (user_id, category_id, [tag[0] for tag in tags])
+
+    def _remove_post(self, post_id):
+        previous = self._posts.pop(post_id, None)
+        if previous is None:
+            return
+        user_id, category_id, tags = previous
+        self.indexes['post'].remove(post_id)
+        self.indexes['author'].adjust(user_id, -1)
+        self.indexes['category'].adjust(category_id, -1)
+        tag_index = self.indexes['tag']
+        for tag_id in tags:
+            tag_index.adjust(tag_id, -1)
+            if tag_index.entries[tag_id][1] <= 0:
+                tag_index.remove(tag_id)
+
+    def _apply(self, event, data):
+        if event == 'post':
+            if data['is_published']:
+                self._add_post(data['id'], data['title'], data['slug'], data['view_count'],
+                               data['user_id'], data['category_id'], data['tags'])
+            else:
+                self._remove_post(data['id'])
+        elif event == 'post_deleted':
+            self._remove_post(data['id'])
+        elif event == 'category':
+            index = self.indexes['category']
+            popularity = index.entries[data['id']][1] if data['id'] in index.entries else 0
+            index.add(data['id'], data['name'], popularity, data['slug'])
+        elif event == 'author':
+            self._add_author(data['id'], data['username'], data['full_name'])
+        elif event == 'authors_deleted':
+            for user_id in data['ids']:
+                self.indexes['author'].remove(user_id)
+            removed = set(data['ids'])
+            for post_id in [p for p, (user_id, _, _) in self._posts.items() if user_id in removed]:
+                self._remove_post(post_id)
+
+    def _on_message(self, event, data):
+        if data.get('origin') != self._origin:
+            self._change(event, data, publish=False)
+
+    def _change(self, event, data, publish=True):
+        with self._lock:
+            if self._backlog is not None:
+                self._backlog.append((event, data))
+            elif self._built:
+                self._apply(event, data)
+        if publish:
+            from app import broker
+
+            broker.publish(self.channel, event, dict(data, origin=self._origin))
+
+    # ----- public write hooks -----
+
+    def post_saved(self, post):
+        """Index a created or edited post, or drop it if it is no longer published"""
+        self._change('post', {
+            'id': post.id, 'title': post.title, 'slug': post.slug,
+            'tags': [[tag.id, tag.name, tag.slug] for tag in post.tags],
+            'view_count': post.view_count or 0, 'user_id': post.user_id, 'category_id': post.category_id,
+            'is_published': bool(post.is_published),
+        })
+
+    def post_deleted(self, post_id):
+        self._change('post_deleted', {'id': post_id})
+
+    def category_saved(self, category):
+        self._change('category', {'id': category.id, 'name': category.name, 'slug': category.slug})
+
+    def author_saved(self, user):
+        self._change('author', {'id': user.id, 'username': user.username, 'full_name': user.get_full_name()})
+
+    def authors_deleted(self, user_ids):
+        self._change('authors_deleted', {'ids': sorted(user_ids)})
+
+    # ----- reading -----
+
+    def suggest(self, query, limit=5, kinds=KINDS):
+        """Top matches per kind for a typed prefix, as JSON-ready dicts"""
+        self._ensure_built()
+        prefix = normalize(query)
+        results = {}
+        with self._lock:
+            for kind in kinds:
+                index = self.indexes[kind]
+                matches = index.search(prefix, limit) if prefix else []
+                results[kind] = [(entry_id, *index.entries[entry_id][:3]) for entry_id in matches]
+        return {PLURALS[kind]: [self._format(kind, *match) for match in matches] for kind, matches in results.items()}
+
+    def _format(self, kind, entry_id, label, popularity, data):
+        if kind == 'post':
+            return {'id': entry_id, 'label': label, 'url': url_for('main.view_post', slug=data)}
+        if kind == 'category':
+            return {'id': entry_id, 'label': label, 'url': url_for('main.index', category=entry_id)}
+        if kind == 'author':
+            return {'id': entry_id, 'label': label, 'name': data,
+                    'url': url_for('main.user_profile', username=label)}
+        return {'id': entry_id, 'label': label, 'count': popularity, 'url': url_for('main.tag_posts', slug=data)}
+
+    def stats(self):
+        return {kind: len(index) for kind, index in self.indexes.items()}
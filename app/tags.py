@@ -0,0 +1,161 @@
+"""
+Tags parsed from Post.meta_keywords into the tag and post_tag tables
+
+post_tag is keyed (post_id, tag_id) with a (tag_id, post_id) index, so a
+tag listing walks the index newest-post-first instead of LIKE-scanning
+meta_keywords. Tag.post_count (published posts only) is kept in step on
+every write, which lets tag pages paginate without a COUNT query.
+"""
+
+import re
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+MAX_TAGS = 10
+MAX_LENGTH = 50
+
+
+def slugify(name):
+    slug = re.sub(r'[^\w\s-]', '', name.lower())
+    return re.sub(r'[-\s]+', '-', slug).strip('-')
+
+
+def parse_tags(keywords):
+    """Comma-separated keywords as {slug: display name}, first spelling wins"""
+    tags = {}
+    for name in (keywords or '').split(','):
+        name = ' '.join(name.split())[:MAX_LENGTH]
+        slug = slugify(name)
+        if slug and slug not in tags:
+            tags[slug] = name
+        if len(tags) == MAX_TAGS:
+            break
+    return tags
+
+
+def get_or_create(tags):
+    """Tag ids for {slug: name}, inserting any tags that don't exist yet"""
+    from app.models import Tag
+
+    if not tags:
+        return {}
+    found = dict(db.session.execute(select(Tag.slug, Tag.id).where(Tag.slug.in_(tags))).all())
+    missing = [{'slug': slug, 'name': name, 'post_count': 0} for slug, name in tags.items() if slug not in found]
+    if missing:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Tag), missing)
+        except IntegrityError:
+            pass  # Created concurrently by another request; the select below picks it up
+        found = dict(db.session.execute(select(Tag.slug, Tag.id).where(Tag.slug.in_(tags))).all())
+    return found
+
+
+def _bump(tag_ids, delta):
+    from app.models import Tag
+
+    if tag_ids:
+        db.session.execute(update(Tag).where(Tag.id.in_(tag_ids)).values(post_count=Tag.post_count + delta),
+                           execution_options={'synchronize_session': False})
+
+
+def post_tag_ids(post_id):
+    from app.models import post_tag
+
+    return set(db.session.scalars(select(post_tag.c.tag_id).where(post_tag.c.post_id == post_id)))
+
+
+def sync_post_tags(post, was_published=False):
+    """Point post_tag at the tags in post.meta_keywords and adjust counts (caller commits)
+
+    was_published is whether the post counted towards its tags before this
+    save: False for a new post, the pre-edit is_published for an edit.
+    """
+    from app.models import post_tag
+
+    current = post_tag_ids(post.id)
+    wanted = set(get_or_create(parse_tags(post.meta_keywords)).values())
+    if wanted - current:
+        db.session.execute(insert(post_tag), [{'post_id': post.id, 'tag_id': t} for t in wanted - current])
+    if current - wanted:
+        db.session.execute(delete(post_tag).where(post_tag.c.post_id == post.id,
+                                                  post_tag.c.tag_id.in_(current - wanted)))
+
+    counted_before = current if was_published else set()
+    counted_now = wanted if post.is_published else set()
+    _bump(counted_now - counted_before, 1)
+    _bump(counted_before - counted_now, -1)
+    db.session.expire(post, ['tags'])
+
+
+def post_deleted(post):
+    """Release a post's tag counts; call before deleting it (post_tag rows go by cascade)"""
+    if post.is_published:
+        _bump(post_tag_ids(post.id), -1)
+
+
+def recount(tag_ids=None):
+    """Recompute Tag.post_count from post_tag, for tag_ids or every tag"""
+    from app.models import Post, Tag, post_tag
+
+    published = select(db.func.count()).select_from(post_tag).join(Post, Post.id == post_tag.c.post_id).where(
+        post_tag.c.tag_id == Tag.id, Post.is_published == True).scalar_subquery()
+    statement = update(Tag).values(post_count=published)
+    if tag_ids is not None:
+        if not tag_ids:
+            return
+        statement = statement.where(Tag.id.in_(tag_ids))
+    db.session.execute(statement, execution_options={'synchronize_session': False})
+
+
+def backfill(batch_size=500, after_id=0):
+    """Create tags and post_tag rows from meta_keywords for posts after after_id, then recount
+
+    Idempotent: links that already exist are skipped. Returns the number of links added.
+    """
+    from app.models import Post, post_tag
+
+    last_id, linked = after_id, 0
+    while True:
+        rows = db.session.execute(select(Post.id, Post.meta_keywords).where(
+            Post.id > last_id, Post.meta_keywords.isnot(None), Post.meta_keywords != '').order_by(
+            Post.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        parsed = {post_id: parse_tags(keywords) for post_id, keywords in rows}
+        ids = get_or_create({slug: name for tags in parsed.values() for slug, name in tags.items()})
+        existing = set(db.session.execute(select(post_tag.c.post_id, post_tag.c.tag_id).where(
+            post_tag.c.post_id.in_(parsed))).all())
+        links = [{'post_id': post_id, 'tag_id': ids[slug]} for post_id, tags in parsed.items() for slug in tags
+                 if (post_id, ids[slug]) not in existing]
+        if links:
+            db.session.execute(insert(post_tag), links)
+        db.session.commit()
+        linked += len(links)
+    recount()
+    db.session.commit()
+    return linked
+
+
+tags_cli = AppGroup('tags', help='Maintain post tags.')
+
+
+@tags_cli.command('backfill')
+@click.option('--batch-size', default=500, show_default=True)
+def backfill_command(batch_size):
+    """Link existing posts to tags parsed from their meta_keywords"""
+    click.echo(f'Linked {backfill(batch_size)} post tag(s)')
+
+
+@tags_cli.command('recount')
+def recount_command():
+    """Recompute every tag's published post count"""
+    recount()
+    db.session.commit()
+    click.echo('Recounted tags')
@@ -0,0 +1,32 @@
+"""Background job handlers, run by the workers in app/jobs.py"""
+
+from app import db, engagement, job_queue, notifier
+from app.models import Post
+
+
+@job_queue.task('post.process')
+def process_post(post_id):
+    """Recompute word count and reading time
+
+    Saving a post now does this inline; the task stays registered so jobs
+    queued by older versions still run.
+    """
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return  # Deleted before the job ran
+    word_count = len(post.content.split())
+    # Core UPDATE with updated_at pinned so background work doesn't look like an author edit
+    db.session.execute(db.update(Post).where(Post.id == post_id).values(
+        word_count=word_count, reading_time=max(1, round(word_count / 200)), updated_at=Post.updated_at))
+
+
+@job_queue.task('notifications.send_digests')
+def send_notification_digests():
+    """Email every recipient with pending comment notifications one digest"""
+    notifier.send_digests()
+
+
+@job_queue.task('engagement.rollup')
+def rollup_engagement():
+    """Compact recent engagement events into the daily tables and prune old ones"""
+    engagement.rollup_recent()
@@ -0,0 +1,227 @@
+import heapq
+import os
+import threading
+import time
+from collections import namedtuple
+from operator import itemgetter
+
+from sqlalchemy import bindparam, case, delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+# Relative weight of each engagement event
+WEIGHTS = {'view': 1.0, 'like': 3.0, 'comment': 5.0}
+
+# Scores are kept relative to a landmark that moves every LANDMARK_HALF_LIVES
+# half-lives, so the stored numbers never grow past 2 ** LANDMARK_HALF_LIVES
+LANDMARK_HALF_LIVES = 32
+LANDMARK_DECAY = 2.0 ** -LANDMARK_HALF_LIVES
+
+TrendingPost = namedtuple('TrendingPost', 'id title slug category_id score')
+
+
+class TrendingTracker:
+    """Exponentially time-decayed popularity of posts, kept in memory
+
+    Uses forward decay: an event at time t adds weight * 2 ** ((t - L) / H)
+    for half-life H and landmark L, so a score never needs touching again
+    to decay. Every score shrinks by the same factor as time passes and
+    ranking only compares scores at one instant, so ordering is correct
+    without rewriting anything. Rankings are rebuilt at most every
+    TRENDING_REFRESH seconds and then answered by slicing.
+
+    Each worker adds its own events to the post_trending table every
+    TRENDING_CHECKPOINT_INTERVAL seconds with a relative UPDATE, then
+    reloads the merged scores, so workers converge on the global ranking.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._scores = {}   # post_id -> score relative to the current landmark
+        self._meta = {}     # post_id -> (title, slug, category_id)
+        self._pending = {}  # post_id -> score added since the last checkpoint
+        self._landmark = None
+        self._rankings = None
+        self._built_at = 0.0
+        self._loaded = False
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TRENDING_HALF_LIFE', 6 * 3600)
+        app.config.setdefault('TRENDING_SIZE', 50)
+        app.config.setdefault('TRENDING_REFRESH', 5.0)
+        app.config.setdefault('TRENDING_CHECKPOINT_INTERVAL', 30.0)
+        self.app = app
+        with self._lock:
+            self._scores, self._meta, self._pending = {}, {}, {}
+            self._landmark, self._rankings, self._loaded = None, None, False
+
+    @property
+    def half_life(self):
+        return self.app.config['TRENDING_HALF_LIFE']
+
+    def _landmark_at(self, now):
+        return int(now // (self.half_life * LANDMARK_HALF_LIVES))
+
+    def _roll(self, now):
+        """Move to the current landmark, rescaling every score (caller holds the lock)"""
+        landmark = self._landmark_at(now)
+        if self._landmark is None:
+            self._landmark = landmark
+        elif landmark != self._landmark:
+            factor = LANDMARK_DECAY ** (landmark - self._landmark)
+            self._scores = {k: v * factor for k, v in self._scores.items()}
+            self._pending = {k: v * factor for k, v in self._pending.items()}
+            self._landmark = landmark
+            self._rankings = None
+
+    def _weight(self, now):
+        start = self._landmark * self.half_life * LANDMARK_HALF_LIVES
+        return 2.0 ** ((now - start) / self.half_life)
+
+    def record(self, post, kind):
+        """Count a view, like or comment on a published post"""
+        now = time.time()
+        with self._lock:
+            self._roll(now)
+            value = WEIGHTS[kind] * self._weight(now)
+            self._scores[post.id] = self._scores.get(post.id, 0.0) + value
+            self._pending[post.id] = self._pending.get(post.id, 0.0) + value
+            self._meta[post.id] = (post.title, post.slug, post.category_id)
+        self._ensure_started()
+
+    def post_changed(self, post):
+        """Keep title and category current after an edit; unpublished posts drop out"""
+        with self._lock:
+            if post.id not in self._scores:
+                return
+            if post.is_published:
+                self._meta[post.id] = (post.title, post.slug, post.category_id)
+            else:
+                # Pending and meta too, or the next checkpoint would bring it back
+                self._scores.pop(post.id, None)
+                self._pending.pop(post.id, None)
+                self._meta.pop(post.id, None)
+            self._rankings = None
+
+    def discard(self, post_id):
+        with self._lock:
+            self._scores.pop(post_id, None)
+            self._pending.pop(post_id, None)
+            self._rankings = None
+
+    def top(self, k=10, category_id=None, exclude=None):
+        """The k highest-scoring posts now, overall or in one category (needs an app context)"""
+        if not self._loaded:
+            self.reload()
+        now = time.time()
+        with self._lock:
+            self._roll(now)
+            if self._rankings is None or now - self._built_at > self.app.config['TRENDING_REFRESH']:
+                self._rankings = self._rank(now)
+                self._built_at = now
+            overall, by_category = self._rankings
+        ranked = by_category.get(category_id, ()) if category_id else overall
+        if exclude is not None:
+            return [p for p in ranked[:k + 1] if p.id != exclude][:k]
+        return ranked[:k]
+
+    def _rank(self, now):
+        size = self.app.config['TRENDING_SIZE']
+        scale = 1.0 / self._weight(now)  # Back to the decayed score as of now
+        groups = {}
+        for post_id, score in self._scores.items():
+            groups.setdefault(self._meta[post_id][2], []).append((post_id, score))
+
+        def ranked(items):
+            return [TrendingPost(post_id, *self._meta[post_id], round(score * scale, 3))
+                    for post_id, score in heapq.nlargest(size, items, key=itemgetter(1))]
+
+        return ranked(self._scores.items()), {c: ranked(items) for c, items in groups.items() if c}
+
+    # ----- checkpointing -----
+
+    def _ensure_started(self):
+        # Per process: a gunicorn fork needs its own checkpoint thread
+        if self._pid == os.getpid() or not self.app.config['TRENDING_CHECKPOINT_INTERVAL']:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='trending-checkpoint', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.app.config['TRENDING_CHECKPOINT_INTERVAL'])
+            try:
+                with self.app.app_context():
+                    self.checkpoint()
+            except Exception:
+                self.app.logger.exception('Failed to checkpoint trending scores')
+
+    def checkpoint(self):
+        """Add this worker's new events to post_trending, then reload the merged scores"""
+        from app import db
+        from app.models import Post, TrendingScore
+
+        with self._lock:
+            self._roll(time.time())
+            pending, self._pending = self._pending, {}
+            landmark = self._landmark
+        if pending:
+            table = TrendingScore.__table__
+            try:
+                known = set(db.session.scalars(db.select(TrendingScore.post_id).where(
+                    TrendingScore.post_id.in_(pending))))
+                new = db.session.scalars(db.select(Post.id).where(Post.id.in_(set(pending) - known))).all()
+                if new:
+                    db.session.execute(insert(table), [{'post_id': p, 'score': 0.0, 'landmark': landmark}
+                                                       for p in new])
+                # Rows last written under the previous landmark are rescaled on the way; older ones are ~0
+                carried = case((table.c.landmark == landmark, table.c.score),
+                               (table.c.landmark == landmark - 1, table.c.score * LANDMARK_DECAY), else_=0.0)
+                db.session.execute(
+                    update(table).where(table.c.post_id == bindparam('b_post_id')).values(
+                        score=carried + bindparam('b_delta'), landmark=landmark),
+                    [{'b_post_id': p, 'b_delta': v} for p, v in pending.items()])
+                db.session.execute(delete(table).where(table.c.landmark < landmark - 1))
+                db.session.commit()
+            except IntegrityError:
+                # Another worker inserted the same row first; keep the events for the next round
+                db.session.rollback()
+                with self._lock:
+                    for post_id, value in pending.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0.0) + value
+                return 0
+        self.reload()
+        return len(pending)
+
+    def reload(self):
+        """Replace in-memory scores with post_trending plus events not yet checkpointed"""
+        from app import db
+        from app.models import Post, TrendingScore
+
+        landmark = self._landmark_at(time.time())
+        rows = db.session.query(TrendingScore.post_id, TrendingScore.score, TrendingScore.landmark, Post.title,
+                                Post.slug, Post.category_id).join(Post).filter(
+            Post.is_published == True, TrendingScore.landmark >= landmark - 1)
+        scores, meta = {}, {}
+        for post_id, score, row_landmark, title, slug, category_id in rows:
+            scores[post_id] = score if row_landmark == landmark else score * LANDMARK_DECAY
+            meta[post_id] = (title, slug, category_id)
+
+        with self._lock:
+            self._roll(time.time())
+            if self._landmark != landmark:
+                scores = {k: v * LANDMARK_DECAY for k, v in scores.items()}
+            for post_id, value in self._pending.items():
+                if post_id in self._meta:
+                    scores[post_id] = scores.get(post_id, 0.0) + value
+                    meta.setdefault(post_id, self._meta[post_id])
+            self._scores, self._meta = scores, meta
+            self._rankings = None
+            self._loaded = True
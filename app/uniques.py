@@ -0,0 +1,232 @@
+"""
+Approximate unique viewers per post with HyperLogLog sketches
+
+Every view adds the visitor to the post's sketch for the current UTC day.
+The visitor is the user id when signed in, or otherwise an HMAC of the
+client address and user agent. A sketch has 2**PRECISION one-byte
+registers, which gives about 2% standard error. That is 2 KB per post per
+day at most, and far less after zlib when few people have visited. Small
+sketches are kept sparse in memory.
+
+Each worker collects the day's new sketch entries in memory. Every
+UNIQUES_CHECKPOINT_INTERVAL seconds it merges them into the
+post_view_sketch rows by taking the register-wise maximum, guarded by a
+version column. Merging is idempotent and order-free, so any number of
+workers can do this safely. Sketches for any range of days union the
+same way, which answers "unique viewers this week" without a row per view.
+"""
+
+import hashlib
+import hmac
+import math
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+PRECISION = 11
+REGISTERS = 1 << PRECISION
+_SPARSE_LIMIT = REGISTERS // 8
+
+
+class HyperLogLog:
+    """HyperLogLog cardinality sketch over 64-bit blake2b hashes"""
+
+    def __init__(self):
+        self.sparse = {}  # register -> rank, until enough registers are set to go dense
+        self.registers = None
+
+    def add(self, value):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - PRECISION)
+        rest = hashed & ((1 << (64 - PRECISION)) - 1)
+        self._set(index, (64 - PRECISION) - rest.bit_length() + 1)
+
+    def _set(self, index, rank):
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        elif rank > self.sparse.get(index, 0):
+            self.sparse[index] = rank
+            if len(self.sparse) > _SPARSE_LIMIT:
+                self._densify()
+
+    def _densify(self):
+        self.registers = bytearray(REGISTERS)
+        for index, rank in self.sparse.items():
+            self.registers[index] = rank
+        self.sparse = {}
+
+    def merge(self, other):
+        """Fold other into this sketch (register-wise maximum); returns self"""
+        if other.registers is None:
+            for index, rank in other.sparse.items():
+                self._set(index, rank)
+        else:
+            if self.registers is None:
+                self._densify()
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        if self.registers is None:
+            values = list(self.sparse.values()) + [0] * (REGISTERS - len(self.sparse))
+        else:
+            values = self.registers
+        estimate = (0.7213 / (1 + 1.079 / REGISTERS)) * REGISTERS ** 2 / sum(2.0 ** -r for r in values)
+        zeros = values.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            estimate = REGISTERS * math.log(REGISTERS / zeros)  # Linear counting for small cardinalities
+        return round(estimate)
+
+    def to_bytes(self):
+        if self.registers is None:
+            self._densify()
+        return zlib.compress(bytes(self.registers), 9)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        sketch = cls()
+        sketch.registers = bytearray(zlib.decompress(blob))
+        return sketch
+
+    @classmethod
+    def union(cls, sketches):
+        result = cls()
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+class UniqueViewers:
+    """Per-post, per-day HyperLogLog sketches, checkpointed to the post_view_sketch table"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pending = {}  # (post_id, day) -> HyperLogLog of visitors not yet merged into the table
+        self._pid = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('UNIQUES_CHECKPOINT_INTERVAL', 30.0)  # 0 disables the checkpoint thread
+        self.app = app
+        with self._lock:
+            self._pending = {}
+
+    # ----- recording -----
+
+    def visitor_key(self):
+        """The signed-in user, or an anonymized client fingerprint (needs a request context)"""
+        from flask import request
+        from flask_login import current_user
+
+        if current_user.is_authenticated:
+            return f'u:{current_user.id}'
+        client = f"{request.remote_addr}|{request.headers.get('User-Agent', '')}"
+        digest = hmac.new(self.app.config['SECRET_KEY'].encode('utf-8'), client.encode('utf-8'), hashlib.sha256)
+        return 'v:' + digest.hexdigest()
+
+    def record(self, post_id, visitor=None):
+        """Count a view of post_id by visitor (default: the current request's visitor)"""
+        visitor = visitor or self.visitor_key()
+        with self._lock:
+            sketch = self._pending.setdefault((post_id, _today()), HyperLogLog())
+            sketch.add(visitor)
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Per process: a gunicorn fork needs its own checkpoint thread
+        if self._pid == os.getpid() or not self.app.config['UNIQUES_CHECKPOINT_INTERVAL']:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='uniques-checkpoint', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.app.config['UNIQUES_CHECKPOINT_INTERVAL'])
+            try:
+                with self.app.app_context():
+                    self.checkpoint()
+            except Exception:
+                self.app.logger.exception('Failed to checkpoint unique-viewer sketches')
+
+    # ----- persistence -----
+
+    def checkpoint(self):
+        """Merge pending sketches into the table; returns the number of rows written (needs an app context)"""
+        from app import db
+        from app.models import Post, PostViewSketch
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        written = 0
+        for (post_id, day), sketch in pending.items():
+            for _ in range(5):
+                row = db.session.execute(select(PostViewSketch.registers, PostViewSketch.version).where(
+                    PostViewSketch.post_id == post_id, PostViewSketch.day == day)).first()
+                try:
+                    if row is None:
+                        with db.session.begin_nested():
+                            db.session.execute(insert(PostViewSketch), [{
+                                'post_id': post_id, 'day': day, 'registers': sketch.to_bytes(), 'version': 1}])
+                        done = True
+                    else:
+                        merged = HyperLogLog.from_bytes(row.registers).merge(sketch)
+                        # Another worker may have merged since the SELECT; then re-read and merge again
+                        done = db.session.execute(update(PostViewSketch).where(
+                            PostViewSketch.post_id == post_id, PostViewSketch.day == day,
+                            PostViewSketch.version == row.version).values(
+                            registers=merged.to_bytes(), version=row.version + 1),
+                            execution_options={'synchronize_session': False}).rowcount == 1
+                except IntegrityError:
+                    done = False  # Inserted concurrently, or the post was deleted; the next SELECT tells which
+                    if db.session.get(Post, post_id) is None:
+                        break
+                if done:
+                    written += 1
+                    break
+            db.session.commit()
+        return written
+
+    def sketches(self, post_id, first_day, last_day):
+        """{day: HyperLogLog} for post_id between two days, including this worker's pending views"""
+        from app import db
+        from app.models import PostViewSketch
+
+        rows = db.session.execute(select(PostViewSketch.day, PostViewSketch.registers).where(
+            PostViewSketch.post_id == post_id, PostViewSketch.day >= first_day, PostViewSketch.day <= last_day))
+        sketches = {day: HyperLogLog.from_bytes(registers) for day, registers in rows}
+        with self._lock:
+            for (pending_post, day), sketch in self._pending.items():
+                if pending_post == post_id and first_day <= day <= last_day:
+                    sketches[day] = sketches.get(day, HyperLogLog()).merge(sketch)
+        return sketches
+
+    def summary(self, post_id, days=30):
+        """Unique viewers over the last days, and per day, oldest first"""
+        first = _today() - timedelta(days=days - 1)
+        sketches = self.sketches(post_id, first, _today())
+        daily = [sketches[first + timedelta(days=offset)].count() if first + timedelta(days=offset) in sketches
+                 else 0 for offset in range(days)]
+        return {'unique_viewers': HyperLogLog.union(sketches.values()).count(), 'daily_unique_viewers': daily}
+
+    def stats(self):
+        with self._lock:
+            return {'pending_sketches': len(self._pending), 'checkpoint_running': self._thread is not None}
@@ -0,0 +1,10 @@
+"""
+Benchmark suite
+
+    python -m benchmarks seed --database sqlite:///bench.db --users 100000 --posts 1000000 --comments 10000000
+    python -m benchmarks run --database sqlite:///bench.db --output before.json
+    python -m benchmarks run --database sqlite:///bench.db --target http://127.0.0.1:8000 --output after.json
+    python -m benchmarks compare before.json after.json
+
+See benchmarks/__main__.py for all options.
+"""
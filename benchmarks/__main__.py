@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Benchmark command line
+
+    seed     populate a database with a synthetic dataset
+    run      drive every route and write a JSON report
+    compare  diff two JSON reports (exit status 1 on regression)
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _create_app(database):
+    os.environ['DATABASE_URL'] = database
+    os.environ['RATELIMIT_ENABLED'] = 'False'
+    from app import create_app
+
+    app = create_app()
+    app.config['RATELIMIT_ENABLED'] = False
+    return app
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_seed(args):
+    from app import db
+    from benchmarks.seed import seed
+
+    app = _create_app(args.database)
+    with app.app_context():
+        print(f'🌱 Seeding {args.database}')
+        summary = seed(db, users=args.users, posts=args.posts, comments=args.comments,
+                       chunk_size=args.chunk_size, rng_seed=args.seed)
+    print(f"✅ Done in {summary['seconds']}s")
+
+
+def _start_gunicorn(args):
+    port = args.port
+    env = dict(os.environ, DATABASE_URL=args.database, RATELIMIT_ENABLED='False',
+               SQL_PROFILER_ENABLED='True' if args.count_queries else 'False')
+    process = subprocess.Popen(
+        ['gunicorn', '--workers', str(args.gunicorn), '--threads', str(args.threads),
+         '--bind', f'127.0.0.1:{port}', 'run:app'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/api/categories', timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def cmd_run(args):
+    from app import db
+    from benchmarks.loadgen import HTTPBackend, LoadGenerator, TestClientBackend
+    from benchmarks.scenarios import SCENARIOS, SKIPPED_ENDPOINTS, BenchContext, uncovered_endpoints
+    from benchmarks.seed import dataset_summary
+
+    app = _create_app(args.database)
+    if not args.verbose:
+        # 500s are already counted in the report; don't flood the terminal with tracebacks
+        app.logger.setLevel(logging.CRITICAL)
+    selected = [s for s in SCENARIOS if not args.only or s.name in args.only or s.endpoint in args.only]
+    deletable = sum(args.requests + args.warmup for s in selected if s.name == 'delete_post')
+    with app.app_context():
+        ctx = BenchContext(db, deletable=deletable)
+        dataset = dataset_summary(db)
+
+    missing = uncovered_endpoints(app)
+    if missing:
+        print(f"⚠️  Endpoints without a scenario: {', '.join(missing)}", file=sys.stderr)
+
+    server = None
+    if args.gunicorn:
+        server, target = _start_gunicorn(args)
+        backend = HTTPBackend(target)
+    elif args.target:
+        backend = HTTPBackend(args.target)
+    else:
+        backend = TestClientBackend(app)
+
+    generator = LoadGenerator(backend, ctx, concurrency=args.concurrency, rng_seed=args.seed, warmup=args.warmup)
+    routes = {}
+    try:
+        for scenario in selected:
+            routes[scenario.name] = dict(endpoint=scenario.endpoint, method=scenario.method,
+                                         **generator.run_scenario(scenario, args.requests))
+            r = routes[scenario.name]
+            print(f"   {scenario.name:<26} {r['throughput_rps'] or 0:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}ms  "
+                  f"p95 {r['p95_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms  "
+                  f"queries {r['queries_per_request'] if r['queries_per_request'] is not None else '-'}",
+                  file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'backend': backend.name,
+            'target': getattr(backend, 'base_url', None),
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests,
+            'dataset': dataset,
+            'skipped_endpoints': SKIPPED_ENDPOINTS,
+            'uncovered_endpoints': missing,
+        },
+        'routes': routes,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f'📄 Report written to {args.output}', file=sys.stderr)
+    else:
+        print(output)
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = []
+    print(f"{'scenario':<26} {'p50 ms':>18} {'p95 ms':>18} {'req/s':>18} {'queries':>12}")
+    for name, new in sorted(candidate['routes'].items()):
+        old = baseline['routes'].get(name)
+        if old is None:
+            print(f'{name:<26} (new)')
+            continue
+
+        def delta(key):
+            a, b = old.get(key), new.get(key)
+            if a is None or b is None:
+                return '-', 0.0
+            change = (b - a) / a * 100 if a else 0.0
+            return f'{a:.1f}→{b:.1f} ({change:+.0f}%)', change
+
+        p50, _ = delta('p50_ms')
+        p95, p95_change = delta('p95_ms')
+        rps, _ = delta('throughput_rps')
+        old_q, new_q = old.get('queries_per_request'), new.get('queries_per_request')
+        queries = f'{old_q}→{new_q}' if old_q is not None and new_q is not None else '-'
+        print(f'{name:<26} {p50:>18} {p95:>18} {rps:>18} {queries:>12}')
+
+        if p95_change > args.threshold:
+            regressions.append(f'{name}: p95 +{p95_change:.0f}%')
+        if old_q is not None and new_q is not None and new_q > old_q:
+            regressions.append(f'{name}: queries/request {old_q} -> {new_q}')
+
+    if regressions:
+        print('\n❌ Regressions:\n   ' + '\n   '.join(regressions))
+        return 1
+    print('\n✅ No regressions')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    default_db = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'flask-bench.db')}"
+
+    seed = sub.add_parser('seed', help='populate a database with synthetic data')
+    seed.add_argument('--database', default=default_db)
+    seed.add_argument('--users', type=int, default=1000)
+    seed.add_argument('--posts', type=int, default=10000)
+    seed.add_argument('--comments', type=int, default=100000)
+    seed.add_argument('--chunk-size', type=int, default=10000)
+    seed.add_argument('--seed', type=int, default=42)
+    seed.set_defaults(func=cmd_seed)
+
+    run = sub.add_parser('run', help='drive every route and report latency, throughput and SQL counts')
+    run.add_argument('--database', default=default_db)
+    run.add_argument('--target', help='base URL of a running server (default: in-process test client)')
+    run.add_argument('--gunicorn', type=int, metavar='WORKERS', help='start gunicorn with this many workers')
+    run.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    run.add_argument('--port', type=int, default=8765)
+    run.add_argument('--count-queries', action='store_true',
+                     help='enable the SQL profiler on the spawned server to report queries per request')
+    run.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--warmup', type=int, default=5)
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--only', nargs='*', help='scenario names or endpoints to run')
+    run.add_argument('--output', help='write the JSON report here instead of stdout')
+    run.add_argument('--verbose', action='store_true', help='show application error logs')
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser('compare', help='compare two reports')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--threshold', type=float, default=10.0, help='allowed p95 increase in percent')
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Listing Query Microbenchmark
+Compares loading and serializing posts as ORM instances against the
+read-only rows of app/listings.py: CPU time and peak memory per 1000 rows
+
+Usage: python benchmarks/listings_bench.py [rows] [repeats]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(func, repeats):
+    """Return (best CPU seconds, peak traced bytes) over repeats calls"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.process_time()
+        func()
+        best = min(best, time.process_time() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(rows=5000, repeats=5):
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('JOBS_WORKERS', '0')
+    from sqlalchemy.orm import joinedload
+
+    from app import create_app, db, listings
+    from app.models import Post
+    from benchmarks.seed import seed
+
+    app = create_app()
+    with app.app_context():
+        seed(db, users=200, posts=rows, comments=0, log=lambda *args: None)
+
+        def orm(serialize):
+            def load():
+                posts = Post.query.options(joinedload(Post.author), joinedload(Post.category)).filter_by(
+                    is_published=True).order_by(Post.created_at.desc()).limit(rows).all()
+                if serialize:
+                    [post.to_dict(comment_count=0, category_post_count=0) for post in posts]
+                db.session.remove()  # End of request: let the identity map go
+            return load
+
+        def dto(serialize):
+            def load():
+                posts = listings.fetch(listings.published_posts().order_by(Post.created_at.desc()).limit(rows))
+                if serialize:
+                    [post.to_dict(comment_count=0, category_post_count=0) for post in posts]
+                db.session.remove()
+            return load
+
+        loaded = len(listings.fetch(listings.published_posts().limit(rows)))
+        print('⏱️  Listing query microbenchmark')
+        print('=' * 64)
+        print(f'   rows: {loaded}, best of {repeats}, figures per 1000 rows')
+        print(f"   {'':22}{'ORM ms':>10}{'rows ms':>10}{'ORM KB':>11}{'rows KB':>11}")
+        for label, serialize in (('load', False), ('load + to_dict', True)):
+            orm_time, orm_peak = measure(orm(serialize), repeats)
+            dto_time, dto_peak = measure(dto(serialize), repeats)
+            scale = 1000 / loaded
+            print(f'   {label:<22}{orm_time * 1000 * scale:>10.2f}{dto_time * 1000 * scale:>10.2f}'
+                  f'{orm_peak / 1024 * scale:>11.0f}{dto_peak / 1024 * scale:>11.0f}')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:3]))
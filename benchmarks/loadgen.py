@@ -0,0 +1,238 @@
+"""
+Concurrent load generator
+
+Drives scenarios through either the Flask test client (in-process, exact
+SQL counts from engine events) or real HTTP against a running server such as
+gunicorn (SQL counts read from the X-SQL-Queries header when the server runs
+with SQL_PROFILER_ENABLED).
+"""
+
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from app.rum import percentile
+
+_CSRF_RE = re.compile(r'<meta name="csrf-token" content="([^"]+)"')
+
+
+class BenchSession:
+    """One logged-in (or anonymous) client, used by a single worker thread"""
+
+    def __init__(self):
+        self.csrf_token = None
+
+    def request(self, method, path, data=None, json_body=None):
+        """Return (status, seconds, sql statements or None)"""
+        raise NotImplementedError
+
+    def fetch_csrf_token(self):
+        status, body = self._get_text('/auth/login')
+        match = _CSRF_RE.search(body)
+        self.csrf_token = match.group(1) if match else None
+
+    def login(self, username, password):
+        self.fetch_csrf_token()
+        status, _, _ = self.request('POST', '/auth/login', data={'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f'Benchmark login as {username!r} failed with HTTP {status}')
+
+    def _form(self, data):
+        data = dict(data or {})
+        if self.csrf_token:
+            data['csrf_token'] = self.csrf_token
+        return data
+
+
+class TestClientSession(BenchSession):
+    def __init__(self, app, query_counter):
+        super().__init__()
+        self.client = app.test_client()
+        self.queries = query_counter
+
+    def _get_text(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {'X-CSRFToken': self.csrf_token} if self.csrf_token else {}
+        before = self.queries.value
+        start = time.perf_counter()
+        if json_body is not None:
+            response = self.client.open(path, method=method, json=json_body, headers=headers)
+        elif method == 'POST':
+            response = self.client.open(path, method=method, data=self._form(data), headers=headers)
+        else:
+            response = self.client.open(path, method=method, headers=headers)
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, self.queries.value - before
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HTTPSession(BenchSession):
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _open(self, method, path, body=None, content_type=None):
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.csrf_token:
+            headers['X-CSRFToken'] = self.csrf_token
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            response = self.opener.open(req, timeout=60)
+        except urllib.error.HTTPError as error:
+            response = error
+        with response:
+            payload = response.read()
+            return response.status, payload, response.headers
+
+    def _get_text(self, path):
+        status, payload, _ = self._open('GET', path)
+        return status, payload.decode('utf-8', 'replace')
+
+    def request(self, method, path, data=None, json_body=None):
+        body = content_type = None
+        if json_body is not None:
+            body, content_type = json.dumps(json_body).encode(), 'application/json'
+        elif method == 'POST':
+            body = urllib.parse.urlencode(self._form(data), doseq=True).encode()
+            content_type = 'application/x-www-form-urlencoded'
+        start = time.perf_counter()
+        status, _, headers = self._open(method, path, body, content_type)
+        elapsed = time.perf_counter() - start
+        queries = headers.get('X-SQL-Queries')
+        return status, elapsed, int(queries) if queries is not None else None
+
+
+class _QueryCounter:
+    """Per-thread count of SQL statements issued through the app's engine"""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.value = self.value + 1
+
+    @property
+    def value(self):
+        return getattr(self._local, 'value', 0)
+
+
+class TestClientBackend:
+    name = 'test-client'
+
+    def __init__(self, app):
+        from app import db
+
+        self.app = app
+        with app.app_context():
+            self.counter = _QueryCounter(db.engine)
+
+    def new_session(self):
+        return TestClientSession(self.app, self.counter)
+
+
+class HTTPBackend:
+    name = 'http'
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def new_session(self):
+        return HTTPSession(self.base_url)
+
+
+def summarize(latencies, statuses, queries, wall_time):
+    """Aggregate one scenario's raw samples into the report format"""
+    latencies = sorted(latencies)
+    counted = [q for q in queries if q is not None]
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for s in statuses if s >= 500),
+        'status_counts': status_counts,
+        'throughput_rps': round(len(latencies) / wall_time, 1) if wall_time else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'queries_per_request': round(sum(counted) / len(counted), 2) if counted else None,
+    }
+
+
+class LoadGenerator:
+    """Runs each scenario with a fixed number of requests across worker threads"""
+
+    def __init__(self, backend, ctx, concurrency=8, rng_seed=1, warmup=5):
+        self.backend = backend
+        self.ctx = ctx
+        self.concurrency = concurrency
+        self.rng_seed = rng_seed
+        self.warmup = warmup
+        self._sessions = {}
+
+    def sessions(self, auth):
+        """One session per worker thread for each auth level, logged in once"""
+        if auth not in self._sessions:
+            sessions = []
+            for _ in range(self.concurrency):
+                session = self.backend.new_session()
+                if auth == 'user':
+                    session.login(*self.ctx.user_login)
+                elif auth == 'admin':
+                    session.login(*self.ctx.admin_login)
+                else:
+                    session.fetch_csrf_token()
+                sessions.append(session)
+            self._sessions[auth] = sessions
+        return self._sessions[auth]
+
+    def run_scenario(self, scenario, requests):
+        sessions = self.sessions(scenario.auth)
+        per_worker = [requests // self.concurrency + (1 if i < requests % self.concurrency else 0)
+                      for i in range(self.concurrency)]
+
+        def send(session, rng):
+            path = scenario.path(self.ctx, rng)
+            data = scenario.data(self.ctx, rng) if scenario.data else None
+            json_body = scenario.json(self.ctx, rng) if scenario.json else None
+            return session.request(scenario.method, path, data=data, json_body=json_body)
+
+        def worker(index):
+            rng = random.Random(self.rng_seed * 1000 + index)
+            return [send(sessions[index], rng) for _ in range(per_worker[index])]
+
+        # Untimed requests so template compilation and caches don't skew the first samples
+        warmup_rng = random.Random(self.rng_seed)
+        for _ in range(self.warmup):
+            send(sessions[0], warmup_rng)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = [s for samples in pool.map(worker, range(self.concurrency)) for s in samples]
+        wall_time = time.perf_counter() - start
+
+        statuses = [r[0] for r in results]
+        return summarize([r[1] for r in results], statuses, [r[2] for r in results], wall_time)
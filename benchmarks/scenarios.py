@@ -0,0 +1,208 @@
+"""
+Route scenarios
+
+One or more scenarios per endpoint in app/routes.py. Each scenario knows how
+to build a request from a BenchContext sampled out of the seeded database.
+"""
+
+import itertools
+import threading
+from collections import deque
+
+from sqlalchemy import func
+
+from benchmarks.seed import WORDS, BENCH_PASSWORD
+
+# Endpoints deliberately not driven, with the reason recorded in reports
+SKIPPED_ENDPOINTS = {
+    'static': 'served by the web server / CDN in production',
+    'main.post_events': 'long-lived SSE stream; latency is not a meaningful measure',
+    'admin.purge_users': 'irreversibly deletes seeded accounts; covered by tests/test_moderation.py',
+}
+
+
+class Scenario:
+    """A single benchmarked request shape"""
+
+    def __init__(self, name, endpoint, path, method='GET', data=None, json=None, auth=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.path = path  # callable(ctx, rng) -> str
+        self.method = method
+        self.data = data  # callable(ctx, rng) -> dict of form fields
+        self.json = json  # callable(ctx, rng) -> JSON body
+        self.auth = auth  # None, 'user' or 'admin'
+
+
+class BenchContext:
+    """Ids, slugs and names sampled from the database for building requests"""
+
+    def __init__(self, db, sample_size=1000, deletable=0):
+        from app.models import User, Post, Category, Comment, Tag
+
+        published = Post.query.with_entities(Post.id, Post.slug).filter_by(is_published=True)
+        # Popular posts dominate real traffic, so sample mostly from the top
+        popular = published.order_by(Post.view_count.desc()).limit(sample_size // 2).all()
+        recent = published.order_by(Post.id.desc()).limit(sample_size // 2).all()
+        self.posts = popular + recent
+        self.usernames = [u for (u,) in User.query.with_entities(User.username).limit(sample_size)]
+        self.category_ids = [c for (c,) in Category.query.with_entities(Category.id)]
+        self.category_slugs = [s for (s,) in Category.query.with_entities(Category.slug)]
+        self.tag_slugs = [s for (s,) in Tag.query.with_entities(Tag.slug).filter(Tag.post_count > 0).order_by(
+            Tag.post_count.desc()).limit(sample_size)] or ['none']
+        self.pages = max(1, published.count() // 5)
+        self.comment_ids = [c for (c,) in Comment.query.with_entities(Comment.id).order_by(
+            Comment.id.desc()).limit(sample_size)]
+
+        # Log in as the most prolific seeded author so dashboard/edit have real data
+        author = db.session.query(Post.user_id, func.count(Post.id).label('n')).join(User).filter(
+            User.username.like('bench%')).group_by(Post.user_id).order_by(db.text('n DESC')).first()
+        author_user = User.query.get(author[0]) if author else User.query.filter_by(username='admin').first()
+        self.user_login = (author_user.username, BENCH_PASSWORD if author else 'admin123')
+        self.admin_login = ('admin', 'admin123')
+        self.own_post_ids = [p for (p,) in Post.query.with_entities(Post.id).filter_by(
+            user_id=author_user.id).limit(sample_size)] or [p for p, _ in self.posts[:1]]
+
+        self.deletable = deque(self._create_deletable(db, author_user.id, deletable))
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _create_deletable(db, user_id, count):
+        """Throwaway posts for the delete_post scenario"""
+        from sqlalchemy import insert
+        from app.models import Post
+
+        if not count:
+            return []
+        first = (db.session.query(func.max(Post.id)).scalar() or 0) + 1
+        db.session.execute(insert(Post), [{
+            'title': f'Disposable benchmark post {first + i}', 'slug': f'disposable-benchmark-post-{first + i}',
+            'content': 'to be deleted ' * 20, 'user_id': user_id, 'is_published': True,
+        } for i in range(count)])
+        db.session.commit()
+        return list(range(first, first + count))
+
+    def unique(self):
+        with self._lock:
+            return next(self._counter)
+
+    def next_deletable(self):
+        try:
+            return self.deletable.popleft()
+        except IndexError:
+            return self.own_post_ids[0]
+
+
+def _post(ctx, rng):
+    return rng.choice(ctx.posts)
+
+
+def _post_form(ctx, rng):
+    return {
+        'title': ' '.join(rng.choice(WORDS) for _ in range(5)).capitalize() + f' {ctx.unique()}',
+        'content': ' '.join(rng.choice(WORDS) for _ in range(300)),
+        'category_id': str(rng.choice(ctx.category_ids)),
+        'meta_keywords': ', '.join(rng.sample(WORDS, 3)),
+        'is_published': 'y', 'allow_comments': 'y',
+    }
+
+
+SCENARIOS = [
+    # main_bp
+    Scenario('index', 'main.index', lambda c, r: '/'),
+    Scenario('index_category', 'main.index', lambda c, r: f'/?category={r.choice(c.category_ids)}'),
+    Scenario('index_deep_page', 'main.index', lambda c, r: f'/?page={r.randint(1, c.pages)}'),
+    Scenario('tag_posts', 'main.tag_posts', lambda c, r: f'/tag/{r.choice(c.tag_slugs)}'),
+    Scenario('tag_posts_page', 'main.tag_posts', lambda c, r: f'/tag/{r.choice(c.tag_slugs)}?page={r.randint(1, 5)}'),
+    Scenario('dashboard', 'main.dashboard', lambda c, r: '/dashboard', auth='user'),
+    Scenario('create_post_form', 'main.create_post', lambda c, r: '/create_post', auth='user'),
+    Scenario('create_post', 'main.create_post', lambda c, r: '/create_post', method='POST',
+             data=_post_form, auth='user'),
+    Scenario('edit_post_form', 'main.edit_post', lambda c, r: f'/edit_post/{r.choice(c.own_post_ids)}',
+             auth='user'),
+    Scenario('edit_post', 'main.edit_post', lambda c, r: f'/edit_post/{r.choice(c.own_post_ids)}',
+             method='POST', data=_post_form, auth='user'),
+    Scenario('delete_post', 'main.delete_post', lambda c, r: f'/delete_post/{c.next_deletable()}',
+             method='POST', data=lambda c, r: {}, auth='user'),
+    Scenario('post_revisions', 'main.post_revisions', lambda c, r: f'/post/{r.choice(c.own_post_ids)}/revisions',
+             auth='user'),
+    Scenario('view_post_slug', 'main.view_post', lambda c, r: f'/post/{_post(c, r)[1]}'),
+    Scenario('view_post_id', 'main.view_post', lambda c, r: f'/post/{_post(c, r)[0]}'),
+    Scenario('post_comments_fragment', 'main.post_comments_fragment',
+             lambda c, r: f'/post/{_post(c, r)[0]}/fragments/comments'),
+    Scenario('post_related_fragment', 'main.post_related_fragment',
+             lambda c, r: f'/post/{_post(c, r)[0]}/fragments/related'),
+    Scenario('add_comment', 'main.add_comment', lambda c, r: f'/post/{_post(c, r)[0]}/comment', method='POST',
+             data=lambda c, r: {'content': ' '.join(r.choice(WORDS) for _ in range(20))}, auth='user'),
+    Scenario('api_create_comment', 'api.create_comment', lambda c, r: f'/api/posts/{_post(c, r)[0]}/comments',
+             method='POST', data=lambda c, r: {'content': ' '.join(r.choice(WORDS) for _ in range(20))}, auth='user'),
+    Scenario('api_comments', 'api.get_comments', lambda c, r: f'/api/posts/{_post(c, r)[0]}/comments'),
+    Scenario('user_profile', 'main.user_profile', lambda c, r: f'/profile/{r.choice(c.usernames)}'),
+    Scenario('user_settings', 'main.user_settings', lambda c, r: '/settings', auth='user'),
+    Scenario('change_password_form', 'main.change_password', lambda c, r: '/change_password', auth='user'),
+    Scenario('feed_rss', 'main.feed', lambda c, r: '/feed.xml'),
+    Scenario('feed_category_atom', 'main.feed', lambda c, r: f'/category/{r.choice(c.category_slugs)}/feed.atom'),
+    Scenario('feed_author_json', 'main.feed', lambda c, r: f'/profile/{r.choice(c.usernames[:20])}/feed.json'),
+    Scenario('sitemap_index', 'main.sitemap_index', lambda c, r: '/sitemap.xml'),
+    Scenario('sitemap_posts', 'main.sitemap_shard', lambda c, r: '/sitemap-posts-0.xml'),
+    Scenario('robots_txt', 'main.robots_txt', lambda c, r: '/robots.txt'),
+
+    # auth_bp
+    Scenario('login_form', 'auth.login', lambda c, r: '/auth/login'),
+    Scenario('login_failed', 'auth.login', lambda c, r: '/auth/login', method='POST',
+             data=lambda c, r: {'username': r.choice(c.usernames), 'password': 'wrong-password'}),
+    Scenario('register_form', 'auth.register', lambda c, r: '/auth/register'),
+    Scenario('register', 'auth.register', lambda c, r: '/auth/register', method='POST', data=lambda c, r: {
+        'first_name': 'Load', 'last_name': 'Test', 'username': f'loadtest{c.unique()}_{r.randint(0, 10 ** 9)}',
+        'email': f'loadtest{c.unique()}_{r.randint(0, 10 ** 9)}@example.com',
+        'password': 'benchmark', 'password2': 'benchmark'}),
+    Scenario('logout_anonymous', 'auth.logout', lambda c, r: '/auth/logout'),
+
+    # api_bp
+    Scenario('api_search', 'api.search', lambda c, r: f'/api/search?q={r.choice(WORDS)}'),
+    Scenario('api_suggest', 'api.suggest', lambda c, r: f'/api/suggest?q={r.choice(WORDS)[:r.randint(2, 5)]}'),
+    Scenario('api_posts', 'api.get_posts', lambda c, r: '/api/posts?per_page=50'),
+    Scenario('api_posts_tag', 'api.get_posts', lambda c, r: f'/api/posts?tag={r.choice(c.tag_slugs)}&per_page=50'),
+    Scenario('api_user_stats', 'api.user_stats', lambda c, r: '/api/user_stats', auth='user'),
+    Scenario('api_engagement', 'api.get_engagement', lambda c, r: '/api/engagement?days=30', auth='user'),
+    Scenario('api_engagement_post', 'api.get_engagement',
+             lambda c, r: f'/api/engagement?days=30&post={r.choice(c.own_post_ids)}', auth='user'),
+    Scenario('api_trending', 'api.get_trending', lambda c, r: '/api/trending'),
+    Scenario('api_trending_category', 'api.get_trending',
+             lambda c, r: f'/api/trending?category={r.choice(c.category_ids)}'),
+    Scenario('api_categories', 'api.get_categories', lambda c, r: '/api/categories'),
+    Scenario('api_validate_username', 'api.validate_username',
+             lambda c, r: f'/api/validate_username?username={r.choice(c.usernames)}'),
+    Scenario('api_validate_email', 'api.validate_email',
+             lambda c, r: f'/api/validate_email?email={r.choice(c.usernames)}@example.com'),
+    Scenario('api_like_post', 'api.like_post', lambda c, r: f'/api/like_post/{_post(c, r)[0]}', method='POST',
+             auth='user'),
+    Scenario('api_performance_beacon', 'api.ingest_performance', lambda c, r: '/api/analytics/performance',
+             method='POST', json=lambda c, r: {'page': '/', 'ttfb': r.uniform(20, 400),
+                                               'pageLoad': {'totalTime': r.uniform(300, 4000)}}),
+    Scenario('api_error_beacon', 'api.ingest_error', lambda c, r: '/api/errors', method='POST',
+             json=lambda c, r: {'page': '/', 'type': 'javascript', 'message': 'ReferenceError: x is not defined',
+                                'filename': '/static/js/main.js', 'lineno': 1, 'colno': 1}),
+
+    # admin_bp
+    Scenario('admin_categories', 'admin.manage_categories', lambda c, r: '/admin/categories', auth='admin'),
+    Scenario('admin_category_form', 'admin.create_category', lambda c, r: '/admin/category/new', auth='admin'),
+    Scenario('admin_search_analytics', 'admin.search_analytics', lambda c, r: '/admin/search', auth='admin'),
+    Scenario('export_posts_ndjson', 'api.export', lambda c, r: '/api/export/posts.ndjson', auth='admin'),
+    Scenario('export_comments_ndjson', 'api.export', lambda c, r: '/api/export/comments.ndjson', auth='admin'),
+    Scenario('admin_moderation_queue', 'admin.moderation_queue', lambda c, r: '/admin/comments?status=all',
+             auth='admin'),
+    Scenario('admin_moderate_approve', 'admin.moderate_comments', lambda c, r: '/admin/comments/moderate',
+             method='POST', data=lambda c, r: {'action': 'approve',
+                                               'comment_ids': r.sample(c.comment_ids, min(20, len(c.comment_ids)))},
+             auth='admin'),
+    Scenario('admin_performance', 'admin.performance', lambda c, r: '/admin/performance', auth='admin'),
+    Scenario('admin_metrics', 'admin.prometheus_metrics', lambda c, r: '/admin/metrics', auth='admin'),
+]
+
+
+def uncovered_endpoints(app, scenarios=SCENARIOS):
+    """Endpoints registered on the app that no scenario drives"""
+    covered = {s.endpoint for s in scenarios} | set(SKIPPED_ENDPOINTS)
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules()} - covered)
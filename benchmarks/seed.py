@@ -0,0 +1,158 @@
+"""
+Synthetic dataset generator
+
+Bulk-inserts users, posts and comments with skewed, roughly realistic
+distributions: a few prolific authors, uneven category sizes, and a small
+set of popular posts that attract most views, likes and comments.
+"""
+
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+WORDS = (
+    'python flask web api database cache query index async server client design pattern '
+    'deploy docker cloud scale latency stream worker queue search model data machine learning '
+    'career guide tips tutorial intro advanced deep dive review notes lessons debugging testing '
+    'security auth token session template frontend backend css javascript react performance'
+).split()
+
+# Relative share of posts per default category slug
+CATEGORY_WEIGHTS = {
+    'programming': 30, 'web-development': 25, 'technology': 20,
+    'ai-ml': 12, 'career': 8, 'general': 5,
+}
+
+BENCH_PASSWORD = 'benchmark'
+
+
+def zipf_weights(n, s=1.1):
+    """Cumulative Zipf weights for ranks 1..n (rank 1 is the most popular)"""
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))).capitalize()
+
+
+def _paragraphs(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed(db, users=1000, posts=10000, comments=100000, chunk_size=10000, rng_seed=42, log=print):
+    """Insert a synthetic dataset; must be called inside an app context
+
+    Returns the dataset summary recorded in benchmark reports.
+    """
+    from app.models import User, Post, Comment, Category
+    from app.tags import backfill as backfill_tags
+
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    categories = {c.slug: c.id for c in Category.query.all()}
+    category_ids = [categories[slug] for slug in CATEGORY_WEIGHTS if slug in categories] or [None]
+    category_cum = list(itertools.accumulate(CATEGORY_WEIGHTS.get(slug, 1) for slug in CATEGORY_WEIGHTS
+                                             if slug in categories)) or [1]
+
+    first_user = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    for start, count in _chunks(users, chunk_size):
+        rows = []
+        for i in range(first_user + start, first_user + start + count):
+            rows.append({
+                'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password_hash': password_hash,
+                'first_name': rng.choice(WORDS).capitalize(), 'last_name': rng.choice(WORDS).capitalize(),
+                'is_active': True, 'is_verified': True, 'is_admin': False,
+                'email_notifications': rng.random() < 0.7,
+                'created_at': now - timedelta(days=rng.randint(0, 1000)),
+                'last_active': now - timedelta(days=rng.randint(0, 30)),
+            })
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+        log(f'   users: {start + count}/{users}')
+    user_ids = list(range(first_user, first_user + users))
+    # Prolific authors: post ownership follows a Zipf curve over users
+    author_cum = zipf_weights(len(user_ids), s=0.9)
+
+    first_post = (db.session.query(func.max(Post.id)).scalar() or 0) + 1
+    for start, count in _chunks(posts, chunk_size):
+        rows = []
+        for post_id in range(first_post + start, first_post + start + count):
+            title = _title(rng)
+            words = int(rng.lognormvariate(6.2, 0.6))
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 900))
+            # Popularity rank decays with post id so early posts are not all "hot"
+            popularity = 1.0 / ((post_id - first_post) % 997 + 1)
+            published = rng.random() < 0.92
+            rows.append({
+                'title': title, 'slug': f"{title.lower().replace(' ', '-')}-{post_id}",
+                'content': _paragraphs(rng, words), 'excerpt': None,
+                'reading_time': max(1, round(words / 200)), 'word_count': words,
+                'is_published': published, 'is_featured': published and rng.random() < 0.002,
+                'allow_comments': rng.random() < 0.95,
+                'meta_description': None, 'meta_keywords': ', '.join(rng.sample(WORDS, 3)),
+                'view_count': int(rng.paretovariate(1.2) * 50 * (1 + 100 * popularity)),
+                'like_count': int(rng.paretovariate(1.5) * 3 * (1 + 20 * popularity)),
+                'created_at': created, 'updated_at': created, 'published_at': created if published else None,
+                'user_id': rng.choices(user_ids, cum_weights=author_cum)[0],
+                'category_id': rng.choices(category_ids, cum_weights=category_cum)[0],
+            })
+        db.session.execute(insert(Post), rows)
+        db.session.commit()
+        log(f'   posts: {start + count}/{posts}')
+    linked = backfill_tags(chunk_size, after_id=first_post - 1)
+    log(f'   post tags: {linked}')
+
+    # Comments concentrate on popular posts: Zipf over a shuffled post order
+    post_ids = list(range(first_post, first_post + posts))
+    rng.shuffle(post_ids)
+    post_cum = zipf_weights(len(post_ids), s=1.05)
+    first_comment = (db.session.query(func.max(Comment.id)).scalar() or 0) + 1
+    for start, count in _chunks(comments, chunk_size):
+        targets = rng.choices(post_ids, cum_weights=post_cum, k=count)
+        commenters = rng.choices(user_ids, k=count)
+        rows = []
+        for offset, (post_id, user_id) in enumerate(zip(targets, commenters)):
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 900))
+            parent_id = None
+            # About one in ten comments replies to an earlier comment from the same chunk
+            if offset and rng.random() < 0.1:
+                parent_offset = rng.randrange(offset)
+                parent_id = first_comment + start + parent_offset
+                post_id = rows[parent_offset]['post_id']
+            rows.append({
+                'content': _paragraphs(rng, rng.randint(5, 60)), 'is_approved': rng.random() < 0.97,
+                'created_at': created, 'updated_at': created, 'user_id': user_id, 'post_id': post_id,
+                'parent_id': parent_id,
+            })
+        db.session.execute(insert(Comment), rows)
+        db.session.commit()
+        log(f'   comments: {start + count}/{comments}')
+
+    return {
+        'users': users, 'posts': posts, 'comments': comments, 'rng_seed': rng_seed,
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+
+
+def dataset_summary(db):
+    """Row counts of the current database, recorded alongside results"""
+    from app.models import User, Post, Comment, Category
+
+    return {
+        'users': db.session.query(func.count(User.id)).scalar(),
+        'posts': db.session.query(func.count(Post.id)).scalar(),
+        'comments': db.session.query(func.count(Comment.id)).scalar(),
+        'categories': db.session.query(func.count(Category.id)).scalar(),
+    }
@@ -164,10 +164,12 @@ class EnhancedSearch {
 
     async performSearch(query) {
         try {
-            this.showLoading();
-            const response = await fetch(`/api/search?q=${encodeURIComponent(query)}`);
+            const response = await fetch(`/api/suggest?q=${encodeURIComponent(query)}`);
             const data = await response.json();
-            this.displayResults(data.posts);
+            // Ignore responses for text the user has already typed past
+            if (this.searchInput.value.trim() === query) {
+                this.displayResults(data);
+            }
         } catch (error) {
             this.showError('Search failed. Please try again.');
         }
@@ -185,27 +187,33 @@ class EnhancedSearch {
         `;
     }
 
-    displayResults(posts) {
-        if (posts.length === 0) {
+    displayResults(data) {
+        const groups = [['posts', 'Post'], ['categories', 'Category'], ['authors', 'Author'], ['tags', 'Tag']];
+        const items = groups.flatMap(([key, kind]) => (data[key] || []).filter(item => item.url)
+            .map(item => ({ ...item, kind })));
+
+        this.searchResults.classList.remove('d-none');
+        if (items.length === 0) {
             this.searchResults.innerHTML = '<div class="text-center p-3 text-muted">No results found</div>';
             return;
         }
 
-        const html = posts.map(post => `
-            <div class="search-result-item p-3 border-bottom" data-post-id="${post.id}">
-                <div class="fw-bold">${this.highlightMatch(post.title)}</div>
-                <div class="text-muted small">${this.truncate(post.content, 100)}</div>
-                <div class="small text-secondary mt-1">
-                    By ${post.author.full_name} • ${this.formatDate(post.created_at)}
-                </div>
-            </div>
+        this.searchResults.innerHTML = items.map(item => `
+            <a class="search-result-item d-block p-3 border-bottom text-decoration-none" href="${this.escape(item.url)}">
+                <div class="fw-bold">${this.highlightMatch(this.escape(item.label))}</div>
+                <div class="small text-secondary mt-1">${item.kind}${item.name ? ' • ' + this.escape(item.name) : ''}</div>
+            </a>
         `).join('');
+    }
 
-        this.searchResults.innerHTML = html;
+    escape(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
     }
 
     highlightMatch(text) {
-        const query = this.searchInput.value;
+        const query = this.searchInput.value.trim().replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
         const regex = new RegExp(`(${query})`, 'gi');
         return text.replace(regex, '<mark>$1</mark>');
     }
@@ -243,13 +251,18 @@ class PerformanceMonitor {
 
     measurePageLoad() {
         window.addEventListener('load', () => {
-            const navigation = performance.getEntriesByType('navigation')[0];
-            this.metrics.pageLoad = {
-                domContentLoaded: navigation.domContentLoadedEventEnd - navigation.domContentLoadedEventStart,
-                loadComplete: navigation.loadEventEnd - navigation.loadEventStart,
-                totalTime: navigation.loadEventEnd - navigation.fetchStart
-            };
-            this.sendMetrics();
+            // loadEventEnd is only populated once the load handlers have returned
+            setTimeout(() => {
+                const navigation = performance.getEntriesByType('navigation')[0];
+                this.metrics.page = window.location.pathname;
+                this.metrics.ttfb = navigation.responseStart - navigation.requestStart;
+                this.metrics.pageLoad = {
+                    domContentLoaded: navigation.domContentLoadedEventEnd - navigation.domContentLoadedEventStart,
+                    loadComplete: navigation.loadEventEnd - navigation.loadEventStart,
+                    totalTime: navigation.loadEventEnd - navigation.fetchStart
+                };
+                this.sendMetrics();
+            }, 0);
         });
     }
 
@@ -312,6 +325,7 @@ class PerformanceMonitor {
     logError(error) {
         fetch('/api/errors', {
             method: 'POST',
+            keepalive: true,
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -324,6 +338,7 @@ class PerformanceMonitor {
     sendMetrics() {
         fetch('/api/analytics/performance', {
             method: 'POST',
+            keepalive: true,
             headers: {
                 'Content-Type': 'application/json',
             },
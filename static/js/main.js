@@ -25,63 +25,64 @@ $(document).ready(function() {
             return;
         }
         
-        // Debounce search to avoid too many requests
+        // Debounce lightly: suggestions are answered from memory on the server
         searchTimeout = setTimeout(function() {
             performSearch(query);
-        }, 300);
+        }, 100);
     });
     
     function performSearch(query) {
         const $results = $('#searchResults');
-        const $input = $('#searchInput');
-        
-        // Show loading state
-        $results.removeClass('d-none').html('<div class="text-center p-3"><div class="spinner"></div> Searching...</div>');
         
         $.ajax({
-            url: '/api/search',
+            url: '/api/suggest',
             method: 'GET',
             data: { q: query },
             success: function(data) {
-                displaySearchResults(data.posts);
+                // Ignore responses for text the user has already typed past
+                if ($('#searchInput').val().trim() === query) {
+                    displaySearchResults(data);
+                }
             },
             error: function() {
-                $results.html('<div class="text-center p-3 text-danger">Error occurred while searching</div>');
+                $results.removeClass('d-none').html('<div class="text-center p-3 text-danger">Error occurred while searching</div>');
             }
         });
     }
     
-    function displaySearchResults(posts) {
+    function escapeHtml(text) {
+        return $('<div>').text(text).html();
+    }
+    
+    function displaySearchResults(data) {
         const $results = $('#searchResults');
-        
-        if (posts.length === 0) {
-            $results.html('<div class="text-center p-3 text-muted">No posts found</div>');
-            return;
-        }
+        const groups = [
+            ['posts', 'bi-file-text', 'Post'],
+            ['categories', 'bi-folder', 'Category'],
+            ['authors', 'bi-person', 'Author'],
+            ['tags', 'bi-tag', 'Tag']
+        ];
         
         let html = '';
-        posts.forEach(function(post) {
-            const excerpt = post.content.length > 100 ? 
-                post.content.substring(0, 100) + '...' : post.content;
-            
-            html += `
-                <div class="search-result-item" data-post-id="${post.id}">
-                    <div class="search-result-title">${post.title}</div>
-                    <div class="search-result-content">${excerpt}</div>
-                    <div class="search-result-meta">
-                        By ${post.author.full_name} • ${formatDate(post.created_at)}
+        groups.forEach(function([key, icon, label]) {
+            (data[key] || []).forEach(function(item) {
+                if (!item.url) return;
+                const detail = item.name ? ` <span class="text-muted">${escapeHtml(item.name)}</span>` : '';
+                html += `
+                    <div class="search-result-item" data-url="${escapeHtml(item.url)}">
+                        <div class="search-result-title"><i class="bi ${icon} me-2"></i>${escapeHtml(item.label)}${detail}</div>
+                        <div class="search-result-meta">${label}</div>
                     </div>
-                </div>
-            `;
+                `;
+            });
         });
         
-        $results.html(html);
+        $results.removeClass('d-none').html(html || '<div class="text-center p-3 text-muted">No matches</div>');
     }
     
     // Handle search result clicks
     $(document).on('click', '.search-result-item', function() {
-        const postId = $(this).data('post-id');
-        window.location.href = `/post/${postId}`;
+        window.location.href = $(this).data('url');
     });
     
     // Hide search results when clicking outside
@@ -0,0 +1,143 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User, Post, Comment, Category, Tag, post_tag
+from app.tags import recount as recount_tags
+
+PASSWORD = 'password123'
+# Hashing is deliberately slow, so every fixture user shares one hash
+PASSWORD_HASH = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+
+
+class QueryCounter:
+    """Counts SQL statements and rows fetched by the DB-API cursor"""
+
+    def __init__(self):
+        self.statements = []
+        self.rows = 0
+
+    def reset(self):
+        self.statements = []
+        self.rows = 0
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def report(self):
+        return '\n'.join(f'  {i + 1}. {sql[:200]}' for i, sql in enumerate(self.statements))
+
+
+class CountingCursor(sqlite3.Cursor):
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.connection.counter.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = super().fetchmany(*args)
+        self.connection.counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.connection.counter.rows += len(rows)
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    counter = None
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+@pytest.fixture
+def queries():
+    return QueryCounter()
+
+
+@pytest.fixture
+def app(queries, tmp_path):
+    def connect():
+        conn = sqlite3.connect(':memory:', factory=CountingConnection, check_same_thread=False)
+        conn.counter = queries
+        return conn
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'creator': connect},
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'JOBS_WORKERS': 0,
+        'TRENDING_CHECKPOINT_INTERVAL': 0,
+        'ENGAGEMENT_FLUSH_INTERVAL': 0,
+        'UNIQUES_CHECKPOINT_INTERVAL': 0,
+        'TEMPLATE_CACHE_DIR': str(tmp_path / 'jinja_cache'),
+    })
+    with app.app_context():
+        event.listen(db.engine, 'after_cursor_execute',
+                     lambda conn, cursor, statement, *args: queries.statements.append(statement))
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def dataset(app):
+    """Small but realistic dataset: 5 authors, 60 posts, 10 comments each"""
+    now = datetime.utcnow()
+    categories = [c.id for c in Category.query.order_by(Category.id)]
+    db.session.execute(insert(User), [{
+        'username': f'author{i}', 'email': f'author{i}@example.com', 'password_hash': PASSWORD_HASH,
+        'first_name': 'Author', 'last_name': f'Number{i}', 'is_active': True, 'created_at': now,
+    } for i in range(5)])
+    users = [u.id for u in User.query.filter(User.username.like('author%')).order_by(User.id)]
+
+    db.session.execute(insert(Post), [{
+        'title': f'Fixture post number {i}', 'slug': f'fixture-post-number-{i}',
+        'content': 'lorem ipsum dolor sit amet ' * 40, 'word_count': 200, 'reading_time': 1,
+        'is_published': i % 10 != 9, 'is_featured': i < 3, 'allow_comments': True,
+        'meta_keywords': 'python, flask' if i % 2 else 'databases, sql',
+        'view_count': 1000 - i, 'like_count': i,
+        'created_at': now - timedelta(hours=i), 'updated_at': now - timedelta(hours=i),
+        'published_at': now - timedelta(hours=i),
+        'user_id': users[i % len(users)], 'category_id': categories[i % len(categories)],
+    } for i in range(60)])
+    posts = [p.id for p in Post.query.order_by(Post.id)]
+
+    db.session.execute(insert(Tag), [{'name': name, 'slug': name, 'post_count': 0}
+                                     for name in ('python', 'flask', 'databases', 'sql')])
+    tag_ids = dict(db.session.query(Tag.slug, Tag.id))
+    db.session.execute(insert(post_tag), [{'post_id': post_id, 'tag_id': tag_ids[name]}
+                                          for i, post_id in enumerate(posts)
+                                          for name in (('python', 'flask') if i % 2 else ('databases', 'sql'))])
+    recount_tags()
+
+    db.session.execute(insert(Comment), [{
+        'content': f'Fixture comment {i}', 'is_approved': True, 'created_at': now - timedelta(minutes=i),
+        'updated_at': now - timedelta(minutes=i), 'user_id': users[i % len(users)], 'post_id': post_id,
+    } for post_id in posts for i in range(10)])
+    db.session.commit()
+    db.session.expunge_all()
+    return {'users': users, 'posts': posts, 'categories': categories, 'tags': tag_ids}
+
+
+@pytest.fixture
+def login(client):
+    def login(username='author0', password=PASSWORD):
+        response = client.post('/auth/login', data={'username': username, 'password': password})
+        assert response.status_code == 302
+        return client
+    return login
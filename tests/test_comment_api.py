@@ -0,0 +1,106 @@
+import re
+
+import pytest
+from flask import template_rendered
+from sqlalchemy.exc import OperationalError
+
+from app import db, engagement, trending
+from app.models import Comment, Post
+
+
+def test_create_returns_only_the_new_comment(client, dataset, login, queries):
+    post_id = dataset['posts'][0]
+    login('author0')  # The post's own author, so no notification is written
+    queries.reset()
+    response = client.post(f'/api/posts/{post_id}/comments', json={'content': 'Straight from the API'})
+    assert response.status_code == 201
+    assert queries.count == 2, queries.report()  # The post, then the comment INSERT
+
+    data = response.get_json()
+    assert data['comment']['content'] == 'Straight from the API'
+    assert data['comment']['author']['display_name'] and data['comment']['reply_count'] == 0
+    assert data['html'].startswith(f'<div class="comment border-top pt-3 mt-3" id="comment-{data["comment"]["id"]}">')
+    assert db.session.get(Comment, data['comment']['id']).post_id == post_id
+
+    fragment = client.post(f'/api/posts/{post_id}/comments', data={'content': 'Posted from the page'},
+                           headers={'Accept': 'text/html'})
+    assert fragment.status_code == 201 and fragment.mimetype == 'text/html'
+    assert '<html' not in fragment.get_data(as_text=True)
+    assert 'Posted from the page' in fragment.get_data(as_text=True)
+
+
+def test_create_enforces_comment_rules(client, dataset, login):
+    post = db.session.get(Post, dataset['posts'][1])
+    url = f'/api/posts/{post.id}/comments'
+    assert client.post(url, json={'content': 'Not logged in'}).status_code == 302
+
+    login('author0')
+    invalid = client.post(url, json={'content': 'hi'})
+    assert invalid.status_code == 400 and 'content' in invalid.get_json()['errors']
+    assert client.post(f'/api/posts/{dataset["posts"][9]}/comments', json={'content': 'On a draft'}).status_code == 404
+
+    post.allow_comments = False
+    db.session.commit()
+    assert client.post(url, json={'content': 'Comments are off'}).status_code == 403
+    assert Comment.query.filter_by(post_id=post.id).count() == 10
+
+
+def test_create_requires_the_csrf_token(app, client, dataset, login):
+    login('author0')
+    app.config['WTF_CSRF_ENABLED'] = True
+    url = f'/api/posts/{dataset["posts"][0]}/comments'
+    assert client.post(url, json={'content': 'No token attached'}).status_code == 400
+
+    page = client.get(f'/post/{dataset["posts"][0]}').get_data(as_text=True)
+    token = re.search(r'<meta name="csrf-token" content="([^"]+)"', page).group(1)
+    response = client.post(url, json={'content': 'With the page token'}, headers={'X-CSRFToken': token})
+    assert response.status_code == 201
+
+
+def test_listing_pages_newest_first(client, dataset, queries):
+    url = f'/api/posts/{dataset["posts"][0]}/comments'
+    queries.reset()
+    first = client.get(f'{url}?limit=4').get_json()
+    assert queries.count == 3, queries.report()  # Post, comments with authors, reply counts
+    ids = [c['id'] for c in first['comments']]
+    assert len(ids) == 4 and ids == sorted(ids, reverse=True)
+
+    rest = client.get(f'{url}?limit=10&before={first["next_before"]}').get_json()
+    assert len(rest['comments']) == 6 and rest['next_before'] is None
+    assert rest['comments'][0]['id'] < ids[-1]
+
+
+def test_page_comment_form_has_the_api_limit(app, client, dataset, login):
+    app.config['RATELIMIT_ENABLED'] = True
+    post_id = dataset['posts'][0]
+    login('author1')
+    statuses = [client.post(f'/post/{post_id}/comment', data={'content': f'Comment {i}'}).status_code
+                for i in range(11)]
+    assert statuses == [302] * 10 + [429]
+    assert Comment.query.filter(Comment.content.like('Comment %')).count() == 10
+
+
+def test_counters_only_see_committed_comments(app, client, dataset, login, monkeypatch):
+    app.config['TRENDING_REFRESH'] = 0
+    post_id = dataset['posts'][0]
+    login('author1')
+
+    def fail():
+        raise OperationalError('COMMIT', {}, Exception('database is locked'))
+    with monkeypatch.context() as patched:
+        patched.setattr(db.session, 'commit', fail)
+        with pytest.raises(OperationalError):
+            client.post(f'/api/posts/{post_id}/comments', json={'content': 'Never saved'})
+    assert trending.top() == [] and not engagement.events.rows
+
+    assert client.post(f'/api/posts/{post_id}/comments', json={'content': 'Saved'}).status_code == 201
+    assert [p.id for p in trending.top()] == [post_id] and len(engagement.events.rows) == 1
+
+
+def test_page_form_does_not_render_the_fragment(app, client, dataset, login):
+    rendered = []
+    record = lambda sender, template, context, **extra: rendered.append(template.name)
+    login('author1')
+    with template_rendered.connected_to(record, app):
+        response = client.post(f'/post/{dataset["posts"][0]}/comment', data={'content': 'From the form'})
+    assert response.status_code == 302 and 'fragments/comment.html' not in rendered
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db, engagement, job_queue
+from app.engagement import KINDS
+from app.models import AuthorEngagementDaily, EngagementEvent, Job, Post, PostEngagementDaily
+
+
+def today():
+    return datetime.utcnow().date()
+
+
+def log_events(post, kinds, day):
+    db.session.execute(insert(EngagementEvent), [{'day': day, 'post_id': post.id, 'kind': KINDS[kind],
+                                                  'created_at': datetime.utcnow()} for kind in kinds])
+    db.session.commit()
+
+
+def test_routes_log_events_and_flush_schedules_a_rollup(client, dataset, login):
+    post = db.session.get(Post, dataset['posts'][0])
+    client.get(f'/post/{post.slug}')
+    client.get(f'/post/{post.slug}')
+    login('author1')
+    client.post(f'/api/like_post/{post.id}')
+    client.post(f'/post/{post.id}/comment', data={'content': 'Daily comment'})
+
+    assert engagement.flush() == 4
+    assert Job.query.filter_by(name='engagement.rollup', key='engagement', status='queued').count() == 1
+    job_queue.tasks['engagement.rollup']()
+    row = PostEngagementDaily.query.filter_by(post_id=post.id, day=today()).one()
+    assert (row.views, row.likes, row.comments, row.author_id) == (2, 1, 1, post.user_id)
+
+
+def test_rollup_is_idempotent_and_sums_authors(app, dataset):
+    first, second, third = (db.session.get(Post, i) for i in dataset['posts'][:3])
+    log_events(first, ['view'] * 3 + ['like'], today())
+    log_events(second, ['view', 'comment'], today())
+    log_events(third, ['view'], today())
+    assert engagement.rollup(today()) == 3
+    assert engagement.rollup(today()) == 3
+
+    author = AuthorEngagementDaily.query.filter_by(author_id=first.user_id, day=today()).one()
+    assert (author.views, author.likes, author.comments) == (3, 1, 0)
+
+    # Events for a deleted post are dropped on the next rollup
+    db.session.delete(second)
+    db.session.commit()
+    assert engagement.rollup(today()) == 2
+
+
+def test_prune_keeps_aggregates_of_expired_days(app, dataset):
+    post = db.session.get(Post, dataset['posts'][0])
+    old = today() - timedelta(days=app.config['ENGAGEMENT_RETENTION_DAYS'])
+    log_events(post, ['view', 'view'], old)
+    assert engagement.rollup(old) == 1
+
+    app.config['ENGAGEMENT_RETENTION_DAYS'] -= 1
+    assert engagement.prune() == 2
+    assert engagement.rollup(old) is None
+    assert PostEngagementDaily.query.filter_by(post_id=post.id, day=old).one().views == 2
+
+
+def test_api_reads_only_the_daily_tables(client, dataset, login, queries):
+    post = db.session.get(Post, dataset['posts'][0])
+    log_events(post, ['view', 'like'], today() - timedelta(days=1))
+    log_events(post, ['view'], today())
+    engagement.rollup_recent()
+    login('author0')
+
+    queries.reset()
+    data = client.get('/api/engagement?days=7').get_json()
+    assert queries.count <= 3 and queries.rows <= 7 + 10 + 1, queries.report()
+    assert len(data['days']) == 7 and data['days'][-1] == today().isoformat()
+    assert data['views'][-2:] == [1, 1] and data['likes'][-2:] == [1, 0]
+    assert data['posts'][0] == {'id': post.id, 'title': post.title, 'slug': post.slug,
+                                'views': 2, 'likes': 1, 'comments': 0}
+
+    assert client.get(f'/api/engagement?post={post.id}&days=2').get_json()['views'] == [1, 1]
+    assert client.get(f'/api/engagement?post={dataset["posts"][1]}').status_code == 404
@@ -0,0 +1,72 @@
+import json
+import xml.etree.ElementTree as ET
+
+from app import broker, cache, db
+from app.models import Category, Post
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+def test_rss_feed_lists_newest_published_posts(client, dataset):
+    response = client.get('/feed.xml')
+    assert response.mimetype == 'application/rss+xml'
+    items = ET.fromstring(response.data).findall('./channel/item')
+    assert len(items) == 20
+    assert items[0].findtext('title') == 'Fixture post number 0'
+    assert 'Fixture post number 9' not in [i.findtext('title') for i in items]  # Unpublished
+
+
+def test_repeat_requests_are_served_from_cache(client, dataset, queries):
+    first = client.get('/feed.json')
+    queries.reset()
+    second = client.get('/feed.json')
+    assert queries.count == 0, queries.report()
+    assert second.data == first.data
+
+    not_modified = client.get('/feed.json', headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+
+
+def test_category_and_author_feeds_are_scoped(client, dataset):
+    category = db.session.get(Category, dataset['categories'][0])
+    atom = ET.fromstring(client.get(f'/category/{category.slug}/feed.atom').data)
+    titles = [e.findtext(f'{ATOM}title') for e in atom.findall(f'{ATOM}entry')]
+    expected = [p.title for p in Post.query.filter_by(category_id=category.id, is_published=True)
+                .order_by(Post.created_at.desc())]
+    assert titles == expected[:20]
+
+    items = json.loads(client.get('/profile/author1/feed.json').data)['items']
+    assert items and all(item['authors'][0]['name'] == 'Author Number1' for item in items)
+    assert client.get('/category/no-such-category/feed.xml').status_code == 404
+
+
+def test_publishing_invalidates_only_affected_scopes(client, dataset, login, queries):
+    categories = Category.query.order_by(Category.id).all()
+    client.get('/feed.xml')
+    client.get(f'/category/{categories[0].slug}/feed.xml')
+    client.get(f'/category/{categories[1].slug}/feed.xml')
+
+    login('author0')
+    client.post('/create_post', data={'title': 'Brand new feed entry', 'content': 'fresh content ' * 20,
+                                      'category_id': str(categories[0].id), 'is_published': 'y'})
+
+    site = ET.fromstring(client.get('/feed.xml').data)
+    assert site.findtext('./channel/item/title') == 'Brand new feed entry'
+    category = ET.fromstring(client.get(f'/category/{categories[0].slug}/feed.xml').data)
+    assert category.findtext('./channel/item/title') == 'Brand new feed entry'
+
+    queries.reset()
+    client.get(f'/category/{categories[1].slug}/feed.xml')
+    assert len([s for s in queries.statements if 'FROM post' in s]) == 0
+
+
+def test_invalidation_from_another_worker_drops_entry(app):
+    cache.set('key', 'value', scopes=('feed:site',))
+    broker.publish('cache', 'invalidate', {'scopes': ['feed:site'], 'origin': 'other-host:1'})
+    assert cache.get('key') is None
+
+
+def test_entries_expire_after_ttl(app):
+    cache.set('key', 'value', scopes=('feed:site',), ttl=0)
+    assert cache.get('key') is None
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, job_queue
+from app.models import Job, Post
+
+
+@pytest.fixture
+def flaky_task():
+    calls = []
+
+    @job_queue.task('test.flaky')
+    def flaky(fail=True):
+        calls.append(fail)
+        if fail:
+            raise RuntimeError('boom')
+
+    yield calls
+    del job_queue.tasks['test.flaky']
+
+
+def post_form(title, words=400):
+    return {'title': title, 'content': 'word ' * words, 'category_id': '0',
+            'is_published': 'y', 'allow_comments': 'y'}
+
+
+def test_saving_a_post_sets_reading_time_inline(client, dataset, login):
+    login('author0')
+    client.post('/create_post', data=post_form('Inline reading time post'))
+    post = Post.query.filter_by(slug='inline-reading-time-post').one()
+    assert (post.word_count, post.reading_time) == (400, 2)
+
+    client.post(f'/edit_post/{post.id}', data=post_form('Inline reading time post', 1000))
+    db.session.expire_all()
+    assert db.session.get(Post, post.id).reading_time == 5
+    assert Job.query.count() == 0
+
+
+def test_keyed_jobs_share_one_queued_row(app, flaky_task):
+    for fail, delay in ((True, 60), (True, 0), (False, 30)):
+        job_queue.enqueue('test.flaky', {'fail': fail}, key='post:1', delay=delay)
+        db.session.commit()
+    job = Job.query.filter_by(key='post:1').one()
+    assert job.payload == '{"fail": false}' and job.run_at <= datetime.utcnow()  # Latest payload, earliest run_at
+
+    job_queue.run_pending()
+    job_queue.enqueue('test.flaky', {'fail': False}, key='post:1')
+    db.session.commit()
+    assert [status for (status,) in db.session.query(Job.status).order_by(Job.id)] == ['done', 'queued']
+
+
+def test_concurrently_queued_keyed_job_is_coalesced(app, flaky_task, monkeypatch):
+    # Another request queues the job between this one's lookup and its insert
+    db.session.add(Job(name='test.flaky', key='post:1', payload='{}', status='queued', run_at=datetime.utcnow()))
+    db.session.commit()
+    lookups = iter([None])
+    real_lookup = job_queue._queued
+    monkeypatch.setattr(job_queue, '_queued', lambda name, key: next(lookups, None) or real_lookup(name, key))
+
+    job = job_queue.enqueue('test.flaky', {'fail': False}, key='post:1')
+    db.session.commit()
+    assert Job.query.filter_by(key='post:1').count() == 1
+    assert db.session.get(Job, job.id).payload == '{"fail": false}'
+
+
+def test_failed_job_retries_with_backoff_then_fails(app, flaky_task):
+    app.config['JOBS_MAX_ATTEMPTS'] = 2
+    job = job_queue.enqueue('test.flaky')
+    db.session.commit()
+
+    assert job_queue.run_pending() == 1
+    job = db.session.get(Job, job.id)
+    assert job.status == 'queued' and job.attempts == 1
+    assert job.run_at > datetime.utcnow() + timedelta(seconds=4)
+    assert 'RuntimeError: boom' in job.last_error
+    assert job_queue.run_pending() == 0  # Not due yet
+
+    job.run_at = datetime.utcnow()
+    db.session.commit()
+    job_queue.run_pending()
+    assert db.session.get(Job, job.id).status == 'failed'
+    assert len(flaky_task) == 2
+
+
+def test_claim_is_exclusive_and_stale_locks_are_requeued(app, flaky_task):
+    job_queue.enqueue('test.flaky', {'fail': False})
+    db.session.commit()
+
+    job = job_queue.claim('worker-a')
+    assert job.status == 'running' and job.locked_by == 'worker-a'
+    assert job_queue.claim('worker-b') is None
+
+    job.locked_at = datetime.utcnow() - timedelta(seconds=app.config['JOBS_LOCK_TIMEOUT'] + 1)
+    db.session.commit()
+    assert job_queue.requeue_stale() == 1
+    assert job_queue.claim('worker-b').locked_by == 'worker-b'
+
+
+def test_cli_drains_and_retries(app, flaky_task):
+    runner = app.test_cli_runner()
+    app.config['JOBS_MAX_ATTEMPTS'] = 1
+    job_queue.enqueue('test.flaky')
+    db.session.commit()
+
+    assert 'Ran 1 job(s)' in runner.invoke(args=['jobs', 'drain']).output
+    assert 'failed' in runner.invoke(args=['jobs', 'list', '--status', 'failed']).output
+    assert 'Requeued 1 job(s)' in runner.invoke(args=['jobs', 'retry', '--failed']).output
+    assert 'queued               1' in runner.invoke(args=['jobs', 'stats']).output
+
+
+def test_workers_purge_old_done_jobs(app, monkeypatch):
+    monkeypatch.setattr(job_queue, '_last_purge', datetime.min)
+    now = datetime.utcnow()
+    ages = {'done': [10, 9, 8, 1], 'failed': [10]}
+    for status, days in ages.items():
+        for age in days:
+            db.session.add(Job(name='test.old', status=status, finished_at=now - timedelta(days=age)))
+    db.session.commit()
+
+    assert job_queue.run_pending() == 0
+    assert sorted(status for (status,) in db.session.query(Job.status)) == ['done', 'failed']
+
+    db.session.add_all(Job(name='test.old', status='done', finished_at=now - timedelta(days=30)) for _ in range(3))
+    db.session.commit()
+    assert job_queue.purge_done(7, batch_size=2) == 3
+    assert Job.query.count() == 2
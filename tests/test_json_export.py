@@ -0,0 +1,62 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+import pytest
+
+from app import db, exports
+from app.json_provider import JSONProvider
+from app.models import Comment, Post
+
+Point = namedtuple('Point', 'x y')
+
+
+def test_encoders_agree_on_datetimes_and_odd_types(app):
+    pytest.importorskip('orjson')
+    payload = {'at': datetime(2024, 5, 6, 7, 8, 9, 123), 'day': date(2024, 5, 6), 'point': Point(1, 2),
+               'counts': {3: 'three'}, 'text': 'café', 'none': None}
+    encoded = {}
+    for choice in ('orjson', 'stdlib'):
+        app.config['JSON_ENCODER'] = choice
+        provider = JSONProvider(app)
+        encoded[choice] = provider.dumps(payload)
+        assert provider.loads(encoded[choice]) == {
+            'at': '2024-05-06T07:08:09.000123', 'counts': {'3': 'three'}, 'day': '2024-05-06',
+            'none': None, 'point': [1, 2], 'text': 'café'}
+    assert list(json.loads(encoded['orjson'])) == list(json.loads(encoded['stdlib']))  # Keys sorted alike
+
+    app.config['JSON_ENCODER'] = 'simdjson'
+    with pytest.raises(ValueError):
+        JSONProvider(app)
+
+
+def test_api_dates_are_iso_8601(client, dataset):
+    post = client.get('/api/posts?per_page=1').get_json()['posts'][0]
+    created_at = db.session.get(Post, post['id']).created_at
+    assert post['created_at'] == created_at.isoformat()
+    assert post['category']['created_at'].startswith(str(date.today().year))
+
+
+def test_exports_are_admin_only(client, dataset, login):
+    assert client.get('/api/export/posts.ndjson').status_code == 302
+    login('author0')
+    assert client.get('/api/export/posts.ndjson').status_code == 403
+    assert client.get('/api/export/users.ndjson').status_code == 404
+
+
+def test_exports_stream_every_row_as_ndjson(client, dataset, login, monkeypatch):
+    monkeypatch.setattr(exports, 'CHUNK_SIZE', 4096)
+    login('admin', 'admin123')
+    response = client.get('/api/export/posts.ndjson')
+    assert response.is_streamed and response.mimetype == 'application/x-ndjson'
+    chunks = list(response.response)
+    assert len(chunks) > 1 and all(chunk.endswith(b'\n') for chunk in chunks)
+
+    posts = [json.loads(line) for line in b''.join(chunks).splitlines()]
+    assert [p['id'] for p in posts] == sorted(dataset['posts'])  # Drafts included
+    first = db.session.get(Post, posts[0]['id'])
+    assert posts[0]['created_at'] == first.created_at.isoformat() and posts[0]['author'] == first.author.username
+
+    lines = client.get(f'/api/export/comments.ndjson?after={posts[0]["id"]}').get_data().splitlines()
+    assert len(lines) == Comment.query.filter(Comment.id > posts[0]['id']).count()
+    assert set(json.loads(lines[0])) >= {'id', 'post_id', 'user_id', 'content', 'created_at'}
@@ -0,0 +1,48 @@
+from app import db, listings
+from app.models import Comment, Post, User
+
+
+def test_rows_serialize_like_the_models(app, dataset):
+    post_id = dataset['posts'][3]
+    with app.test_request_context():
+        row, = listings.fetch(listings.posts().where(Post.id == post_id))
+        assert not db.session.identity_map  # Plain rows: nothing registered in the session
+        post = db.session.get(Post, post_id)
+        assert Post.to_dict_many([row]) == Post.to_dict_many([post])
+        assert row.to_dict() == post.to_dict()  # Counts looked up when not passed in
+        assert row.generate_excerpt(40) == post.generate_excerpt(40)
+
+
+def test_author_names_match_the_user_model(app, dataset):
+    row, = listings.fetch(listings.posts().where(Post.id == dataset['posts'][0]))
+    user = db.session.get(User, row.user_id)
+    assert (row.author.get_full_name(), row.author.get_display_name(), row.author.get_initials()) == (
+        user.get_full_name(), user.get_display_name(), user.get_initials())
+
+    user.first_name = ''
+    db.session.commit()
+    row, = listings.fetch(listings.posts().where(Post.id == dataset['posts'][0]))
+    assert row.author.get_display_name() == user.username
+    assert row.author.get_initials() == user.username[0].upper()
+
+
+def test_pagination_matches_the_orm(app, dataset):
+    statement = listings.published_posts().order_by(Post.created_at.desc())
+    rows = listings.paginate(statement, 2, 5)
+    orm = Post.query.filter_by(is_published=True).order_by(Post.created_at.desc()).paginate(
+        page=2, per_page=5, error_out=False)
+    assert [p.id for p in rows.items] == [p.id for p in orm.items]
+    assert (rows.total, rows.pages, rows.has_next, rows.prev_num) == (orm.total, orm.pages, orm.has_next, 1)
+    assert listings.paginate(statement, 2, 5, count=False).total is None
+    assert listings.paginate(statement, 99, 5).items == []
+
+
+def test_listing_pages_render_rows(client, dataset):
+    html = client.get('/').get_data(as_text=True)
+    assert 'By Author Number' in html
+    data = client.get('/api/posts?per_page=3').get_json()
+    assert [p['comment_count'] for p in data['posts']] == [10, 10, 10]
+    assert data['posts'][0]['category']['post_count'] > 0
+    db.session.add(Comment(content='One more', user_id=dataset['users'][0], post_id=data['posts'][0]['id']))
+    db.session.commit()
+    assert client.get('/api/posts?per_page=3').get_json()['posts'][0]['comment_count'] == 11
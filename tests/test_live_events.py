@@ -0,0 +1,157 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import broker, db, pubsub
+from app.models import Comment
+from app.pubsub import EventBroker, LocalTransport, RedisTransport
+
+
+def parse_sse(chunk):
+    chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+    fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines() if ': ' in line)
+    return fields.get('event'), json.loads(fields['data']) if 'data' in fields else None
+
+
+def test_broker_delivers_to_channel_subscribers_only():
+    events = EventBroker()
+    events.transport = LocalTransport()
+    events.transport.start(events._dispatch)
+    first, other = events.subscribe('post:1'), events.subscribe('post:2')
+
+    events.publish('post:1', 'likes', {'likes': 3})
+
+    assert first.get(timeout=0) == ('likes', {'likes': 3})
+    assert other.get(timeout=0) is None
+    first.close()
+    assert events.subscriber_count('post:1') == 0
+
+
+def test_slow_subscriber_keeps_newest_messages():
+    events = EventBroker()
+    events.transport = LocalTransport()
+    events.transport.start(events._dispatch)
+    subscription = events.subscribe('post:1', maxsize=2)
+
+    for likes in range(5):
+        events.publish('post:1', 'likes', {'likes': likes})
+
+    assert [subscription.get(timeout=0)[1]['likes'] for _ in range(2)] == [3, 4]
+
+
+def test_throttled_publish_drops_bursts():
+    events = EventBroker()
+    events.transport = LocalTransport()
+    events.transport.start(events._dispatch)
+
+    assert events.publish('post:1', 'views', {'views': 1}, min_interval=60)
+    assert not events.publish('post:1', 'views', {'views': 2}, min_interval=60)
+
+
+def test_event_stream_sends_snapshot_then_new_comments(app, client, dataset, login):
+    app.config['SSE_HEARTBEAT'] = 0.05
+    post_id = dataset['posts'][0]
+    response = client.get(f'/post/{post_id}/events')
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+
+    event, data = parse_sse(next(stream).split(b'\n', 1)[1])
+    assert event == 'snapshot'
+    assert data['comments'] == 10
+
+    broker.publish(f'post:{post_id}', 'likes', {'likes': 99})
+    assert parse_sse(next(stream)) == ('likes', {'likes': 99})
+    response.close()
+    assert broker.subscriber_count(f'post:{post_id}') == 0
+
+
+def test_add_comment_publishes_event(client, dataset, login):
+    post_id = dataset['posts'][0]
+    subscription = broker.subscribe(f'post:{post_id}')
+    try:
+        login('author1')
+        client.post(f'/post/{post_id}/comment', data={'content': 'Live comment text'})
+        event, data = subscription.get(timeout=1)
+        assert event == 'comment'
+        assert data['content'] == 'Live comment text'
+    finally:
+        subscription.close()
+
+
+def test_snapshot_counts_only_approved_comments(app, client, dataset):
+    post_id = dataset['posts'][0]
+    db.session.add(Comment(content='Held for review', is_approved=False, user_id=dataset['users'][1],
+                           post_id=post_id))
+    db.session.commit()
+
+    response = client.get(f'/post/{post_id}/events')
+    assert parse_sse(next(iter(response.response)).split(b'\n', 1)[1])[1]['comments'] == 10
+    response.close()
+
+
+def test_streams_beyond_the_limit_get_a_snapshot_and_a_long_retry(app, client, dataset):
+    app.config['SSE_HEARTBEAT'] = 0.05
+    broker.streams = threading.BoundedSemaphore(1)
+    post_id = dataset['posts'][0]
+    first = client.get(f'/post/{post_id}/events')
+    assert next(iter(first.response)).startswith(b'retry: 5000\n')
+
+    busy = b''.join(client.get(f'/post/{post_id}/events').response)
+    assert busy.startswith(b'retry: 30000\n') and parse_sse(busy.split(b'\n', 1)[1])[0] == 'snapshot'
+
+    first.close()
+    assert broker.streams.acquire(blocking=False)
+
+
+def test_full_streams_are_turned_away_before_any_query(app, client, dataset, queries):
+    broker.streams = threading.BoundedSemaphore(1)
+    assert broker.streams.acquire(blocking=False)
+    queries.reset()
+    busy = b''.join(client.get(f'/post/{dataset["posts"][0]}/events').response)
+    assert busy == b'retry: 30000\n\n'  # Nothing cached yet, so no snapshot either
+    assert not [sql for sql in queries.statements if 'post' in sql.lower()], queries.report()
+    broker.streams.release()
+
+
+def test_snapshot_is_cached_and_missing_posts_free_their_slot(app, client, dataset, queries):
+    broker.streams = threading.BoundedSemaphore(1)
+    post_id = dataset['posts'][0]
+    client.get(f'/post/{post_id}/events').close()
+    queries.reset()
+    response = client.get(f'/post/{post_id}/events')
+    assert parse_sse(next(iter(response.response)).split(b'\n', 1)[1])[1]['comments'] == 10
+    assert not [sql for sql in queries.statements if 'post' in sql.lower()], queries.report()
+    response.close()
+
+    assert client.get(f'/post/{dataset["posts"][9]}/events').status_code == 404  # Draft
+    assert broker.streams.acquire(blocking=False)
+
+
+def test_redis_listener_resubscribes_after_connection_errors(monkeypatch):
+    class FakePubSub:
+        def __init__(self, items):
+            self.items = items
+
+        def psubscribe(self, pattern):
+            pass
+
+        def listen(self):
+            item = self.items.pop(0)
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            raise SystemExit  # Stop the test's listener loop
+
+    items = [ConnectionError('Redis went away'),
+             {'channel': b'pubsub:post:1', 'data': json.dumps(['likes', {'likes': 5}])}]
+    transport = RedisTransport.__new__(RedisTransport)
+    transport._client = SimpleNamespace(pubsub=lambda **kwargs: FakePubSub(items))
+    received = []
+    transport.start(lambda channel, message: received.append((channel, message)))
+    monkeypatch.setattr(pubsub, 'time', SimpleNamespace(sleep=lambda seconds: None))
+
+    with pytest.raises(SystemExit):
+        transport._listen()
+    assert received == [('post:1', ('likes', {'likes': 5}))]
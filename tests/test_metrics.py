@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from app import metrics
+from app.metrics import LATENCY_BUCKETS, STATEMENT_BUCKETS, RequestMetrics, _key, _snapshot, _Shard
+
+
+def status_count(endpoint, status):
+    return metrics.collect()['counters'].get(
+        _key('flask_http_requests_total', endpoint=endpoint, method='GET', status=status), 0)
+
+
+def test_scrape_needs_the_token_or_an_admin(app, client, dataset, login):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/admin/metrics').status_code == 302  # To the login page
+    assert client.get('/admin/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 302
+    response = client.get('/admin/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+
+    login('author0')
+    assert client.get('/admin/metrics').status_code == 403
+    client.get('/auth/logout')
+    login('admin', 'admin123')
+    assert client.get('/admin/metrics').status_code == 200
+
+    app.config['METRICS_ENABLED'] = False
+    assert client.get('/admin/metrics').status_code == 404
+
+
+def test_requests_are_counted_per_status(client, dataset):
+    # The collector is process-wide, so compare before and after
+    ok, missing = status_count('main.index', 200), status_count('unmatched', 404)
+    client.get('/')
+    client.get('/')
+    client.get('/no/such/page')
+    assert status_count('main.index', 200) == ok + 2
+    assert status_count('unmatched', 404) == missing + 1
+
+
+def test_histograms_render_cumulative_buckets(app):
+    collector = RequestMetrics()
+    collector.app = app
+    for value in (1, 3, 300):
+        collector.shard.observe(_key('flask_db_statements_per_request', endpoint='main.index'), value,
+                                STATEMENT_BUCKETS)
+    collector.shard.inc(_key('flask_http_requests_total', endpoint='main.index', method='GET', status=200), 3)
+
+    lines = collector.render().splitlines()
+    assert '# TYPE flask_db_statements_per_request histogram' in lines
+    buckets = [line for line in lines if line.startswith('flask_db_statements_per_request_bucket')]
+    assert len(buckets) == len(STATEMENT_BUCKETS) + 1
+    assert buckets[0] == 'flask_db_statements_per_request_bucket{endpoint="main.index",le="1"} 1'
+    assert buckets[2] == 'flask_db_statements_per_request_bucket{endpoint="main.index",le="5"} 2'
+    assert buckets[-2] == 'flask_db_statements_per_request_bucket{endpoint="main.index",le="250"} 2'
+    assert buckets[-1] == 'flask_db_statements_per_request_bucket{endpoint="main.index",le="+Inf"} 3'
+    assert 'flask_db_statements_per_request_sum{endpoint="main.index"} 304' in lines
+    assert 'flask_db_statements_per_request_count{endpoint="main.index"} 3' in lines
+    assert 'flask_http_requests_total{endpoint="main.index",method="GET",status="200"} 3' in lines
+
+
+def test_worker_files_are_merged(app, tmp_path):
+    app.config['METRICS_MULTIPROC_DIR'] = str(tmp_path)
+    collector = RequestMetrics()
+    collector.app = app
+    requests = _key('flask_http_requests_total', endpoint='main.index', method='GET', status=200)
+    in_progress = _key('flask_http_requests_in_progress', endpoint='main.index')
+    latency = _key('flask_http_request_duration_seconds', endpoint='main.index', method='GET')
+    collector.shard.inc(requests, 2)
+    collector.shard.observe(latency, 0.2, LATENCY_BUCKETS)
+    collector.write_process_file()  # This process's own file is not counted twice
+
+    def worker_file(pid, count, busy):
+        shard = _Shard()
+        shard.inc(requests, count)
+        shard.gauge(in_progress, busy)
+        shard.observe(latency, 0.02, LATENCY_BUCKETS)
+        with open(tmp_path / f'metrics_{pid}.json', 'w') as f:
+            json.dump(_snapshot([shard]), f)
+
+    worker_file(os.getppid(), 3, 1)  # A live worker
+    worker_file(2 ** 30, 5, 4)  # A worker that has exited: its gauges are stale
+
+    data = collector.collect()
+    assert data['counters'][requests] == 10
+    assert data['gauges'][in_progress] == 1
+    assert data['histograms'][latency][-1] == pytest.approx(0.24)
+    assert 'flask_http_request_duration_seconds_count{endpoint="main.index",method="GET"} 3' in \
+        collector.render().splitlines()
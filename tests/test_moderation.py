@@ -0,0 +1,67 @@
+from app import db, moderation
+from app.models import Comment, Notification, Post, User
+
+
+def test_deleting_post_leaves_comments_to_the_database(client, dataset, login, queries):
+    post_id = dataset['posts'][0]  # Written by author0
+    login('author0')
+    queries.reset()
+    client.post(f'/delete_post/{post_id}')
+
+    assert not any('FROM comment' in s for s in queries.statements), queries.report()
+    assert db.session.get(Post, post_id) is None
+    assert Comment.query.filter_by(post_id=post_id).count() == 0
+
+
+def test_bulk_reject_and_approve(client, dataset, login):
+    ids = [c.id for c in Comment.query.filter_by(post_id=dataset['posts'][0])]
+    login('admin', 'admin123')
+    client.post('/admin/comments/moderate', data={'action': 'reject', 'comment_ids': ids[:4]})
+    assert Comment.query.filter_by(is_approved=False).count() == 4
+
+    page = client.get('/admin/comments')
+    assert page.status_code == 200
+    assert page.data.count(b'name="comment_ids"') == 4
+
+    client.post('/admin/comments/moderate', data={'action': 'approve', 'comment_ids': ids[:2]})
+    client.post('/admin/comments/moderate', data={'action': 'delete', 'comment_ids': ids[2:3]})
+    assert [c.id for c in Comment.query.filter_by(is_approved=False)] == ids[3:4]
+    assert db.session.get(Comment, ids[2]) is None
+
+
+def test_queue_pages_by_id(app, dataset):
+    comments, before = moderation.moderation_queue('approved', limit=25)
+    assert [c.id for c in comments] == sorted((c.id for c in comments), reverse=True)
+    older, _ = moderation.moderation_queue('approved', before=before, limit=25)
+    assert older[0].id == comments[-1].id - 1
+
+
+def test_spam_wave_removed_in_a_few_statements(app, dataset, queries):
+    users = dataset['users']
+    spam_comment = Comment.query.filter_by(user_id=users[1]).first()
+    reply = Comment(content='Replying to spam', post_id=spam_comment.post_id, user_id=users[2],
+                    parent_id=spam_comment.id)
+    db.session.add(reply)
+    db.session.add(Notification(kind='reply', recipient_id=users[2], actor_id=users[1],
+                                post_id=spam_comment.post_id))
+    db.session.commit()
+    admin = User.query.filter_by(username='admin').one()
+
+    queries.reset()
+    assert moderation.purge_users([users[1], admin.id]) == 1
+    assert queries.count <= 6, queries.report()
+
+    db.session.expire_all()
+    assert db.session.get(User, users[1]) is None
+    assert db.session.get(User, admin.id) is not None
+    assert Post.query.filter_by(user_id=users[1]).count() == 0
+    assert Comment.query.filter_by(user_id=users[1]).count() == 0
+    assert Notification.query.filter_by(actor_id=users[1]).count() == 0
+    assert db.session.get(Comment, reply.id).parent_id is None
+
+
+def test_moderation_requires_admin(client, dataset, login):
+    login('author0')
+    assert client.get('/admin/comments').status_code == 403
+    assert client.post('/admin/users/purge', data={'user_ids': dataset['users'][1]}).status_code == 403
+    assert db.session.get(User, dataset['users'][1]) is not None
@@ -0,0 +1,141 @@
+import email
+import socketserver
+import threading
+from email.policy import default as default_policy
+
+import pytest
+
+from app import db, job_queue, notifier
+from app.models import Comment, Job, Notification, Post, User
+from app.notifications import SMTPTransport
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of SMTP for smtplib to deliver to"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost test server')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for chunk in self.rfile:
+                    if chunk == b'.\r\n':
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                self.server.messages.append(email.message_from_bytes(b''.join(data), policy=default_policy))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(app):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages, server.connections = [], 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config['NOTIFICATIONS_DIGEST_DELAY'] = 0
+    previous, notifier.transport = notifier.transport, SMTPTransport(f'smtp://127.0.0.1:{server.server_address[1]}')
+    yield server
+    notifier.transport = previous
+    server.shutdown()
+    server.server_close()
+
+
+def comment_on(post_id, user_id, parent_id=None):
+    post = db.session.get(Post, post_id)
+    comment = Comment(content='Nice post', post_id=post_id, user_id=user_id, parent_id=parent_id)
+    db.session.add(comment)
+    db.session.flush()
+    notifier.comment_added(comment, post)
+    db.session.commit()
+    return comment
+
+
+def test_comment_notifies_post_author_but_not_self(client, dataset, login):
+    post_id = dataset['posts'][0]  # Written by author0
+    login('author1')
+    client.post(f'/post/{post_id}/comment', data={'content': 'First outside comment'})
+    client.get('/auth/logout')
+    login('author0')
+    client.post(f'/post/{post_id}/comment', data={'content': 'Author answering here'})
+
+    notifications = Notification.query.all()
+    assert [(n.kind, n.recipient_id) for n in notifications] == [('comment', dataset['users'][0])]
+    assert Job.query.filter_by(name='notifications.send_digests', status='queued').count() == 1
+
+
+def test_reply_notifies_parent_author(app, dataset):
+    users = dataset['users']
+    parent = comment_on(dataset['posts'][0], users[2])
+    comment_on(dataset['posts'][0], users[3], parent_id=parent.id)
+
+    kinds = {(n.recipient_id, n.kind) for n in Notification.query.filter_by(actor_id=users[3])}
+    assert kinds == {(users[0], 'comment'), (users[2], 'reply')}
+
+
+def test_opted_out_users_get_no_events(app, dataset):
+    db.session.get(User, dataset['users'][0]).email_notifications = False
+    db.session.commit()
+    comment_on(dataset['posts'][0], dataset['users'][1])
+    assert Notification.query.count() == 0
+    assert Job.query.count() == 0
+
+
+def test_viral_post_produces_one_digest(app, dataset, smtp_server):
+    users = dataset['users']
+    for i in range(200):
+        comment_on(dataset['posts'][0], users[1 + i % 4])
+    assert Job.query.filter_by(name='notifications.send_digests').count() == 1
+
+    job_queue.run_pending()
+    assert len(smtp_server.messages) == 1
+    message = smtp_server.messages[0]
+    assert message['To'] == 'author0@example.com'
+    assert message['Subject'] == '200 new comments on "Fixture post number 0"'
+    assert 'Author Number1, Author Number2, Author Number3 and 1 other' in message.get_content()
+    assert Notification.query.filter(Notification.sent_at.is_(None)).count() == 0
+
+
+def test_digests_reuse_a_bounded_number_of_connections(app, dataset, smtp_server):
+    app.config['MAIL_CONCURRENCY'] = 2
+    users = dataset['users']
+    for author in range(5):
+        comment_on(dataset['posts'][author], users[(author + 1) % 5])  # Post i is written by author i % 5
+
+    assert notifier.send_digests() == 5
+    assert len(smtp_server.messages) == 5
+    assert smtp_server.connections == 2
+
+
+def test_recipient_who_opts_out_before_delivery_is_skipped(app, dataset, smtp_server):
+    comment_on(dataset['posts'][0], dataset['users'][1])
+    db.session.get(User, dataset['users'][0]).email_notifications = False
+    db.session.commit()
+
+    assert notifier.send_digests() == 0
+    assert smtp_server.messages == []
+    assert Notification.query.filter(Notification.sent_at.is_(None)).count() == 0
+
+
+def test_unreachable_server_keeps_notifications_for_retry(app, dataset):
+    app.config['NOTIFICATIONS_DIGEST_DELAY'] = 0
+    previous, notifier.transport = notifier.transport, SMTPTransport('smtp://127.0.0.1:9')
+    try:
+        comment_on(dataset['posts'][0], dataset['users'][1])
+        job_queue.run_pending()
+    finally:
+        notifier.transport = previous
+
+    job = Job.query.filter_by(name='notifications.send_digests').one()
+    assert job.status == 'queued' and job.attempts == 1
+    assert Notification.query.filter(Notification.sent_at.is_(None)).count() == 1
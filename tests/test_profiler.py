@@ -0,0 +1,87 @@
+import logging
+
+import pytest
+from flask import Response, stream_with_context
+
+from app import create_app, db
+from app.models import User
+from app.profiler import normalize_sql
+
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SQL_PROFILER_ENABLED': True,
+                      'SQL_PROFILER_THRESHOLD': 3, 'SQL_PROFILER_BUDGET': 4, 'JOBS_WORKERS': 0,
+                      'TRENDING_CHECKPOINT_INTERVAL': 0, 'ENGAGEMENT_FLUSH_INTERVAL': 0,
+                      'UNIQUES_CHECKPOINT_INTERVAL': 0, 'TEMPLATE_CACHE_DIR': str(tmp_path / 'jinja_cache')})
+
+    def lookups(n):
+        for i in range(n):
+            db.session.get(User, i + 1)
+            db.session.expunge_all()
+
+    @app.route('/_lookups/<int:n>')
+    def run_lookups(n):
+        lookups(n)
+        return 'ok'
+
+    @app.route('/_streamed/<int:n>')
+    def streamed(n):
+        def body():
+            yield 'start\n'
+            lookups(n)
+            yield 'done\n'
+        return Response(stream_with_context(body()))
+
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def test_literals_and_in_lists_collapse_to_one_shape():
+    assert normalize_sql("SELECT * FROM post WHERE id = 7 AND slug = 'it''s'") == \
+        normalize_sql("SELECT * FROM post WHERE id = 12 AND slug = 'other'") == \
+        'SELECT * FROM post WHERE id = ? AND slug = ?'
+    assert normalize_sql('SELECT * FROM post WHERE id IN (?, ?, ?)') == \
+        normalize_sql('SELECT *  FROM post\n WHERE id IN (1,2)') == 'SELECT * FROM post WHERE id IN (?)'
+
+
+def test_totals_are_sent_as_headers(profiled_app):
+    response = profiled_app.test_client().get('/_lookups/2')
+    assert response.headers['X-SQL-Queries'] == '2'
+    assert response.headers['X-SQL-Time'].endswith('ms')
+    assert 'X-SQL-Repeated' not in response.headers
+
+
+def test_repeated_shapes_over_the_threshold_are_warned_about(profiled_app, caplog):
+    client = profiled_app.test_client()
+    with caplog.at_level(logging.INFO, logger='app.profiler'):
+        with client.get('/_lookups/2') as response:  # The log line is written when the response is closed
+            assert 'X-SQL-Repeated' not in response.headers
+        assert not [r for r in caplog.records if r.levelno >= logging.WARNING]
+
+        response = client.get('/_lookups/3')
+        response.close()
+    assert response.headers['X-SQL-Repeated'] == '1'
+    warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1 and 'Possible N+1 on /_lookups/3: 3x' in warnings[0]
+
+
+def test_requests_over_budget_are_logged_as_warnings(profiled_app, caplog):
+    client = profiled_app.test_client()
+    with caplog.at_level(logging.INFO, logger='app.profiler'):
+        client.get('/_lookups/1').close()
+        client.get('/_lookups/5').close()
+    totals = [(r.levelno, r.getMessage()) for r in caplog.records if 'SQL statements' in r.getMessage()]
+    assert totals[0][0] == logging.INFO and '1 SQL statements' in totals[0][1]
+    assert totals[1][0] == logging.WARNING and '5 SQL statements' in totals[1][1]
+
+
+def test_streamed_bodies_are_counted_in_the_log(profiled_app, caplog):
+    with caplog.at_level(logging.INFO, logger='app.profiler'):
+        response = profiled_app.test_client().get('/_streamed/2')
+        assert response.headers['X-SQL-Queries'] == '0'  # Sent before the body ran
+        assert response.get_data(as_text=True) == 'start\ndone\n'
+        response.close()
+    totals = [r.getMessage() for r in caplog.records if 'SQL statements' in r.getMessage()]
+    assert len(totals) == 1 and '2 SQL statements' in totals[0]
@@ -0,0 +1,73 @@
+"""
+Query-count budgets for hot routes
+
+Each entry caps the SQL statements and DB-API rows one request may use
+against the fixture dataset in conftest.py, measured on a second request so
+per-process caches are warm. A failure usually means a lazy
+relationship or per-item count crept back into a loop (an N+1 pattern);
+the assertion message lists every statement the request ran.
+"""
+
+import pytest
+
+# (url, max statements, max rows fetched)
+ANONYMOUS_BUDGETS = [
+    ('/', 2, 10),
+    ('/?category=2', 2, 10),
+    ('/?page=3', 2, 10),
+    ('/tag/python', 2, 10),
+    ('/tag/python?page=3', 2, 10),
+    # Nothing else is trending here, so related posts fall back to their query
+    ('/post/fixture-post-number-0', 7, 25),
+    ('/post/1', 7, 25),
+    ('/profile/author0', 6, 30),
+    ('/api/posts', 5, 20),
+    ('/api/posts?per_page=50', 5, 110),
+    ('/api/posts?tag=sql', 5, 20),
+    ('/api/search?q=fixture', 4, 30),
+    ('/api/posts/1/comments', 3, 15),
+    ('/api/categories', 0, 0),  # Served from the reference-data cache
+    ('/api/validate_username?username=author0', 1, 1),
+    ('/api/validate_email?email=author0@example.com', 1, 1),
+]
+
+# Logged-in budgets include the user loader's query
+AUTHENTICATED_BUDGETS = [
+    ('/dashboard', 7, 30),
+    ('/create_post', 1, 5),
+    ('/edit_post/1', 2, 5),
+    ('/api/user_stats', 7, 10),
+]
+
+
+def assert_within_budget(client, queries, url, max_queries, max_rows):
+    # Budgets are for steady state: warm the per-process reference-data cache first
+    client.get(url)
+    queries.reset()
+    response = client.get(url)
+    response.get_data()  # Streamed pages run their later queries while the body is read
+    assert response.status_code == 200, f'{url} returned {response.status_code}'
+    assert queries.count <= max_queries, (
+        f'{url} ran {queries.count} SQL statements (budget {max_queries}):\n{queries.report()}')
+    assert queries.rows <= max_rows, f'{url} fetched {queries.rows} rows (budget {max_rows})'
+
+
+@pytest.mark.parametrize('url,max_queries,max_rows', ANONYMOUS_BUDGETS)
+def test_anonymous_route_budget(client, dataset, queries, url, max_queries, max_rows):
+    assert_within_budget(client, queries, url, max_queries, max_rows)
+
+
+@pytest.mark.parametrize('url,max_queries,max_rows', AUTHENTICATED_BUDGETS)
+def test_authenticated_route_budget(client, dataset, queries, login, url, max_queries, max_rows):
+    login('author0')
+    assert_within_budget(client, queries, url, max_queries, max_rows)
+
+
+def test_budget_is_independent_of_page_size(client, dataset, queries):
+    """Serializing more posts must not add statements"""
+    counts = []
+    for per_page in (5, 50):
+        queries.reset()
+        client.get(f'/api/posts?per_page={per_page}')
+        counts.append(queries.count)
+    assert counts[0] == counts[1], queries.report()
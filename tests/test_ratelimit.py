@@ -0,0 +1,85 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app, db, limiter, ratelimit, unique_viewers
+from app.ratelimit import default_key, parse_limit
+
+
+@pytest.fixture
+def clock(app, monkeypatch):
+    """Pin the limiter's wall clock; starts one second into a 60-second window"""
+    now = [6001.0]
+    monkeypatch.setattr(ratelimit, 'time', SimpleNamespace(time=lambda: now[0], monotonic=time.monotonic))
+    with app.app_context():
+        app.extensions['limiter'].reset()
+        yield now
+
+
+def test_parse_limit():
+    assert parse_limit('10 per minute') == (10, 60)
+    assert parse_limit('5/second') == (5, 1)
+    with pytest.raises(ValueError):
+        parse_limit('ten a minute')
+
+
+def test_window_boundary_counts_only_allowed_hits(clock):
+    check = lambda: limiter.check('bench', 'ip:1', 3, 60)
+    assert [check() for _ in range(3)] == [0, 0, 0]
+    assert check() == 59  # Full until the window ends
+    for _ in range(50):  # Retrying doesn't extend the block
+        assert check() > 0
+
+    # Halfway into the next window the previous 3 hits weigh 1.5: one more fits
+    clock[0] = 6090.0
+    assert check() == 0
+    assert check() > 0
+
+    # A window later only that single allowed hit carries over
+    clock[0] = 6120.0
+    assert [check() for _ in range(2)] == [0, 0]
+
+
+def test_api_answers_429_with_retry_after(app, client, clock):
+    app.config['RATELIMIT_ENABLED'] = True
+    for _ in range(30):
+        assert client.get('/api/search?q=x').status_code == 200
+    response = client.get('/api/search?q=x')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '59'
+    assert response.get_json() == {'error': 'Too many requests', 'retry_after': 59}
+
+
+@pytest.fixture
+def proxied_app(tmp_path):
+    """An app behind one trusted router, as deployed"""
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'PROXY_FIX_HOPS': 1,
+                      'RATELIMIT_ENABLED': True, 'JOBS_WORKERS': 0, 'TRENDING_CHECKPOINT_INTERVAL': 0,
+                      'ENGAGEMENT_FLUSH_INTERVAL': 0, 'UNIQUES_CHECKPOINT_INTERVAL': 0,
+                      'TEMPLATE_CACHE_DIR': str(tmp_path / 'jinja_cache')})
+    app.add_url_rule('/_keys', 'keys', lambda: {'limit': default_key(), 'visitor': unique_viewers.visitor_key()})
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def test_clients_behind_the_router_are_keyed_by_their_own_address(proxied_app):
+    client = proxied_app.test_client()
+    keys = lambda ip: client.get('/_keys', headers={'X-Forwarded-For': ip}, environ_base={
+        'REMOTE_ADDR': '10.0.0.1'}).get_json()
+    first, second = keys('203.0.113.7'), keys('198.51.100.2')
+    assert first['limit'] == 'ip:203.0.113.7' and second['limit'] == 'ip:198.51.100.2'
+    assert first['visitor'] != second['visitor']
+
+    forwarded = lambda ip: {'X-Forwarded-For': ip}
+    for _ in range(30):
+        assert client.get('/api/search?q=x', headers=forwarded('203.0.113.7')).status_code == 200
+    assert client.get('/api/search?q=x', headers=forwarded('203.0.113.7')).status_code == 429
+    assert client.get('/api/search?q=x', headers=forwarded('198.51.100.2')).status_code == 200
+
+
+def test_forwarded_headers_are_ignored_without_a_trusted_router(app):
+    app.add_url_rule('/_keys', 'keys', lambda: {'limit': default_key()})
+    response = app.test_client().get('/_keys', headers={'X-Forwarded-For': '203.0.113.7'})
+    assert response.get_json()['limit'] == 'ip:127.0.0.1'
@@ -0,0 +1,56 @@
+from app import cache, refdata
+from app.models import Post
+
+
+def category_counts(client):
+    return {c['slug']: c['post_count'] for c in client.get('/api/categories').get_json()['categories']}
+
+
+def test_home_page_reads_categories_and_featured_from_cache(client, dataset, queries):
+    client.get('/')
+    queries.reset()
+    client.get('/')
+    assert queries.count == 2, queries.report()  # The page count and the page of posts
+    assert [p.title for p in refdata.featured_posts()] == [f'Fixture post number {i}' for i in range(3)]
+
+
+def test_create_category_invalidates_categories(client, dataset, login):
+    assert 'release-notes' not in category_counts(client)
+    login('admin', 'admin123')
+    client.post('/admin/category/new', data={'name': 'Release Notes', 'color': '#123456'})
+    assert category_counts(client)['release-notes'] == 0
+
+
+def test_publishing_a_draft_updates_counts(client, dataset, login):
+    draft = Post.query.filter_by(is_published=False, user_id=dataset['users'][4]).first()
+    slug = draft.category.slug
+    before = category_counts(client)[slug]
+
+    login('author4')
+    client.post(f'/edit_post/{draft.id}', data={'title': draft.title, 'content': draft.content,
+                                                'category_id': str(draft.category_id), 'is_published': 'y'})
+    assert category_counts(client)[slug] == before + 1
+
+
+def test_plain_edit_keeps_reference_data_cached(client, dataset, login):
+    refdata.categories()
+    refdata.featured_posts()
+    post = Post.query.filter_by(user_id=dataset['users'][0], is_featured=False, is_published=True).first()
+
+    login('author0')
+    client.post(f'/edit_post/{post.id}', data={'title': 'Just a typo fix', 'content': post.content,
+                                               'category_id': str(post.category_id), 'is_published': 'y'})
+    assert cache.get(refdata.CATEGORIES) is not None
+    assert cache.get(refdata.FEATURED) is not None
+
+
+def test_post_scopes():
+    class P:
+        is_published, is_featured, category_id = True, True, 1
+
+    assert refdata.post_scopes(P) == (refdata.CATEGORIES, refdata.FEATURED)
+    unchanged = {'is_published': True, 'is_featured': False, 'category_id': 1}
+    P.is_featured = False
+    assert refdata.post_scopes(P, unchanged) == ()
+    assert refdata.post_scopes(P, dict(unchanged, is_featured=True)) == (refdata.FEATURED,)
+    assert refdata.post_scopes(P, dict(unchanged, category_id=2)) == (refdata.CATEGORIES,)
@@ -0,0 +1,106 @@
+import random
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+
+from app import db, revisions
+from app.models import Post, PostRevision
+from app.revisions import SNAPSHOT_EVERY, apply_delta, make_delta
+
+
+def edit(client, post_id, title, content):
+    return client.post(f'/edit_post/{post_id}', data={'title': title, 'content': content, 'is_published': 'y'})
+
+
+def test_delta_round_trips_random_edits():
+    rng = random.Random(7)
+    words = ['alpha', 'beta', 'gamma', 'delta', '\n', '\n\n', 'epsilon']
+    text = ' '.join(rng.choice(words) for _ in range(400))
+    for _ in range(50):
+        tokens = text.split(' ')
+        for _ in range(rng.randint(1, 5)):
+            position = rng.randrange(len(tokens))
+            action = rng.random()
+            if action < 0.4:
+                tokens[position] = rng.choice(words)
+            elif action < 0.7:
+                tokens.insert(position, rng.choice(words))
+            elif len(tokens) > 1:
+                del tokens[position]
+        new = ' '.join(tokens)
+        assert apply_delta(text, make_delta(text, new)) == new
+        text = new
+
+
+def test_storage_is_proportional_to_the_change(client, dataset, login):
+    login('author0')
+    paragraphs = [f'Paragraph {i}: ' + ' '.join(f'word{i}x{j}' for j in range(150)) for i in range(40)]
+    client.post('/create_post', data={'title': 'Long article', 'content': '\n\n'.join(paragraphs),
+                                      'is_published': 'y'})
+    post = Post.query.filter_by(title='Long article').one()
+
+    paragraphs[20] = paragraphs[20].replace('word20x75', 'changed')
+    edit(client, post.id, 'Long article', '\n\n'.join(paragraphs))
+    first, second = PostRevision.query.filter_by(post_id=post.id).order_by(PostRevision.number)
+    assert first.is_snapshot and not second.is_snapshot
+    assert len(second.payload) < 100 < len(first.payload)
+    assert revisions.get_version(post.id, 2) == ('Long article', '\n\n'.join(paragraphs))
+
+    # Saving without changes records nothing
+    edit(client, post.id, 'Long article', '\n\n'.join(paragraphs))
+    assert PostRevision.query.filter_by(post_id=post.id).count() == 2
+
+
+def test_any_version_rebuilds_from_its_snapshot(client, dataset, login, queries):
+    login('author0')
+    post_id = dataset['posts'][0]  # Created before history existed: the first edit stores it as revision 1
+    original = db.session.get(Post, post_id).content
+    contents = [original]
+    for i in range(SNAPSHOT_EVERY + 5):
+        contents.append(contents[-1] + f'\nEdit number {i}.')
+        edit(client, post_id, f'Title {i}', contents[-1])
+
+    snapshots = [r.number for r in PostRevision.query.filter_by(post_id=post_id) if r.is_snapshot]
+    assert snapshots == [1, SNAPSHOT_EVERY + 1]
+    for number in (1, SNAPSHOT_EVERY, SNAPSHOT_EVERY + 1, len(contents)):
+        queries.reset()
+        assert revisions.get_version(post_id, number)[1] == contents[number - 1]
+        assert queries.count == 1 and queries.rows <= SNAPSHOT_EVERY
+    assert revisions.get_version(post_id, 999) is None
+
+
+def test_revisions_page_is_for_author_or_admin(client, dataset, login):
+    post_id = dataset['posts'][0]
+    login('author0')
+    edit(client, post_id, 'Retitled', 'Brand new body')
+    response = client.get(f'/post/{post_id}/revisions?rev=2')
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert '+Brand new body' in html and '-Fixture post number 0' in html
+    assert client.get(f'/post/{post_id}/revisions?rev=9').status_code == 404
+
+    client.get('/auth/logout')
+    login('author1')
+    assert client.get(f'/post/{post_id}/revisions').status_code == 403
+    client.get('/auth/logout')
+    login('admin', 'admin123')
+    assert client.get(f'/post/{post_id}/revisions').status_code == 200
+
+
+def test_saving_an_edit_locks_the_post_row(app, client, dataset, login):
+    # SQLite drops FOR UPDATE, so check the statement as PostgreSQL would run it
+    statements = []
+    record = lambda state: state.is_select and statements.append(
+        str(state.statement.compile(dialect=postgresql.dialect())))
+    login('author0')
+    post_id = dataset['posts'][0]
+    event.listen(db.session, 'do_orm_execute', record)
+    try:
+        client.get(f'/edit_post/{post_id}')
+        assert not any('FOR UPDATE' in sql for sql in statements)
+        edit(client, post_id, 'Locked title', 'Locked content')
+    finally:
+        event.remove(db.session, 'do_orm_execute', record)
+    locking = [sql for sql in statements if sql.endswith('FOR UPDATE')]
+    assert len(locking) == 1 and 'FROM post ' in locking[0]
+    assert revisions.get_version(post_id, 2) == ('Locked title', 'Locked content')
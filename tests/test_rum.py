@@ -0,0 +1,24 @@
+from app import rum_collector
+
+
+def test_beacons_are_stored_per_route(app, client):
+    response = client.post('/api/analytics/performance', json={'page': '/post/1?ref=feed', 'ttfb': 120})
+    assert response.status_code == 204
+    response = client.post('/api/errors', json={'type': 'javascript', 'message': 'boom'},
+                           headers={'Referer': 'http://localhost/tag/python'})
+    assert response.status_code == 204
+    assert rum_collector.metrics.rows[-1]['page'] == '/post/<int:id>'
+    assert rum_collector.errors.rows[-1]['page'] == '/tag/<slug>'
+
+
+def test_beacons_for_unknown_pages_are_rejected(app, client):
+    for page in ('/no/such/page', 'http://evil.example/', None):
+        assert client.post('/api/analytics/performance', json={'page': page, 'ttfb': 1}).status_code == 400
+        assert client.post('/api/errors', json={'page': page, 'message': 'x'}).status_code == 400
+    assert not rum_collector.metrics.rows and not rum_collector.errors.rows
+
+
+def test_beacons_are_rate_limited(app, client):
+    app.config['RATELIMIT_ENABLED'] = True
+    statuses = [client.post('/api/errors', json={'page': '/', 'message': 'x'}).status_code for _ in range(31)]
+    assert statuses.count(204) == 30 and statuses[-1] == 429
@@ -0,0 +1,50 @@
+from sqlalchemy import MetaData, inspect
+
+from app import db
+from app.models import Comment, Post
+from app.schema import missing_indexes, stale_foreign_keys
+
+
+def recreate_without_cascades():
+    """Swap in the tables as an older version created them: no ON DELETE and no newer indexes"""
+    old = MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(old)
+    for table in old.tables.values():
+        for constraint in table.foreign_key_constraints:
+            constraint.ondelete = None
+            for element in constraint.elements:
+                element.ondelete = None
+        for index in [index for index in table.indexes if index.name.startswith('ix_comment_')]:
+            table.indexes.discard(index)
+    db.session.remove()
+    db.drop_all()
+    old.create_all(db.engine)
+
+
+def test_upgrade_rebuilds_foreign_keys_and_keeps_rows(app, client, dataset, login):
+    rows = {table: db.session.execute(db.select(db.metadata.tables[table])).all()
+            for table in ('user', 'category', 'post', 'comment', 'tag', 'post_tag')}
+    recreate_without_cascades()
+    for table, data in rows.items():
+        if data:
+            db.session.execute(db.metadata.tables[table].insert(), [row._asdict() for row in data])
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    check = runner.invoke(args=['schema', 'check'])
+    assert check.exit_code == 1 and 'comment(post_id) needs ON DELETE CASCADE' in check.output
+    cascading = sum(1 for table in db.metadata.sorted_tables for constraint in table.foreign_key_constraints
+                    if constraint.ondelete)
+    assert f'Fixed {cascading} foreign key(s)' in runner.invoke(args=['schema', 'upgrade']).output
+    assert 'Schema is up to date' in runner.invoke(args=['schema', 'check']).output
+
+    with db.engine.connect() as connection:
+        assert not stale_foreign_keys(connection) and not missing_indexes(connection)
+    assert 'ix_comment_approved_id' in {index['name'] for index in inspect(db.engine).get_indexes('comment')}
+    assert Comment.query.count() == len(rows['comment'])
+
+    post = db.session.get(Post, dataset['posts'][0])
+    login(post.author.username)
+    assert client.post(f'/delete_post/{post.id}').status_code == 302
+    assert Comment.query.filter_by(post_id=post.id).count() == 0
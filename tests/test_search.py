@@ -0,0 +1,69 @@
+import random
+
+from app import search_stats
+from app.search import SpaceSaving, normalize_query
+
+
+def test_space_saving_keeps_heavy_hitters_in_fixed_memory():
+    rng = random.Random(3)
+    stream = ['flask'] * 300 + ['sql'] * 200 + ['python'] * 100 + [f'rare {i}' for i in range(2000)]
+    rng.shuffle(stream)
+    summary = SpaceSaving(20)
+    for item in stream:
+        summary.add(item)
+
+    assert len(summary.counters) == 20
+    assert [item for item, _, _ in summary.top(3)] == ['flask', 'sql', 'python']
+    for item, truth in (('flask', 300), ('sql', 200), ('python', 100)):
+        assert summary.guaranteed(item) <= truth <= summary.counters[item][0]
+
+
+def test_normalized_hot_queries_are_served_from_memory(client, dataset, queries):
+    assert normalize_query('  Fixture   POST ') == 'fixture post'
+    first = client.get('/api/search?q=Fixture post').get_json()
+    client.get('/api/search?q=fixture  post')  # Second sighting: admitted to the cache
+    queries.reset()
+    assert client.get('/api/search?q=FIXTURE POST').get_json() == first
+    assert queries.count == 0, queries.report()
+    assert search_stats.report()['top'][0] == ('fixture post', 3, 0)
+
+
+def test_post_writes_invalidate_cached_results(client, dataset, login, queries):
+    for _ in range(2):
+        client.get('/api/search?q=quokka')
+    assert client.get('/api/search?q=quokka').get_json()['posts'] == []
+
+    login('author0')
+    client.post('/create_post', data={'title': 'All about the quokka', 'content': 'marsupial ' * 40,
+                                      'is_published': 'y'})
+    queries.reset()
+    posts = client.get('/api/search?q=quokka').get_json()['posts']
+    assert [p['title'] for p in posts] == ['All about the quokka']
+    assert queries.count > 0
+
+
+def test_zero_result_queries_are_reported_to_admins(client, dataset, login):
+    for q in ('kubernetes', 'Kubernetes', 'fixture', 'rust'):
+        client.get(f'/api/search?q={q}')
+    report = search_stats.report()
+    assert report['zero_results'][0] == ('kubernetes', 2, 0)
+    assert 'fixture' not in [item for item, _, _ in report['zero_results']]
+
+    login('author0')
+    assert client.get('/admin/search').status_code == 403
+    client.get('/auth/logout')
+    login('admin', 'admin123')
+    html = client.get('/admin/search').get_data(as_text=True)
+    assert '<code>kubernetes</code>' in html and '<code>rust</code>' in html
+
+
+def test_database_matches_the_typed_text_not_the_cache_key(client, dataset, login):
+    assert normalize_query('  Die  STRASSE ') == 'die strasse'
+    login('author0')
+    client.post('/create_post', data={'title': 'Leben auf der Straße', 'content': 'Pflaster ' * 40,
+                                      'is_published': 'y'})
+    for _ in range(3):
+        assert client.get('/api/search?q=strasse').get_json()['posts'] == []
+    posts = client.get('/api/search?q=Straße').get_json()['posts']
+    assert [p['title'] for p in posts] == ['Leben auf der Straße']  # Not strasse's cached empty result
+    assert client.get('/api/search?q=%25%25').get_json()['posts'] == []  # % is literal, not a wildcard
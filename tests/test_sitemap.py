@@ -0,0 +1,64 @@
+import gzip
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app import cache
+from app.models import Post
+
+NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+@pytest.fixture
+def small_shards(app):
+    app.config['SITEMAP_SHARD_SIZE'] = 25
+
+
+def locs(data):
+    return [e.text for e in ET.fromstring(data).iter(f'{NS}loc')]
+
+
+def test_index_lists_one_shard_per_id_range(client, dataset, small_shards):
+    response = client.get('/sitemap.xml', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    shards = locs(gzip.decompress(response.data))
+    assert shards == [
+        'http://localhost/sitemap-categories-0.xml',
+        'http://localhost/sitemap-posts-0.xml',
+        'http://localhost/sitemap-posts-1.xml',
+        'http://localhost/sitemap-posts-2.xml',
+        'http://localhost/sitemap-profiles-0.xml',
+    ]
+    assert client.get('/sitemap-posts-7.xml').status_code == 404
+
+
+def test_post_shard_streams_then_serves_from_cache(client, dataset, small_shards, queries):
+    first = client.get('/sitemap-posts-1.xml')
+    assert first.is_streamed
+    urls = locs(first.data)
+    published = Post.query.filter(Post.id >= 25, Post.id < 50, Post.is_published == True).count()
+    assert len(urls) == published
+    assert 'http://localhost/post/fixture-post-number-24' in urls
+
+    queries.reset()
+    second = client.get('/sitemap-posts-1.xml')
+    assert queries.count == 0, queries.report()
+    assert locs(second.data) == urls
+
+
+def test_editing_a_post_invalidates_only_its_shard(client, dataset, small_shards, login):
+    client.get('/sitemap-posts-0.xml').get_data()  # Cached once the stream is consumed
+    client.get('/sitemap-posts-1.xml').get_data()
+    login('author0')
+    client.post('/edit_post/1', data={'title': 'Renamed fixture post', 'content': 'new content ' * 10,
+                                      'category_id': '0', 'is_published': 'y'})
+
+    assert cache.get('sitemap:posts:0') is None
+    assert cache.get('sitemap:posts:1') is not None
+    assert 'http://localhost/post/renamed-fixture-post' in locs(client.get('/sitemap-posts-0.xml').data)
+
+
+def test_robots_points_crawlers_at_sitemap(client):
+    body = client.get('/robots.txt').get_data(as_text=True)
+    assert 'Disallow: /*?page=' in body
+    assert 'Sitemap: http://localhost/sitemap.xml' in body
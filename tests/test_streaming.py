@@ -0,0 +1,72 @@
+from app import db, trending
+from app.models import Comment, Post
+
+
+def test_article_is_flushed_before_comments_load(client, dataset, queries):
+    post = db.session.get(Post, dataset['posts'][0])
+    queries.reset()
+    response = client.get(f'/post/{post.slug}')
+    assert response.is_streamed
+
+    chunks = iter(response.response)
+    first = next(chunks).decode()
+    assert post.title in first and '<!-- flush -->' in first
+    assert 'Fixture comment' not in first
+    assert not any(sql.startswith('SELECT comment.id') for sql in queries.statements)
+    assert '<span id="comment-count">10</span>' in first
+
+    rest = b''.join(chunks).decode()
+    assert rest.count('class="comment ') == 10 and rest.rstrip().endswith('</html>')
+
+
+def test_comment_fragment_lists_only_approved_comments(client, dataset):
+    post_id = dataset['posts'][0]
+    db.session.add(Comment(content='Held for review', is_approved=False, user_id=dataset['users'][1],
+                           post_id=post_id))
+    db.session.commit()
+
+    html = client.get(f'/post/{post_id}/fragments/comments').get_data(as_text=True)
+    assert '<html' not in html
+    assert html.count('class="comment ') == 10 and 'Held for review' not in html
+
+
+def test_related_fragment_shows_trending_posts_in_the_category(client, dataset):
+    post = db.session.get(Post, dataset['posts'][0])
+    same_category = Post.query.filter(Post.category_id == post.category_id, Post.id != post.id,
+                                      Post.is_published == True).limit(3).all()
+    assert same_category
+    for other in same_category:
+        trending.record(other, 'like')
+
+    html = client.get(f'/post/{post.id}/fragments/related').get_data(as_text=True)
+    assert all(other.title in html for other in same_category)
+    assert client.get(f'/post/{dataset["posts"][9]}/fragments/related').status_code == 404  # Draft
+
+
+def test_related_fragment_falls_back_to_most_viewed_posts(client, dataset):
+    # Nothing is trending after a restart, so the category's most viewed posts fill in
+    post = db.session.get(Post, dataset['posts'][0])
+    most_viewed = Post.query.filter(Post.category_id == post.category_id, Post.id != post.id,
+                                    Post.is_published == True).order_by(Post.view_count.desc()).limit(3).all()
+    trending.record(most_viewed[2], 'like')
+
+    html = client.get(f'/post/{post.id}/fragments/related').get_data(as_text=True)
+    assert all(other.title in html for other in most_viewed)
+    assert html.index(most_viewed[2].title) < html.index(most_viewed[0].title)  # Trending first
+
+
+def test_flash_is_shown_once_on_a_streamed_page(client, dataset, login):
+    post_id = dataset['posts'][0]
+    login('author1')
+    client.post(f'/post/{post_id}/comment', data={'content': 'Flash me once'})
+
+    assert client.get(f'/post/{post_id}').get_data(as_text=True).count('Your comment has been added!') == 1
+    assert 'Your comment has been added!' not in client.get('/').get_data(as_text=True)
+
+
+def test_streamed_page_stores_the_csrf_token_it_renders(app, client, dataset):
+    app.config['WTF_CSRF_ENABLED'] = True
+    html = client.get(f'/post/{dataset["posts"][0]}').get_data(as_text=True)
+    with client.session_transaction() as session:
+        assert 'csrf_token' in session
+    assert 'name="csrf-token"' in html
@@ -0,0 +1,86 @@
+import time
+
+from app import suggestions
+from app.models import Post
+from app.suggest import PrefixIndex
+
+
+def test_prefix_matches_any_word_ranked_by_popularity():
+    index = PrefixIndex()
+    index.add(1, 'Flask caching guide', 10, None)
+    index.add(2, 'Caching in Django', 50, None)
+    index.add(3, 'Async Python', 99, None)
+    assert index.search('cach', 5) == [2, 1]
+    assert index.search('flask cach', 5) == [1]
+
+    index.add(1, 'Flask routing guide', 10, None)
+    index.remove(2)
+    assert index.search('cach', 5) == []
+    assert index.search('rout', 5) == [1]
+
+
+def test_cached_top_lists_follow_popularity_changes():
+    index = PrefixIndex()
+    index.load([(i, f'Cache tip {i}', i, None, None) for i in range(100)])
+    assert index.search('cach', 3) == [99, 98, 97]
+    assert 'cach' in index._top
+
+    index.adjust(5, 1000)  # An uncached entry overtakes the cached ones
+    index.adjust(99, -1000)  # And the leader drops below everything else
+    index.remove(98)
+    index.add(100, 'Caching at the edge', 500, None)
+    assert 'cach' in index._top
+    assert index.search('cach', 4) == [5, 100, 97, 96]
+
+    fresh = PrefixIndex()
+    fresh.load([(entry_id, label, popularity, data, None)
+                for entry_id, (label, popularity, data, _) in index.entries.items()])
+    assert fresh.search('cach', 10) == index.search('cach', 10)
+    assert (fresh.ids, fresh.offsets) == (index.ids, index.offsets)
+
+
+def test_suggest_endpoint_never_queries_after_build(client, dataset, queries):
+    client.get('/api/suggest?q=fix')
+    queries.reset()
+    data = client.get('/api/suggest?q=Fixture post number 1').get_json()
+    assert queries.count == 0, queries.report()
+    assert data['posts'][0]['label'] == 'Fixture post number 1'  # Most viewed of number 1, 10, 11, ...
+    assert data['posts'][0]['url'] == '/post/fixture-post-number-1'
+
+    data = client.get('/api/suggest?q=numb&types=author,tag').get_json()
+    assert set(data) == {'query', 'authors', 'tags'}
+    assert data['authors'][0]['name'].startswith('Author Number')
+    assert {t['label'] for t in client.get('/api/suggest?q=pyt').get_json()['tags']} == {'python'}
+
+
+def test_index_follows_post_writes(client, dataset, login):
+    client.get('/api/suggest?q=x')
+    login('author0')
+    client.post('/create_post', data={'title': 'Zebra patterns explained', 'content': 'stripes ' * 50,
+                                      'meta_keywords': 'zoology', 'is_published': 'y'})
+    post = Post.query.filter_by(title='Zebra patterns explained').one()
+    assert client.get('/api/suggest?q=patt').get_json()['posts'][0]['id'] == post.id
+    tags = client.get('/api/suggest?q=zoo').get_json()['tags']
+    assert [(t['label'], t['count'], t['url']) for t in tags] == [('zoology', 1, '/tag/zoology')]
+
+    client.post(f'/delete_post/{post.id}')
+    data = client.get('/api/suggest?q=zeb').get_json()
+    assert data['posts'] == [] and client.get('/api/suggest?q=zoo').get_json()['tags'] == []
+
+
+def test_changes_from_other_workers_are_applied(app, dataset):
+    suggestions.suggest('x')
+    with app.test_request_context():
+        suggestions._on_message('post', {'id': 9999, 'title': 'Remote quokka post', 'slug': 'remote-quokka-post',
+                                         'tags': [], 'view_count': 0, 'user_id': dataset['users'][0],
+                                         'category_id': None, 'is_published': True, 'origin': 'other:1'})
+        assert suggestions.suggest('quok')['posts'][0]['id'] == 9999
+
+
+def test_lookup_is_sub_millisecond(app, dataset):
+    with app.test_request_context():
+        suggestions.suggest('f')
+        start = time.perf_counter()
+        for prefix in ('f', 'fi', 'fix', 'fixture p', 'lorem', 'auth'):
+            suggestions.suggest(prefix)
+        assert (time.perf_counter() - start) / 6 < 0.001
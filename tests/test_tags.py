@@ -0,0 +1,73 @@
+from app import db
+from app.models import Post, Tag, post_tag
+from app.tags import parse_tags
+
+
+def published_count(dataset, name):
+    return sum(1 for i in range(len(dataset['posts'])) if i % 10 != 9 and (name in ('python', 'flask')) == bool(i % 2))
+
+
+def test_parse_tags_dedupes_by_slug_and_caps_count():
+    assert parse_tags(' Python,python , Flask  SQL,,') == {'python': 'Python', 'flask-sql': 'Flask SQL'}
+    assert len(parse_tags(','.join(f'tag{i}' for i in range(30)))) == 10
+    assert parse_tags(None) == {}
+
+
+def test_tag_page_lists_published_posts_without_counting(client, dataset, queries):
+    client.get('/tag/python')
+    queries.reset()
+    response = client.get('/tag/python')
+    assert response.status_code == 200
+    assert not any('count(' in sql.lower() for sql in queries.statements), queries.report()
+    html = response.get_data(as_text=True)
+    assert 'Posts tagged python' in html
+    assert 'Fixture post number 57' in html and 'Fixture post number 59' not in html  # 59 is a draft
+    assert '/tag/python?page=2' in html
+    assert client.get('/tag/nope').status_code == 404
+
+
+def test_api_posts_filters_by_tag(client, dataset):
+    data = client.get('/api/posts?tag=sql&per_page=50').get_json()
+    assert data['total'] == published_count(dataset, 'sql')
+    assert all(p['id'] in dataset['posts'][0::2] for p in data['posts'])
+    ids = [p['id'] for p in data['posts']]
+    assert ids == sorted(ids, reverse=True)
+    assert client.get('/api/posts?tag=nope').status_code == 404
+
+
+def test_counts_follow_post_writes(client, dataset, login):
+    login('author0')
+    client.post('/create_post', data={'title': 'Tagged post', 'content': 'words ' * 50,
+                                      'meta_keywords': 'Python, Rust', 'is_published': 'y'})
+    post = Post.query.filter_by(title='Tagged post').one()
+    counts = dict(db.session.query(Tag.slug, Tag.post_count))
+    assert counts['python'] == published_count(dataset, 'python') + 1 and counts['rust'] == 1
+
+    # Unpublishing releases the counts; dropping a tag removes the link
+    client.post(f'/edit_post/{post.id}', data={'title': 'Tagged post', 'content': 'words ' * 50,
+                                               'meta_keywords': 'rust'})
+    db.session.expire_all()
+    assert dict(db.session.query(Tag.slug, Tag.post_count))['rust'] == 0
+    assert [t.slug for t in db.session.get(Post, post.id).tags] == ['rust']
+
+    client.post(f'/edit_post/{post.id}', data={'title': 'Tagged post', 'content': 'words ' * 50,
+                                               'meta_keywords': 'rust, go', 'is_published': 'y'})
+    client.post(f'/delete_post/{post.id}')
+    counts = dict(db.session.query(Tag.slug, Tag.post_count))
+    assert counts['rust'] == 0 and counts['go'] == 0 and counts['python'] == published_count(dataset, 'python')
+
+
+def test_backfill_rebuilds_links_from_meta_keywords(app, dataset):
+    db.session.execute(post_tag.delete())
+    db.session.execute(Tag.__table__.delete())
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['tags', 'backfill', '--batch-size', '7'])
+    assert result.exit_code == 0, result.output
+    assert 'Linked 120 post tag(s)' in result.output
+    assert dict(db.session.query(Tag.slug, Tag.post_count)) == {
+        name: published_count(dataset, name) for name in ('python', 'flask', 'databases', 'sql')}
+
+    # Running it again adds nothing
+    assert 'Linked 0 post tag(s)' in runner.invoke(args=['tags', 'backfill']).output
@@ -0,0 +1,41 @@
+import os
+
+from app import metrics, template_cache
+
+
+def test_compile_command_fills_bytecode_cache(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['templates', 'compile'])
+    assert result.exit_code == 0, result.output
+    templates = app.jinja_env.list_templates()
+    assert f'Compiled {len(templates)} template(s)' in result.output
+    assert len(os.listdir(app.config['TEMPLATE_CACHE_DIR'])) == len(templates)
+
+
+def test_fresh_environment_loads_from_bytecode(app, monkeypatch):
+    template_cache.compile_all(app)
+    app.jinja_env.cache.clear()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('template was recompiled')
+
+    monkeypatch.setattr(app.jinja_env, 'compile', fail)
+    assert app.jinja_env.get_template('base.html') is not None
+
+
+def test_edited_template_is_recompiled(app, tmp_path):
+    app.jinja_loader.searchpath.insert(0, str(tmp_path))
+    app.jinja_env.cache = None  # Lookup every time, as in a fresh worker
+    (tmp_path / 'scratch.html').write_text('one')
+    assert app.jinja_env.get_template('scratch.html').render() == 'one'
+    (tmp_path / 'scratch.html').write_text('two')
+    assert app.jinja_env.get_template('scratch.html').render() == 'two'
+
+
+def test_render_time_is_recorded_per_template(client, dataset):
+    client.get('/')
+    client.get('/auth/login')
+    output = metrics.render()
+    assert '# TYPE flask_template_render_seconds histogram' in output
+    assert 'flask_template_render_seconds_count{template="index.html"}' in output
+    assert 'flask_template_render_seconds_count{template="auth/login.html"}' in output
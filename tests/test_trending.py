@@ -0,0 +1,99 @@
+import importlib
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import db, trending
+from app.models import Post, TrendingScore
+from app.trending import TrendingTracker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    # app.trending is also the name of the tracker instance, so fetch the module itself
+    module = importlib.import_module('app.trending')
+    monkeypatch.setattr(module, 'time', SimpleNamespace(time=lambda: now[0], sleep=time.sleep))
+    return now
+
+
+def test_events_rank_posts_overall_and_by_category(client, dataset):
+    first, second, third = (db.session.get(Post, i) for i in dataset['posts'][:3])
+    trending.record(first, 'view')
+    trending.record(second, 'comment')
+    trending.record(third, 'like')
+
+    data = client.get('/api/trending').get_json()
+    assert [p['id'] for p in data['posts']] == [second.id, third.id, first.id]
+    by_category = client.get(f'/api/trending?category={first.category_id}').get_json()
+    assert [p['id'] for p in by_category['posts']] == [first.id]
+
+
+def test_view_like_and_comment_routes_feed_the_tracker(app, client, dataset, login):
+    app.config['TRENDING_REFRESH'] = 0
+    post = db.session.get(Post, dataset['posts'][5])
+    client.get(f'/post/{post.slug}')
+    login('author1')
+    client.post(f'/api/like_post/{post.id}')
+    client.post(f'/post/{post.id}/comment', data={'content': 'Trending comment'})
+    assert trending.top(1)[0].id == post.id
+    assert trending.top(1)[0].score == pytest.approx(9.0, rel=1e-3)
+
+
+def test_older_events_decay(app, dataset, clock):
+    old, new = (db.session.get(Post, i) for i in dataset['posts'][:2])
+    trending.record(old, 'view')
+    trending.record(old, 'view')
+    clock[0] += app.config['TRENDING_HALF_LIFE'] * 2
+    trending.record(new, 'view')
+
+    ranked = trending.top(2)
+    assert [p.id for p in ranked] == [new.id, old.id]
+    assert ranked[1].score == pytest.approx(0.5)
+
+
+def test_checkpoint_merges_workers_and_survives_landmark_change(app, dataset, clock):
+    post = db.session.get(Post, dataset['posts'][0])
+    other_worker = TrendingTracker()
+    other_worker.init_app(app)
+
+    trending.record(post, 'comment')
+    other_worker.record(post, 'like')
+    assert trending.checkpoint() == 1
+    assert other_worker.checkpoint() == 1
+    assert trending.checkpoint() == 0
+    assert trending.top(1)[0].score == pytest.approx(8.0)
+
+    # Crossing a landmark rescales stored scores without changing their decayed value
+    clock[0] += app.config['TRENDING_HALF_LIFE'] * 40
+    trending.record(post, 'view')
+    trending.checkpoint()
+    assert db.session.get(TrendingScore, post.id).landmark == trending._landmark
+    assert trending.top(1)[0].score == pytest.approx(1.0 + 8.0 * 2 ** -40)
+
+
+def test_trending_api_uses_no_queries_and_drops_unpublished(client, dataset, queries):
+    post = db.session.get(Post, dataset['posts'][0])
+    trending.record(post, 'view')
+    client.get('/api/trending')
+    queries.reset()
+    assert client.get('/api/trending').get_json()['posts'][0]['id'] == post.id
+    assert queries.count == 0, queries.report()
+
+    post.is_published = False
+    db.session.commit()
+    trending.post_changed(post)
+    assert client.get('/api/trending').get_json()['posts'] == []
+
+
+def test_unpublished_post_stays_out_after_a_checkpoint(app, client, dataset):
+    post = db.session.get(Post, dataset['posts'][0])
+    trending.record(post, 'like')
+    post.is_published = False
+    db.session.commit()
+    trending.post_changed(post)
+
+    assert trending.checkpoint() == 0
+    trending.reload()
+    assert client.get('/api/trending').get_json()['posts'] == []
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, unique_viewers
+from app.models import Post, PostViewSketch
+from app.uniques import HyperLogLog, UniqueViewers
+
+
+def sketch_of(values):
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_estimates_are_close_and_ignore_repeats():
+    assert sketch_of(f'u:{i}' for i in range(10)).count() == 10
+    large = sketch_of(f'u:{i}' for i in range(20000))
+    assert large.count() == pytest.approx(20000, rel=0.06)
+    assert large.merge(sketch_of(f'u:{i}' for i in range(5000))).count() == large.count()
+
+    union = HyperLogLog.union([sketch_of(f'u:{i}' for i in range(0, 3000)),
+                               sketch_of(f'u:{i}' for i in range(2000, 5000))])
+    assert union.count() == pytest.approx(5000, rel=0.06)
+
+
+def test_blobs_are_a_few_kilobytes_at_most():
+    small, large = sketch_of(['a', 'b', 'c']), sketch_of(str(i) for i in range(100000))
+    assert len(small.to_bytes()) < 100
+    assert len(large.to_bytes()) <= 2100
+    assert HyperLogLog.from_bytes(large.to_bytes()).count() == large.count()
+
+
+def test_workers_merge_into_one_daily_sketch(app, dataset):
+    post_id = dataset['posts'][0]
+    other_worker = UniqueViewers()
+    other_worker.init_app(app)
+    for i in range(300):
+        unique_viewers.record(post_id, f'u:{i}')
+        other_worker.record(post_id, f'u:{i + 200}')
+
+    assert unique_viewers.checkpoint() == 1
+    assert other_worker.checkpoint() == 1
+    row = db.session.get(PostViewSketch, (post_id, datetime.utcnow().date()))
+    assert row.version == 2
+    assert unique_viewers.summary(post_id, 7)['unique_viewers'] == pytest.approx(500, rel=0.06)
+
+
+def test_ranges_union_daily_sketches(app, dataset):
+    post_id = dataset['posts'][0]
+    today = datetime.utcnow().date()
+    db.session.add(PostViewSketch(post_id=post_id, day=today - timedelta(days=3),
+                                  registers=sketch_of(['u:1', 'u:2', 'u:3']).to_bytes()))
+    db.session.commit()
+    unique_viewers.record(post_id, 'u:3')
+    unique_viewers.record(post_id, 'u:4')
+
+    summary = unique_viewers.summary(post_id, 7)
+    assert summary['daily_unique_viewers'] == [0, 0, 0, 3, 0, 0, 2]
+    assert summary['unique_viewers'] == 4
+    assert unique_viewers.summary(post_id, 2)['unique_viewers'] == 2
+
+
+def test_views_count_each_visitor_once(client, dataset, login):
+    post = db.session.get(Post, dataset['posts'][0])
+    for _ in range(3):
+        client.get(f'/post/{post.slug}')
+    client.get(f'/post/{post.slug}', headers={'User-Agent': 'another browser'})
+    login('author0')
+    client.get(f'/post/{post.slug}')
+    client.get(f'/post/{post.slug}')
+
+    data = client.get(f'/api/engagement?post={post.id}&days=1').get_json()
+    assert data['unique_viewers'] == 3 and data['daily_unique_viewers'] == [3]
+
+
+def test_checkpoint_drops_sketches_of_deleted_posts(app, dataset):
+    post = db.session.get(Post, dataset['posts'][0])
+    unique_viewers.record(post.id, 'u:1')
+    unique_viewers.record(dataset['posts'][1], 'u:1')
+    db.session.delete(post)
+    db.session.commit()
+    assert unique_viewers.checkpoint() == 1